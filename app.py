@@ -0,0 +1,416 @@
+import os
+import json
+from functools import partial
+from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, session, Response
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import SubmitField
+from werkzeug.utils import secure_filename
+from src.data_process.data_preprocessor_for_visualisation import process_csv, append_csv, preprocessing_settings
+from src.data_process.visuals_generator import render_plot, find_plot, plot_cache_key
+from src.data_process.insight_generator_complete import aio_insights, models_signature
+import matplotlib
+matplotlib.use('Agg')
+from src.data_process.chatbox import chatbox
+import glob
+from src.data_process.jobs import create_job, submit_job, queue_length, cancel_job, get_job, wait_for_events, active_workspaces, JobQueueFull, VISUALISATION_STAGES, INSIGHT_STAGES, PLOT_STAGES, RESTORE_STAGES, APPEND_STAGES
+from src.data_process.dataset_cache import get_columns as get_dataset_columns, evict_folder
+from src.data_process.workspaces import new_workspace_id, get_workspace, delete_files_in_folder, within_quota, start_workspace_gc
+from src.data_process.result_cache import save_and_hash, content_key, lookup, restore, run_and_store, record_hit, record_miss, cache_stats
+from src.data_process.profiler import read_profile
+
+app = Flask(
+    __name__,
+    # path to templates and static files
+    template_folder=os.path.join(os.getcwd(), 'src', 'templates'),
+    static_folder=os.path.join(os.getcwd(), 'src', 'static')
+)
+app.config['SECRET_KEY'] = 'Website-Secret-Key'
+
+# every session gets its own workspace with upload and processed folders for visualization and insights
+app.config['WORKSPACE_ROOT'] = os.path.join(os.getcwd(), 'src', 'workspaces')
+app.config['WORKSPACE_QUOTA_BYTES'] = int(os.getenv('WORKSPACE_QUOTA_BYTES', 2 * 1024 ** 3))
+app.config['WORKSPACE_MAX_AGE_SECONDS'] = int(os.getenv('WORKSPACE_MAX_AGE_SECONDS', 6 * 60 * 60))
+app.config['WORKSPACE_GC_INTERVAL_SECONDS'] = 10 * 60
+os.makedirs(app.config['WORKSPACE_ROOT'], exist_ok=True)
+
+# remove workspaces of sessions that are gone in the background
+start_workspace_gc(app.config['WORKSPACE_ROOT'], app.config['WORKSPACE_MAX_AGE_SECONDS'],
+                   app.config['WORKSPACE_GC_INTERVAL_SECONDS'], active_workspaces)
+
+# file uploading form for insights
+class InsightUploadForm(FlaskForm):
+    file = FileField('Upload CSV File', validators=[
+        FileRequired(),
+        FileAllowed(['csv'], 'CSV files only!')
+    ])
+    submit = SubmitField('Upload')
+
+# file uploading form for visualization
+class VisualUploadForm(FlaskForm):
+    file = FileField('Upload CSV File', validators=[
+        FileRequired(),
+        FileAllowed(['csv'], 'CSV files only!')
+    ])
+    submit = SubmitField('Upload')
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/explore')
+def explore():
+    return render_template('explore.html')
+
+@app.route('/home')
+def home():
+    return render_template('home.html')
+
+@app.route('/about')
+def about():
+    return render_template('about.html')
+
+@app.route('/contact')
+def contact():
+    return render_template('contact.html')
+
+# get the workspace of the current session, creating it on first use
+def current_workspace():
+    if 'workspace_id' not in session:
+        session['workspace_id'] = new_workspace_id()
+    return get_workspace(app.config['WORKSPACE_ROOT'], session['workspace_id'])
+
+# save an upload into a workspace folder while hashing it. Returns False if the workspace already holds
+# the same content, in which case what was processed from it is kept
+def save_upload(workspace, file, upload_folder, processed_folder):
+    incoming_path = os.path.join(workspace['root'], f'{upload_folder}.incoming')
+    digest = save_and_hash(file.stream, incoming_path)
+    digest_key = f'{upload_folder}_digest'
+    if digest == session.get(digest_key) and any(f.endswith('.csv') for f in os.listdir(workspace[upload_folder])):
+        os.remove(incoming_path)
+        record_hit('upload')
+        return False
+    record_miss('upload')
+
+    # Delete existing files in the relevant folders
+    delete_files_in_folder(workspace[upload_folder])
+    delete_files_in_folder(workspace[processed_folder])
+    evict_folder(workspace[processed_folder])
+
+    # Move the new file in place
+    filename = secure_filename(file.filename)
+    os.replace(incoming_path, os.path.join(workspace[upload_folder], filename))
+    session[digest_key] = digest
+    return True
+
+# submit form for uploading data for visualization
+@app.route('/visualize', methods=['GET', 'POST'])
+def visualize():
+    form = VisualUploadForm()
+    if form.validate_on_submit():
+        save_upload(current_workspace(), form.file.data, 'visuals_upload', 'visuals_processed')
+        return redirect(url_for('visualize'))
+    return render_template('visualize.html', form=form)
+
+# save uploaded data for visualization
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    form = VisualUploadForm()
+    if form.validate_on_submit():
+        workspace = current_workspace()
+        if not within_quota(workspace, request.content_length, app.config['WORKSPACE_QUOTA_BYTES'],
+                            ['visuals_upload', 'visuals_processed']):
+            return jsonify({'success': False, 'error': 'Workspace storage quota exceeded'}), 413
+
+        changed = save_upload(workspace, form.file.data, 'visuals_upload', 'visuals_processed')
+        return jsonify({'success': True, 'message': 'File uploaded successfully', 'duplicate': not changed})
+    return jsonify({'success': False, 'error': 'Invalid file'})
+
+# queue a background job, or tell the client to back off when the queue is full. Every job goes through the
+# bounded queue, short ones (charts, restoring cached outputs) too, so a burst of requests gets HTTP 429.
+# reply holds fields added to the response
+def queue_job(job_id, target, *args, reply=None):
+    try:
+        position = submit_job(job_id, target, *args)
+    except JobQueueFull:
+        response = jsonify({'success': False, 'error': 'The server is busy, please try again shortly',
+                            'queue_position': None, 'queue_length': queue_length()})
+        return response, 429, {'Retry-After': '30'}
+    return jsonify({'success': True, 'job_id': job_id, 'queue_position': position, **(reply or {})})
+
+# what the outputs of a pipeline depend on besides the upload: the preprocessing code version and settings (the
+# backend among them), and the models for the insights
+def pipeline_settings(kind):
+    settings = preprocessing_settings()
+    return settings + [models_signature()] if kind == 'insights' else settings
+
+# run a pipeline on the upload of a workspace folder, or restore its outputs if the same content was processed before
+# with the same code and settings and reuse is set
+def run_pipeline(kind, stages, workspace, upload_folder, processed_folder, target, *args, reuse=True):
+    digest = session.get(f'{upload_folder}_digest')
+    if digest is None:
+        job_id = create_job(kind, stages, workspace['id'])
+        return queue_job(job_id, target, *args)
+    key = content_key(digest, pipeline_settings(kind))
+    if reuse and lookup(kind, key):
+        job_id = create_job(kind, RESTORE_STAGES, workspace['id'])
+        return queue_job(job_id, restore, kind, key, workspace[processed_folder], reply={'cached': True})
+    job_id = create_job(kind, stages, workspace['id'])
+    return queue_job(job_id, run_and_store, kind, key, workspace[processed_folder], target, *args)
+
+# start preprocessing the data as a background job
+@app.route('/api/process_data', methods=['GET'])
+def process_data():
+    workspace = current_workspace()
+    input_files = [f for f in os.listdir(workspace['visuals_upload']) if f.endswith('.csv')]
+    if not input_files:
+        return jsonify({'success': False, 'error': 'No CSV file found'})
+    
+    input_path = os.path.join(workspace['visuals_upload'], input_files[0])
+    output_path = os.path.join(workspace['visuals_processed'], 'output.feather')
+    
+    return run_pipeline('visualisation', VISUALISATION_STAGES, workspace, 'visuals_upload', 'visuals_processed',
+                        process_csv, input_path, output_path)
+
+# append the rows of an uploaded CSV to the processed dataset as a background job. The file may hold only the new
+# rows or the whole grown statement, the rows the dataset already holds are skipped
+@app.route('/api/append_data', methods=['POST'])
+def append_data():
+    form = VisualUploadForm()
+    if not form.validate_on_submit():
+        return jsonify({'success': False, 'error': 'Invalid file'})
+    workspace = current_workspace()
+    input_files = [f for f in os.listdir(workspace['visuals_upload']) if f.endswith('.csv')]
+    output_path = os.path.join(workspace['visuals_processed'], 'output.feather')
+    if not input_files or not os.path.exists(output_path):
+        return jsonify({'success': False, 'error': 'No processed dataset, process the data first'})
+    if not within_quota(workspace, request.content_length, app.config['WORKSPACE_QUOTA_BYTES']):
+        return jsonify({'success': False, 'error': 'Workspace storage quota exceeded'}), 413
+
+    # every append gets its own file, appends queued at the same time are merged one after the other
+    job_id = create_job('append', APPEND_STAGES, workspace['id'])
+    rows_path = os.path.join(workspace['visuals_upload'], f'rows.{job_id}.append')
+    form.file.data.save(rows_path)
+    upload_path = os.path.join(workspace['visuals_upload'], input_files[0])
+    response = queue_job(job_id, append_csv, rows_path, output_path, upload_path)
+    if get_job(job_id) is None:
+        # the queue was full
+        os.remove(rows_path)
+        return response
+    # the upload grows by the new rows, its outputs and charts are no longer the cached ones of its content
+    session.pop('visuals_upload_digest', None)
+    return response
+
+# get a background job of the workspace of the current session, None for the jobs of other sessions so their
+# results and events are not given away, nor can they be cancelled
+def session_job(job_id):
+    job = get_job(job_id)
+    if job is None or job['workspace'] is None or job['workspace'] != session.get('workspace_id'):
+        return None
+    return job
+
+# get the stage, progress and results of a background job
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = session_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+# cancel a queued or running background job
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    if session_job(job_id) is None or not cancel_job(job_id):
+        return jsonify({'success': False, 'error': 'Job not found or already finished'}), 404
+    return jsonify({'success': True})
+
+# hit rates and size of the result cache
+@app.route('/api/cache/stats', methods=['GET'])
+def result_cache_stats():
+    return jsonify({'success': True, 'cache': cache_stats()})
+
+# url prefix of the images produced by each kind of job
+IMAGE_URL_PREFIXES = {'plot': '/processed/visual_images/', 'insights': '/processed_insight/'}
+
+# stream the stage transitions, reports and images of a background job as server-sent events
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = session_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    image_url_prefix = IMAGE_URL_PREFIXES.get(job['kind'], '')
+    # resume after the last event the browser received when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    after = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+
+    def stream():
+        nonlocal after
+        while True:
+            events, finished = wait_for_events(job_id, after, timeout=15)
+            if events is None:
+                return
+            for index, event, data in events:
+                if event == 'image':
+                    data = dict(data, url=image_url_prefix + data['filename'])
+                yield f'id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+                after = index + 1
+            if finished:
+                return
+            if not events:
+                # keep the connection open through proxies
+                yield ': keep-alive\n\n'
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/processed/<path:filename>')
+def processed_file(filename):
+    return send_from_directory(current_workspace()['visuals_processed'], filename)
+
+
+# get column names
+@app.route('/api/get_columns', methods=['GET'])
+def get_columns():
+    try:
+        columns = get_dataset_columns(os.path.join(current_workspace()['visuals_processed'], 'output.feather'))
+        return jsonify({'success': True, 'columns': columns})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+# get the profile of the processed dataset: null and distinct counts, and min/max, mean/std, quantiles,
+# zero counts and a histogram of every numeric column
+@app.route('/api/profile', methods=['GET'])
+def dataset_profile():
+    profile = read_profile(current_workspace()['visuals_processed'])
+    if profile is None:
+        return jsonify({'success': False, 'error': 'No processed dataset, process the data first'}), 404
+    return jsonify({'success': True, 'profile': profile})
+
+
+# start generating a visualization as a background job
+@app.route('/api/visualize', methods=['POST'])
+def api_visualize():
+    try:
+        plot_type = request.form.get('plot-type')
+        x_axis = request.form.get('x-axis')
+        y_axis = request.form.get('y-axis')
+
+        workspace = current_workspace()
+        cache_key = plot_cache_key(session.get('visuals_upload_digest'), plot_type, x_axis, y_axis,
+                                   pipeline_settings('visualisation'))
+
+        # a chart that was rendered before is served straight away
+        filename = find_plot(workspace['visuals_processed'], plot_type, x_axis, y_axis, cache_key)
+        if filename is not None:
+            return jsonify({'success': True, 'message': 'Visualization ready',
+                            'image_url': IMAGE_URL_PREFIXES['plot'] + filename})
+
+        job_id = create_job('plot', PLOT_STAGES, workspace['id'])
+        return queue_job(job_id, render_plot, workspace['visuals_processed'], plot_type, x_axis, y_axis, cache_key,
+                         reply={'message': 'Visualization generation started'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+# submit form for uploading data for insights
+@app.route('/insights', methods=['GET', 'POST'])
+def insights():
+    form = InsightUploadForm()
+    if form.validate_on_submit():
+        save_upload(current_workspace(), form.file.data, 'insights_upload', 'insights_processed')
+        return redirect(url_for('insights'))
+    return render_template('insights.html', form=form)
+
+# save uploaded data for insights
+@app.route('/api/upload_insight', methods=['POST'])
+def upload_file_insight():
+    form = InsightUploadForm()
+    if form.validate_on_submit():
+        workspace = current_workspace()
+        if not within_quota(workspace, request.content_length, app.config['WORKSPACE_QUOTA_BYTES'],
+                            ['insights_upload', 'insights_processed']):
+            return jsonify({'success': False, 'error': 'Workspace storage quota exceeded'}), 413
+
+        changed = save_upload(workspace, form.file.data, 'insights_upload', 'insights_processed')
+        return jsonify({'success': True, 'message': 'File uploaded successfully', 'duplicate': not changed})
+    return jsonify({'success': False, 'error': 'Invalid file'})
+
+# start preprocessing data for insights as a background job. The job resumes after the last stage completed for the
+# upload (see aio_insights), ?resume=0 runs every stage again
+@app.route('/api/process_data_insight', methods=['GET'])
+def process_data_insight():
+    workspace = current_workspace()
+    input_files = [f for f in os.listdir(workspace['insights_upload']) if f.endswith('.csv')]
+    if not input_files:
+        return jsonify({'success': False, 'error': 'No CSV file found'})
+    
+    input_path = os.path.join(workspace['insights_upload'], input_files[0])
+    output_path = workspace['insights_processed']
+    
+    resume = request.args.get('resume') != '0'
+    return run_pipeline('insights', INSIGHT_STAGES, workspace, 'insights_upload', 'insights_processed',
+                        partial(aio_insights, resume=resume), input_path, output_path, reuse=resume)
+
+
+# send processed data for insights
+@app.route('/processed_insight/<path:filename>')
+def processed_file_insight(filename):
+    return send_from_directory(current_workspace()['insights_processed'], filename)
+
+
+# get columns for insights
+@app.route('/api/get_columns_insight', methods=['GET'])
+def get_columns_insight():
+    try:
+        columns = get_dataset_columns(os.path.join(current_workspace()['insights_processed'], 'output.feather'))
+        return jsonify({'success': True, 'columns': columns})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+# generate report
+@app.route('/api/generate_report', methods=['GET'])
+def generate_report():
+    try:
+        workspace = current_workspace()
+
+        # Read the generated report
+        with open(os.path.join(workspace['insights_processed'], 'generated_report.txt'), 'r') as f:
+            report_content = f.read()
+
+        # Get all image files in the processed_insight folder
+        image_files = glob.glob(os.path.join(workspace['insights_processed'], '*.png'))
+        image_urls = [f'/processed_insight/{os.path.basename(file)}' for file in image_files]
+
+        return jsonify({
+            'success': True,
+            'report': report_content,
+            'images': image_urls
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+# chat query
+@app.route('/api/chat_query', methods=['POST'])
+def chat_query():
+    try:
+        data = request.get_json()
+        query = data.get('query')
+        if not query:
+            return jsonify({'success': False, 'error': 'No query provided'})
+        
+        report_path = os.path.join(current_workspace()['insights_processed'], 'generated_report.txt')
+        response = chatbox(query, report_path)
+        if response is None:
+            return jsonify({'success': False, 'error': 'Failed to get response from chatbox'})
+        
+        return jsonify({'success': True, 'response': response})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+
+
+if __name__=='__main__':
+    app.run(host='0.0.0.0', port=5000)
+
+
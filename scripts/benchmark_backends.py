@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# run from the repository root: python scripts/benchmark_backends.py data/<file>.csv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the layouts classified while benchmarking are not registered with the ones of the app
+os.environ.setdefault('SCHEMA_REGISTRY_ROOT', tempfile.mkdtemp(prefix='schema_registry_'))
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process.worker_pool import shutdown_process_pool, PROCESS_POOL_WORKERS
+
+BACKENDS = ['pandas', 'polars']
+
+
+def run(input_path, report_dir):
+    # The 'rows' and 'cleaned' stages of the preprocessing, timed separately
+    start = time.perf_counter()
+    df, state, model = preprocessor.clean_rows(input_path, report_dir)
+    rows = time.perf_counter()
+    df, state, model = preprocessor.finish_cleaning(df, state, model, report_dir)
+    return df, state, model, rows - start, time.perf_counter() - rows
+
+
+def memory(field):
+    # A memory figure of this process from /proc (Linux), in MB: VmRSS the memory held now, VmHWM its peak
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ':')) / 1024
+
+
+def measure(backend, input_path, report_dir, repeat):
+    # Runs of one backend in a process of their own, so the peak memory is the one of that backend alone. Returns
+    # the output of the last run, the timings of every run, the memory held before the runs and the peak of the runs
+    preprocessor.PREPROCESS_BACKEND = backend
+    # the peak is reset, a new process starts from the peak of the one that started it
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    before = memory('VmRSS')
+    timings = []
+    for _ in range(repeat):
+        df, state, model, rows, cleaned = run(input_path, report_dir)
+        timings.append((rows, cleaned, rows + cleaned))
+    shutdown_process_pool()
+    return (df, state, model), timings, before, memory('VmHWM')
+
+
+def compare(expected, output):
+    # The golden comparison: the dataset, its reports and profile and the append model must be the same
+    (expected_df, expected_state, (expected_model, expected_arrays)) = expected
+    (df, state, (model, arrays)) = output
+    pd.testing.assert_frame_equal(df, expected_df, check_exact=True)
+    assert state == expected_state, 'the column types, profile or reports differ'
+    assert model == expected_model, 'the append model differs'
+    assert arrays.keys() == expected_arrays.keys()
+    for key, values in arrays.items():
+        np.testing.assert_array_equal(values, expected_arrays[key], err_msg=key)
+
+
+# run from the repository root. The pandas backend transforms larger datasets in the process pool, set
+# PROCESS_POOL_WORKERS=<n> for a given number of workers; polars uses its own threads (POLARS_MAX_THREADS).
+# Every backend runs in a new process, its peak memory (Linux only) is reported with the memory the process held
+# before the runs (the interpreter and the modules imported); the workers of the pandas process pool are not counted
+def main():
+    parser = argparse.ArgumentParser(description='Compare the speed and output of the preprocessing backends')
+    parser.add_argument('input_path', help='CSV file to preprocess, the golden dataset of the comparison')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per backend, the median is reported')
+    args = parser.parse_args()
+
+    print(f"{os.path.getsize(args.input_path) / 1e6:.1f} MB CSV, {PROCESS_POOL_WORKERS} worker processes")
+    outputs = {}
+    with tempfile.TemporaryDirectory() as report_dir:
+        for backend in BACKENDS:
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                output, timings, before, peak = executor.submit(measure, backend, args.input_path, report_dir,
+                                                                args.repeat).result()
+            outputs[backend] = output
+            rows, cleaned, total = np.median(timings, axis=0)
+            print(f"{backend:<8} median {total:.3f}s  rows stage {rows:.3f}s  cleaned stage {cleaned:.3f}s  "
+                  f"{len(output[0])} rows  peak memory {peak:.0f} MB ({before:.0f} MB before the runs)")
+
+    for backend in BACKENDS[1:]:
+        compare(outputs[BACKENDS[0]], outputs[backend])
+    print('outputs identical')
+
+
+if __name__ == '__main__':
+    main()
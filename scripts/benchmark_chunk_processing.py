@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+# run from the repository root: python scripts/benchmark_chunk_processing.py data/<file>.csv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# shared_arrow measures the pool at every size, the transform of the app only uses it above this many rows
+os.environ.setdefault('TRANSFORM_IN_PROCESS_MAX_ROWS', '0')
+
+from src.data_process.columnclassifier import categorize_columns
+from src.data_process.data_preprocessor_for_visualisation import (
+    drop_col_row, kde_impute, cap_outliers_iqr_with_zeros_pandas)
+from src.data_process.columnar_store import write_dataset
+from src.data_process.pandas_backend import process_chunk, transform_in_pool, process_datetime_columns
+from src.data_process.worker_pool import map_in_pool, get_process_pool, shutdown_process_pool, PROCESS_POOL_WORKERS
+
+
+def prepare(input_path):
+    # Run the pipeline up to the transform stage, the input all strategies get
+    df = pd.read_csv(input_path, low_memory=False)
+    df = drop_col_row(df, categorize_columns(df)['datetime_columns'])
+    column_types = categorize_columns(df)
+    df = kde_impute(df, column_types['numeric_columns'])
+    df, _ = cap_outliers_iqr_with_zeros_pandas(df, column_types['numeric_columns'])
+    return df, column_types
+
+
+def pickled_chunks(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats):
+    # The previous path: ten DataFrame chunks pickled to the workers and back
+    chunks = np.array_split(df, 10)
+    return pd.concat(map_in_pool(process_chunk, chunks, datetime_columns, categorical_columns, id_columns,
+                                   date_formats))
+
+
+def single_process(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats):
+    # Vectorized in this process, no workers
+    return process_chunk(df, datetime_columns, categorical_columns, id_columns, date_formats)
+
+
+def shared_arrow(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats):
+    # Date columns shared through a memory-mapped Arrow file, only parsed columns returned
+    return transform_in_pool(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats)
+
+
+STRATEGIES = {'pickled_chunks': pickled_chunks, 'single_process': single_process, 'shared_arrow': shared_arrow}
+
+
+def parse_dates(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats):
+    # The date parsing alone, the most the pool can take off the transform
+    return process_datetime_columns(df[datetime_columns].copy(), datetime_columns, date_formats)
+
+
+def hand_off(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats):
+    # Writing the date columns for the workers, the part of shared_arrow that always runs in this process
+    write_dataset(df[datetime_columns], os.path.join(work_dir, 'hand_off.tmp.feather'))
+
+
+PARTS = {'parse_dates': parse_dates, 'hand_off': hand_off}
+
+
+def median_time(strategy, repeat, df, *args):
+    # Median time of a strategy, and its output
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = strategy(df.copy(), *args)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings), output
+
+
+# run from the repository root with PROCESS_POOL_WORKERS=<n> (at least 2) to benchmark a given number of workers.
+# --rows times the strategies on the first rows of the dataset for every count given, to find the crossover: the
+# fewest rows from which shared_arrow beats single_process. The pool can save at most parse_dates, minus the
+# hand_off it adds in this process
+def main():
+    parser = argparse.ArgumentParser(description='Compare the ways of running the transform stage')
+    parser.add_argument('input_path', help='CSV file to preprocess')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per strategy, the median is reported')
+    parser.add_argument('--rows', type=lambda value: [int(rows) for rows in value.split(',')],
+                        help='comma-separated row counts to time, all rows by default')
+    args = parser.parse_args()
+
+    df, column_types = prepare(args.input_path)
+    datetime_columns = column_types['datetime_columns']
+    transform_args = (column_types['categorical_columns'], column_types['id_columns'], column_types['date_formats'])
+    print(f"{len(df)} rows, {len(df.columns)} columns, {len(datetime_columns)} date columns, "
+          f"{PROCESS_POOL_WORKERS} worker processes")
+
+    # start the workers before timing
+    get_process_pool().submit(int).result()
+    crossover = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.rows or [len(df)]:
+            rows_df = df.iloc[:rows].reset_index(drop=True)
+            timings, outputs = {}, {}
+            for name, strategy in {**STRATEGIES, **PARTS}.items():
+                timings[name], outputs[name] = median_time(strategy, args.repeat, rows_df, work_dir,
+                                                           datetime_columns, *transform_args)
+            print(f"{len(rows_df)} rows  " + '  '.join(f"{name} {timing:.3f}s" for name, timing in timings.items()))
+            if crossover is None and timings['shared_arrow'] < timings['single_process']:
+                crossover = len(rows_df)
+
+            # every strategy must produce the same data
+            expected = outputs['pickled_chunks'].reset_index(drop=True)
+            for name in STRATEGIES:
+                pd.testing.assert_frame_equal(outputs[name].reset_index(drop=True), expected)
+    shutdown_process_pool()
+    print('outputs identical')
+    print(f"shared_arrow is faster from {crossover} rows" if crossover else 'shared_arrow is slower at every size')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.stats import gaussian_kde, ks_2samp
+
+# run from the repository root: python scripts/benchmark_imputation.py data/<file>.csv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_process.imputation import kde_impute
+from src.data_process.worker_pool import shutdown_process_pool, PROCESS_POOL_WORKERS
+
+
+def scipy_full(df, columns):
+    # The previous implementation: a KDE of every value of every column, one column after the other, unseeded
+    for col in columns:
+        data = df[col].dropna().values
+        if len(data) == 0 or len(np.unique(data)) == 1:
+            continue
+        kde = gaussian_kde(data)
+        missing_indices = df[col].isna()
+        df.loc[missing_indices, col] = kde.resample(missing_indices.sum()).flatten()
+    return df
+
+
+def sampled_kde(df, columns):
+    return kde_impute(df, columns, mode='kde')
+
+
+def histogram(df, columns):
+    return kde_impute(df, columns, mode='histogram')
+
+
+STRATEGIES = {'scipy_full': scipy_full, 'sampled_kde': sampled_kde, 'histogram': histogram}
+
+
+def hide_values(df, columns, fraction, seed):
+    # Hide a fraction of the known values of every column, the imputed values are compared with them
+    rng = np.random.default_rng(seed)
+    hidden = {}
+    for col in columns:
+        known = np.flatnonzero(df[col].notna().to_numpy())
+        rows = rng.choice(known, int(len(known) * fraction), replace=False)
+        hidden[col] = (rows, df[col].to_numpy()[rows].astype('float64'))
+        df.loc[df.index[rows], col] = np.nan
+    return hidden
+
+
+# run from the repository root. Columns are imputed in the process pool for inputs of IN_PROCESS_MAX_ROWS
+# values or more, set PROCESS_POOL_WORKERS=<n> to benchmark a given number of workers
+def main():
+    parser = argparse.ArgumentParser(description='Compare the speed and fidelity of the imputation strategies')
+    parser.add_argument('input_path', help='CSV file whose numeric columns are imputed')
+    parser.add_argument('--hide', type=float, default=0.2, help='fraction of the known values hidden and imputed')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per strategy, the median is reported')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input_path, low_memory=False)
+    columns = [col for col in df.select_dtypes(include=['number']).columns if df[col].nunique() > 1]
+    df = df[columns].astype('float64')
+    hidden = hide_values(df, columns, args.hide, seed=0)
+    missing = int(df.isna().sum().sum())
+    print(f"{len(df)} rows, {len(columns)} numeric columns, {missing} values to impute, "
+          f"{PROCESS_POOL_WORKERS} worker processes")
+
+    # fidelity: Kolmogorov-Smirnov distance between the imputed and the hidden values, and the error of their mean
+    # relative to the spread of the column, averaged over the columns
+    for name, strategy in STRATEGIES.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = strategy(df.copy(), columns)
+            timings.append(time.perf_counter() - start)
+        ks, mean_error = [], []
+        for col, (rows, truth) in hidden.items():
+            imputed = output[col].to_numpy()[rows]
+            ks.append(ks_2samp(imputed, truth).statistic)
+            mean_error.append(abs(imputed.mean() - truth.mean()) / truth.std())
+        median = np.median(timings)
+        print(f"{name:<12} median {median:.3f}s  {missing / median / 1e6:6.2f}M values/s  "
+              f"KS {np.mean(ks):.4f}  mean error {np.mean(mean_error):.4f} std")
+    shutdown_process_pool()
+
+
+if __name__ == '__main__':
+    main()
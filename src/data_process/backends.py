@@ -0,0 +1,30 @@
+import os
+import importlib
+
+# Library an upload is read and cleaned, and its rows imputed, capped, transformed and compacted with: 'pandas',
+# 'polars' to read the CSV once and do every step in polars queries, or 'cudf' to clean and transform the rows on the
+# GPU with RAPIDS (the upload is read and profiled, and the numeric columns imputed and capped, by pandas there)
+PREPROCESS_BACKEND = os.getenv('PREPROCESS_BACKEND', 'pandas')
+# Module of every backend. A backend is imported the first time it is used, so a deployment (and every worker
+# process) only imports the libraries of the backend it runs: polars and RAPIDS need not be installed for pandas
+BACKEND_MODULES = {'pandas': 'src.data_process.pandas_backend', 'polars': 'src.data_process.polars_backend',
+                   'cudf': 'src.data_process.cudf_backend'}
+
+
+def get_backend(name=None):
+    # The module of a backend, PREPROCESS_BACKEND by default. Every backend module has the same functions, the
+    # frames they take and return are frames of its library until compact returns them as a pandas DataFrame:
+    #   read_upload(input_path) -> upload, the pandas dtypes of its columns
+    #   profile_upload(upload) -> profiler.profile_dataset of the upload
+    #   hash_rows(upload, dropped_columns) -> incremental.row_hashes of the upload on the columns kept
+    #   drop_columns_and_rows(upload, dropped_columns, datetime_columns, hashes)
+    #       -> rows, rows_missing_dates, duplicate_rows
+    #   sample_rows(rows, positions) -> pandas DataFrame of the rows at the positions
+    #   transform(rows, column_types, work_dir, job_id) -> rows imputed, capped, with dates parsed, text filled
+    #       and durations, the samples the imputers are fitted on, the capping counts and the capping bounds
+    #   compact(rows, column_types, job_id) -> the cleaned dataset as a compacted pandas DataFrame
+    #   write_frame(rows, path), read_frame(path) -> rows
+    name = name or PREPROCESS_BACKEND
+    if name not in BACKEND_MODULES:
+        raise ValueError(f"Unknown preprocessing backend '{name}', expected one of {', '.join(BACKEND_MODULES)}")
+    return importlib.import_module(BACKEND_MODULES[name])
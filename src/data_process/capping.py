@@ -0,0 +1,55 @@
+import numpy as np
+from src.data_process.profiler import column_quantiles
+
+
+def iqr_bounds(values, sample_rows=None, rng=None):
+    # Capping bounds of every column of a 2D float array: 1.5 IQR beyond the quartiles of its non-zero values,
+    # NaN for a column without any. With sample_rows the quartiles are approximated on that many random rows
+    non_zero = np.where(values == 0, np.nan, values)
+    if sample_rows is not None and len(non_zero) > sample_rows:
+        rng = rng or np.random.default_rng()
+        non_zero = non_zero[rng.choice(len(non_zero), sample_rows, replace=False)]
+    (Q1, Q3), _, _ = column_quantiles(non_zero, [0.25, 0.75])
+    IQR = Q3 - Q1
+    return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+
+def cap_values(values, lower, upper):
+    # Clip the non-zero values of every column of a 2D float array to its bounds, in place.
+    # Returns the number of clipped cells and of non-zero values per column
+    non_zero = (values != 0) & ~np.isnan(values)
+    capped = non_zero & ((values < lower) | (values > upper))
+    np.clip(values, lower, upper, out=values, where=non_zero & ~np.isnan(lower))
+    return capped.sum(axis=0), non_zero.sum(axis=0)
+
+
+def cap_columns(df, numerical_columns, profile=None, sample_rows=None, bounds=None):
+    # Cap the outliers of all numeric columns at once to 1.5 IQR beyond the quartiles of their non-zero values.
+    # The quartiles come from the profile of df when given, otherwise from one pass over the numeric columns
+    # (approximated on sample_rows rows), bounds (lower and upper arrays) are used as they are. Returns df, the
+    # number of values capped in every column (None for columns without non-zero values) and the bounds
+    values = df[numerical_columns].to_numpy(dtype='float64', na_value=np.nan)
+    if bounds is not None:
+        lower, upper = bounds
+    elif profile is not None:
+        Q1, _, Q3 = np.array([[np.nan if q is None else q for q in profile['columns'][col]['non_zero_quantiles']]
+                              for col in numerical_columns], dtype='float64').T
+        IQR = Q3 - Q1
+        lower, upper = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+    else:
+        lower, upper = iqr_bounds(values, sample_rows)
+    outliers_capped, non_zero = cap_values(values, lower, upper)
+
+    # only the columns with clipped values are written back
+    capping = {}
+    for i, col in enumerate(numerical_columns):
+        if outliers_capped[i]:
+            df[col] = values[:, i]
+        capping[col] = int(outliers_capped[i]) if non_zero[i] else None
+    return df, capping, (lower, upper)
+
+
+def capping_report(capping):
+    # Outlier capping lines of the report after preprocessing
+    return [f"Handled {capped} outliers in column '{col}'." if capped is not None
+            else f"No non-zero values in column '{col}'. Skipping outlier handling." for col, capped in capping.items()]
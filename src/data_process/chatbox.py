@@ -7,8 +7,8 @@ load_dotenv()
 # Load your API key from an environment variable 
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 
-# define the chatbox function with taking a query from the user
-def chatbox(inputtext):
+# define the chatbox function with taking a query from the user and the report to answer from
+def chatbox(inputtext, report_path):
 
     # Configure the API
     genai.configure(api_key=gemini_api_key)
@@ -48,11 +48,8 @@ Please answer the following questions about the loan portfolio analysis:
 
     """
 
-    # Path to the generated report
-    file_path = 'src/insights_processed/generated_report.txt'
-
     # Read the generated report
-    with open(file_path, 'r') as file:
+    with open(report_path, 'r') as file:
         insights = file.read()
 
     query = inputtext
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pandas as pd
+
+# CSV files larger than this are preprocessed chunk by chunk instead of being loaded whole
+STREAMING_THRESHOLD_BYTES = int(os.getenv('STREAMING_THRESHOLD_BYTES', 1024 ** 3))
+# Rows read from the CSV at a time in streaming mode
+STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', 100_000))
+# Values per numeric column kept to fit the KDE and estimate the IQR bounds in streaming mode
+STREAM_SAMPLE_SIZE = int(os.getenv('STREAM_SAMPLE_SIZE', 200_000))
+# Rows kept from every chunk, evenly spaced, for classifying the columns in streaming mode
+CLASSIFY_ROWS_PER_CHUNK = 100
+
+
+def should_stream(input_path):
+    return os.path.getsize(input_path) > STREAMING_THRESHOLD_BYTES
+
+
+def read_csv_chunks(input_path, dtype=None):
+    # Iterate over the CSV in chunks of STREAM_CHUNK_ROWS rows
+    return pd.read_csv(input_path, chunksize=STREAM_CHUNK_ROWS, dtype=dtype)
+
+
+def append_csv_rows(df, path):
+    # Add the rows of df to the end of a CSV file with the same columns
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    df.to_csv(path, mode='a', header=False, index=False)
+
+
+def _merge_dtype(current, new):
+    # The dtype a column gets when it is read whole, given the dtypes it got in two chunks
+    if current is None or current == new:
+        return new
+    if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new) \
+            and not pd.api.types.is_bool_dtype(current) and not pd.api.types.is_bool_dtype(new):
+        return np.dtype('float64')
+    return np.dtype('object')
+
+
+def scan_csv(input_path):
+    # First pass over the CSV: row count, missing values per column, the dtype of every column
+    # and rows sampled across the whole file, without holding more than one chunk in memory
+    rows = 0
+    missing = None
+    dtypes = {}
+    samples = []
+    for chunk in read_csv_chunks(input_path):
+        rows += len(chunk)
+        counts = chunk.isnull().sum()
+        missing = counts if missing is None else missing + counts
+        for column in chunk.columns:
+            dtypes[column] = _merge_dtype(dtypes.get(column), chunk[column].dtype)
+        samples.append(sample_chunk(chunk))
+    sample = pd.concat(samples).astype(dtypes)
+    return {'rows': rows, 'missing': missing, 'dtypes': dtypes, 'sample': sample}
+
+
+def sample_chunk(chunk):
+    # Evenly spaced rows of the chunk, gathered over all chunks to classify the columns
+    return chunk.iloc[::max(len(chunk) // CLASSIFY_ROWS_PER_CHUNK, 1)]
+
+
+def drop_seen_rows(chunk, seen_blocks):
+    # Drop the rows of the chunk that are duplicates of rows in earlier chunks or earlier in the chunk.
+    # Earlier rows are remembered as sorted blocks of 64-bit row hashes, merged so there are only a few blocks
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    for block in seen_blocks:
+        positions = np.minimum(np.searchsorted(block, hashes), len(block) - 1)
+        keep &= block[positions] != hashes
+    # a chunk of only duplicates adds no block, lookups assume blocks are not empty
+    if keep.any():
+        seen_blocks.append(np.sort(hashes[keep]))
+    while len(seen_blocks) > 1 and len(seen_blocks[-1]) >= len(seen_blocks[-2]):
+        newest = seen_blocks.pop()
+        seen_blocks[-1] = np.sort(np.concatenate([seen_blocks[-1], newest]))
+    return chunk[keep]
+
+
+def update_sample(sample, seen, values, rng):
+    # Reservoir sampling: keep a uniform sample of at most STREAM_SAMPLE_SIZE of all values seen so far.
+    # Returns the new sample and the number of values seen
+    values = np.asarray(values, dtype='float64')
+    room = max(STREAM_SAMPLE_SIZE - len(sample), 0)
+    sample = np.concatenate([sample, values[:room]])
+    rest = values[room:]
+    if len(rest):
+        slots = rng.integers(0, seen + room + np.arange(1, len(rest) + 1))
+        replaced = slots < STREAM_SAMPLE_SIZE
+        sample[slots[replaced]] = rest[replaced]
+    return sample, seen + len(values)
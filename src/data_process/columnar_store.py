@@ -0,0 +1,137 @@
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Inferred types of object columns that Arrow can store as they are
+ARROW_OBJECT_TYPES = {'string', 'empty', 'bytes', 'boolean', 'integer', 'floating', 'decimal', 'date', 'datetime'}
+
+
+def _arrow_safe(df):
+    # Object columns that mix values of different types (e.g. numbers and 'Unknown') are stored as text,
+    # which is what they were when the dataset was saved as CSV
+    mixed = [column for column in df.columns
+             if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True) not in ARROW_OBJECT_TYPES]
+    if not mixed:
+        return df
+    df = df.copy(deep=False)
+    for column in mixed:
+        df[column] = df[column].astype(str).where(df[column].notna(), None)
+    return df
+
+
+def write_dataset(df, path):
+    # Save the DataFrame as an uncompressed Arrow IPC (Feather v2) file so it can be memory-mapped.
+    # The pandas metadata stored with the schema brings dtypes such as datetime and category back on read
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    feather.write_feather(table, path, compression='uncompressed')
+
+
+class DatasetWriter:
+    # Writes a dataset to an Arrow IPC file one DataFrame chunk at a time.
+    # The first chunk fixes the schema, later chunks are cast to it
+    def __init__(self, path):
+        self.path = path
+        self.schema = None
+        self._writer = None
+
+    def write(self, df):
+        table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+        if self._writer is None:
+            # columns that are empty in the first chunk hold text in the others
+            self.schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                     for field in table.schema], metadata=table.schema.metadata)
+            self._writer = pa.ipc.new_file(self.path, self.schema)
+        self._writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _same_type(column, other):
+    # Whether two Arrow arrays hold their values the same way, dictionary columns with the same dictionary
+    if column.type != other.type:
+        return False
+    return not pa.types.is_dictionary(column.type) or column.dictionary.equals(other.dictionary)
+
+
+def append_rows(path, df):
+    # Rewrite the Arrow IPC file at path with the rows of df after its own, the columns in the order and dtypes of
+    # df. The batches of the file are copied as they are, only their columns held in another type (or with other
+    # categories) are converted. Raises ValueError if df does not have the columns of the file
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    schema = read_schema(path)
+    if sorted(table.schema.names) != sorted(schema.names):
+        raise ValueError("The appended rows do not have the columns of the dataset")
+    for i, field in enumerate(table.schema):
+        # columns without values in df take the type they have in the file
+        stored = schema.field(field.name).type
+        if pa.types.is_null(field.type) and not pa.types.is_null(stored):
+            table = table.set_column(i, field.with_type(stored), table.column(i).cast(stored))
+    new_columns = [column.combine_chunks() for column in table.columns]
+    staging = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with pa.OSFile(path) as source:
+            reader = pa.ipc.open_file(source)
+            with pa.ipc.new_file(staging, table.schema) as writer:
+                for index in range(reader.num_record_batches):
+                    batch = reader.get_batch(index)
+                    columns = []
+                    for name, new in zip(table.schema.names, new_columns):
+                        column = batch.column(name)
+                        if not _same_type(column, new):
+                            column = pa.Array.from_pandas(column.to_pandas().astype(df[name].dtype), type=new.type)
+                        columns.append(column)
+                    writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=table.schema))
+                writer.write_table(table)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+    os.replace(staging, path)
+
+
+def iter_batches(path):
+    # Read an Arrow IPC file back one written chunk at a time, as DataFrames.
+    # Plain reads rather than a memory map, so pages of chunks already processed do not stay resident
+    with pa.OSFile(path) as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index).to_pandas()
+
+
+def read_dataset(path, columns=None):
+    # Read the given columns (all if None) from a memory-mapped Arrow IPC file
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def read_rows(path, columns, start, stop):
+    # Read a range of rows of some columns from a memory-mapped Arrow IPC file, without reading the other rows
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.slice(start, stop - start).to_pandas()
+
+
+def read_dtypes(path):
+    # pandas dtypes of the columns of an Arrow IPC file, with the categories of category columns, without its rows
+    return feather.read_table(path, memory_map=True).slice(0, 0).to_pandas().dtypes
+
+
+def read_schema(path):
+    # Read only the schema of an Arrow IPC file
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def numeric_columns(schema):
+    # Names of the integer and floating point columns of a schema
+    return [field.name for field in schema
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# Rows looked at to classify the columns, one from each of this many equal slices of the dataset
+SAMPLE_ROWS = 1000
+# Share of the sampled values that must parse as dates (or numbers) for a text column to count as such
+MATCH_RATIO = 0.95
+# Date formats tried on text columns. When several parse the sample equally well the first one wins
+DATE_FORMATS = [
+    '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+    '%Y/%m/%d', '%m-%d-%Y', '%d-%m-%Y', '%d.%m.%Y', '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y',
+]
+# Text that looks like it contains a date, checked before any format is tried
+DATE_PATTERN = r'\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}|\d{1,2} [A-Za-z]{3,9},? \d{4}|[A-Za-z]{3,9} \d{1,2},? \d{4}'
+# Keywords found in the names of ID columns, and columns that are always IDs
+ID_KEYWORDS = ['id', 'identifier', 'key', 'code', 'number', 'no', 'num', 'project']
+ID_COLUMNS = ['project id', 'loan number']
+
+
+def sample_positions(n_rows, sample_rows=SAMPLE_ROWS):
+    # Row positions spread evenly over the dataset, so sorted data is sampled from start to end
+    if n_rows <= sample_rows:
+        return np.arange(n_rows)
+    return np.linspace(0, n_rows - 1, sample_rows).astype(int)
+
+
+def _parsed_ratio(values, date_format):
+    return pd.to_datetime(values, format=date_format, errors='coerce').notna().mean()
+
+
+def detect_date_format(values):
+    # Format the text values are dates in, 'mixed' if they are dates in no single known format,
+    # or None if they are not dates
+    if len(values) == 0 or values.str.contains(DATE_PATTERN).mean() < MATCH_RATIO:
+        return None
+
+    # try every format on a few values, then the formats that fit them on the whole sample
+    head = values.head(50)
+    candidates = [date_format for date_format in DATE_FORMATS if _parsed_ratio(head, date_format) >= MATCH_RATIO]
+    best_format, best_ratio = None, 0
+    for date_format in candidates:
+        ratio = _parsed_ratio(values, date_format)
+        if ratio > best_ratio:
+            best_format, best_ratio = date_format, ratio
+    if best_ratio >= MATCH_RATIO:
+        return best_format
+
+    # other layouts are parsed value by value
+    if _parsed_ratio(values, 'mixed') >= MATCH_RATIO:
+        return 'mixed'
+    return None
+
+
+def classify_column(name, column, unique_ratio=None):
+    # Type of a sampled column ('id', 'numeric', 'datetime' or 'categorical') and the format of its dates.
+    # The share of unique values is measured on the sample unless it is known for the whole column
+    values = column.dropna()
+    if unique_ratio is None:
+        unique_ratio = values.nunique() / len(column) if len(column) else 0
+    keyword_id = any(keyword in name.lower() for keyword in ID_KEYWORDS) and unique_ratio > 0.7
+    if name.lower() in ID_COLUMNS:
+        return 'id', None
+
+    # Numbers, unless an ID column holds them
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return ('id' if keyword_id else 'numeric'), None
+
+    # Text in one date format, numbers stored as text are never taken for dates
+    text = values.astype(str)
+    numeric_ratio = pd.to_numeric(text, errors='coerce').notna().mean() if len(text) else 0
+    date_format = detect_date_format(text) if numeric_ratio < MATCH_RATIO else None
+    if date_format is not None:
+        return 'datetime', date_format
+
+    if keyword_id or unique_ratio > 0.95:
+        return 'id', None
+    return 'categorical', None
+
+
+def categorize_columns(df, known_columns=None, profile=None):
+    # Classify the columns on rows sampled across the whole dataframe. Columns in known_columns, from the
+    # schema registry, keep their (category, date format) and are not looked at. With the profile of the
+    # dataframe the share of unique values is taken from its distinct counts
+    known_columns = known_columns or {}
+    profile_columns = profile['columns'] if profile and profile['rows'] else {}
+    sample = df[[col for col in df.columns if col not in known_columns]].iloc[sample_positions(len(df))]
+    # Initialize empty lists for datetime, numeric, categorical, and id columns
+    datetime_columns = []
+    numeric_columns = []
+    categorical_columns = []
+    id_columns = []
+    date_formats = {}
+
+    # Every check is vectorized over the sampled column
+    for col in df.columns:
+        if col in known_columns:
+            category, date_format = known_columns[col]
+        else:
+            unique_ratio = profile_columns[col]['distinct'] / profile['rows'] if col in profile_columns else None
+            category, date_format = classify_column(col, sample[col], unique_ratio)
+        if category == 'datetime':
+            datetime_columns.append(col)
+            date_formats[col] = date_format
+        elif category == 'numeric':
+            numeric_columns.append(col)
+        elif category == 'id':
+            id_columns.append(col)
+        elif category == 'categorical':
+            categorical_columns.append(col)
+
+    # Return a dictionary containing categorized column lists and the format of every datetime column
+    return {
+        'datetime_columns': datetime_columns,
+        'numeric_columns': numeric_columns,
+        'categorical_columns': categorical_columns,
+        'id_columns': id_columns,
+        'date_formats': date_formats
+    }
@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pandas as pd
+from src.data_process.jobs import set_metric
+from src.data_process.columnar_store import DatasetWriter, iter_batches
+
+# Text columns with at most this share of distinct values are held as pandas categories: one small code per row
+# and every distinct string once. Columns of mostly unique values (ids) stay text, categories would not save memory
+COMPACT_CATEGORY_RATIO = float(os.getenv('COMPACT_CATEGORY_RATIO', 0.5))
+# Integer dtypes columns are downcast to, smallest first
+INTEGER_DTYPES = ['int8', 'int16', 'int32']
+
+
+def summarize_columns(df, summary=None, max_values=None):
+    # What compact_dtypes needs to know of every column, merged into the summary of the earlier chunks of a dataset:
+    # the distinct values of text columns, the range of integer columns and whether float columns only hold values
+    # float32 represents exactly. Text columns with more than max_values distinct values stop being tracked
+    summary = {} if summary is None else summary
+    for col in df.columns:
+        series = df[col]
+        entry = summary.get(col)
+        if entry is not None and entry['kind'] is None:
+            continue
+        # text is held in object columns, or in string columns (the default for text from pandas 3)
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            if pd.api.types.infer_dtype(series, skipna=True) not in ('string', 'empty'):
+                summary[col] = {'kind': None}
+                continue
+            entry = entry or {'kind': 'text', 'values': set()}
+            if entry['values'] is not None:
+                entry['values'].update(series.dropna().unique())
+                if max_values is not None and len(entry['values']) > max_values:
+                    entry['values'] = None
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            entry = entry or {'kind': 'integer', 'min': np.inf, 'max': -np.inf}
+            if len(series):
+                entry['min'] = min(entry['min'], int(series.min()))
+                entry['max'] = max(entry['max'], int(series.max()))
+        elif pd.api.types.is_float_dtype(series) and series.dtype != 'float32':
+            entry = entry or {'kind': 'float', 'exact': True}
+            values = series.to_numpy()
+            entry['exact'] = entry['exact'] and np.array_equal(values.astype('float32').astype(values.dtype), values,
+                                                               equal_nan=True)
+        else:
+            entry = {'kind': None}
+        summary[col] = entry
+    return summary
+
+
+def compact_dtypes(summary, rows):
+    # The smallest dtype every column can be held in without changing any of its values: categories of the sorted
+    # distinct values for repeated text, the smallest integer type holding the range, float32 for exact floats
+    dtypes = {}
+    for col, entry in summary.items():
+        if entry['kind'] == 'text':
+            if entry['values'] is not None and len(entry['values']) <= COMPACT_CATEGORY_RATIO * rows:
+                dtypes[col] = pd.CategoricalDtype(sorted(entry['values']))
+        elif entry['kind'] == 'integer':
+            for dtype in INTEGER_DTYPES:
+                if np.iinfo(dtype).min <= entry['min'] and entry['max'] <= np.iinfo(dtype).max:
+                    dtypes[col] = dtype
+                    break
+        elif entry['kind'] == 'float' and entry['exact']:
+            dtypes[col] = 'float32'
+    return dtypes
+
+
+def append_dtypes(dtypes, df):
+    # dtypes of a compacted dataset once the rows of df are appended to it, widened so both keep all their values:
+    # categories get the new text values, integers the smallest type holding both ranges and float32 columns stay
+    # float32 only if the new values are exact in it
+    summary = summarize_columns(df)
+    widened = {}
+    for col, dtype in dtypes.items():
+        entry = summary[col]
+        if isinstance(dtype, pd.CategoricalDtype):
+            if entry['kind'] == 'text':
+                dtype = pd.CategoricalDtype(sorted(set(dtype.categories) | entry['values']))
+            elif df[col].notna().any():
+                dtype = np.dtype('object')
+        elif dtype == 'float32':
+            if not (entry['kind'] == 'float' and entry['exact']) and df[col].dtype != 'float32':
+                dtype = np.result_type(dtype, df[col].dtype)
+        elif pd.api.types.is_integer_dtype(dtype) and entry['kind'] == 'integer':
+            fits = [new for new in INTEGER_DTYPES
+                    if len(df) == 0 or np.iinfo(new).min <= entry['min'] and entry['max'] <= np.iinfo(new).max]
+            dtype = np.promote_types(dtype, fits[0] if fits else df[col].dtype)
+        elif dtype != df[col].dtype and len(df):
+            numeric = pd.api.types.is_numeric_dtype(dtype) and pd.api.types.is_numeric_dtype(df[col])
+            dtype = np.result_type(dtype, df[col].dtype) if numeric else np.dtype('object')
+        widened[col] = dtype
+    return widened
+
+
+def report_memory(job_id, before, after, dtypes):
+    # Bytes every column took before and after compaction, with its new dtype
+    columns = {str(col): {'dtype': str(dtypes[col]), 'before': int(before[col]), 'after': int(after[col])}
+               for col in before.index}
+    set_metric(job_id, 'memory', {'before': int(before.sum()), 'after': int(after.sum()), 'columns': columns})
+
+
+def compact_dataset(df, job_id=None):
+    # Hold every column of the processed DataFrame in its smallest lossless dtype
+    before = df.memory_usage(deep=True, index=False)
+    df = df.astype(compact_dtypes(summarize_columns(df), len(df)))
+    report_memory(job_id, before, df.memory_usage(deep=True, index=False), df.dtypes)
+    return df
+
+
+def compact_dataset_file(path, dtypes):
+    # Rewrite a dataset file chunk by chunk with its columns cast to dtypes. Every chunk of a text column gets the
+    # same categories, so the file holds a single dictionary per column. Returns the bytes of the compacted columns,
+    # with the categories counted once as they are when the whole dataset is loaded
+    after = None
+    staging = f'{path}.compact.tmp'
+    categories = {col: dtype.categories for col, dtype in dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    with DatasetWriter(staging) as writer:
+        for chunk in iter_batches(path):
+            chunk = chunk.astype(dtypes)
+            usage = chunk.memory_usage(deep=True, index=False)
+            for col in categories:
+                usage[col] = chunk[col].cat.codes.to_numpy().nbytes
+            after = usage if after is None else after + usage
+            writer.write(chunk)
+    os.replace(staging, path)
+    for col, values in categories.items():
+        after[col] += values.memory_usage(deep=True)
+    return after
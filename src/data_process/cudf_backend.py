@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import cudf
+import pyarrow.feather as feather
+from src.data_process.jobs import set_stage, set_metric
+from src.data_process.compaction import compact_dataset
+# the upload is read, profiled and hashed on the host, as the pandas backend does
+from src.data_process.pandas_backend import read_upload, profile_upload, hash_rows, impute_and_cap
+
+# Format of the dates of columns classified without one, as process_datetime_columns parses them
+DEFAULT_DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+# Columns calculate_loan_duration derives the loan duration from, and the columns it adds
+DURATION_COLUMNS = ['end of period', 'agreement signing date']
+LOAN_DURATION_COLUMNS = ['loan duration (days)', 'loan duration (months)', 'loan duration (years)']
+
+
+def drop_columns_and_rows(df, dropped_columns, datetime_columns, hashes):
+    # drop_col_row on the GPU: the columns of the upload df kept are copied to device memory, and the rows missing a
+    # date are dropped there. Duplicates are then dropped by hashes, the hashes of all rows of the upload on the
+    # columns kept, keeping the first like drop_seen_rows. Returns the rows left and the rows dropped for each reason
+    names = [str(col).strip().lower() for col in df.columns]
+    kept = [i for i, name in enumerate(names) if name not in dropped_columns]
+    rows = cudf.from_pandas(df.iloc[:, kept].set_axis([names[i] for i in kept], axis=1))
+    dates = [col for col in datetime_columns if col in rows.columns]
+    if dates:
+        rows = rows.dropna(subset=dates)
+    # the index still holds the position of every row in the CSV
+    first = ~pd.Series(hashes[rows.index.to_numpy()]).duplicated().to_numpy()
+    kept_rows = rows.iloc[np.flatnonzero(first)].reset_index(drop=True)
+    return kept_rows, len(hashes) - len(rows), len(rows) - len(kept_rows)
+
+
+def sample_rows(df, positions):
+    # Rows of a frame at the given positions, as a pandas DataFrame for the column classifier. The upload is one
+    # already
+    rows = df.iloc[positions]
+    return rows if isinstance(rows, pd.DataFrame) else rows.to_pandas()
+
+
+def write_frame(df, path):
+    # Save a frame as an uncompressed Arrow IPC file, like columnar_store.write_dataset
+    feather.write_feather(df.to_arrow(), path, compression='uncompressed')
+
+
+def read_frame(path):
+    # Read a frame write_frame saved into device memory
+    return cudf.DataFrame.from_arrow(feather.read_table(path))
+
+
+def parse_dates(column, date_format):
+    # process_datetime_columns for one column: values not in the format become NaT. cudf needs an explicit format,
+    # dates in no single format are parsed on the host
+    if date_format == 'mixed':
+        return cudf.from_pandas(pd.to_datetime(column.to_pandas(), format='mixed', errors='coerce'))
+    return cudf.to_datetime(column, format=date_format, errors='coerce')
+
+
+def loan_duration(df):
+    # calculate_loan_duration on the GPU: days, calendar months and years. Dates still held as text are parsed as
+    # DATE_FORMAT text, failing on values not in it
+    if not all(col in df.columns for col in DURATION_COLUMNS):
+        raise KeyError("Required columns for loan duration calculation are missing")
+    end, start = [df[col] if df[col].dtype == 'datetime64[ns]' else cudf.to_datetime(df[col], format='%d/%m/%Y')
+                  for col in DURATION_COLUMNS]
+    df[LOAN_DURATION_COLUMNS[0]] = (end - start).dt.days
+    df[LOAN_DURATION_COLUMNS[1]] = (end.dt.year - start.dt.year) * 12 + (end.dt.month - start.dt.month)
+    df[LOAN_DURATION_COLUMNS[2]] = df[LOAN_DURATION_COLUMNS[0]] / 365.25
+    return df
+
+
+def transform(df, column_types, work_dir=None, job_id=None):
+    # impute_and_cap on the host for the numeric columns of the cleaned rows, then process_chunk on the GPU with the
+    # numeric columns replaced by the imputed and capped ones, and the index column dropped
+    numeric_columns = column_types['numeric_columns']
+    numeric, samples, capping, bounds = impute_and_cap(df[numeric_columns].to_pandas(), numeric_columns, job_id)
+    set_stage(job_id, 'transform')
+    set_metric(job_id, 'transform_schedule', {'mode': 'cudf'})
+    if len(numeric.columns):
+        imputed = cudf.from_pandas(numeric)
+        for col in numeric.columns:
+            df[col] = imputed[col]
+    date_formats = column_types['date_formats']
+    for col in column_types['datetime_columns']:
+        df[col] = parse_dates(df[col], date_formats.get(col, DEFAULT_DATE_FORMAT))
+    # only text columns are filled here, see compact
+    text = [col for col in column_types['categorical_columns'] + column_types['id_columns'] if df[col].dtype == object]
+    if text:
+        df[text] = df[text].fillna('Unknown')
+    df = loan_duration(df)
+    existing = [col for col in df.columns if col not in LOAN_DURATION_COLUMNS and col != 'unnamed: 0']
+    return df[LOAN_DURATION_COLUMNS + existing], samples, capping, bounds
+
+
+def compact(df, column_types, job_id=None):
+    # compaction.compact_dataset for a transformed frame, once copied to the host. The categorical and ID columns of
+    # other types pandas fills with text become mixed object columns, they are filled there
+    df = df.to_pandas()
+    fill = column_types['categorical_columns'] + column_types['id_columns']
+    df[fill] = df[fill].fillna('Unknown')
+    return compact_dataset(df, job_id)
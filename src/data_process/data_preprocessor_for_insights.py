@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from src.data_process.jobs import set_stage, set_metric
+from src.data_process.columnar_store import read_dataset, write_dataset
+from src.data_process.data_preprocessor_for_visualisation import cleaned_dataset, STAGE_DATA_FILE
+from src.data_process.result_cache import stage_entry, read_stage_state, store_stage, release_stage
+from src.data_process.schema_registry import load_schema, save_schema
+
+# One-hot encoded columns are 'uint8', one byte per row and category, or 'sparse', only the ones are stored
+ONE_HOT_FORMAT = os.getenv('ONE_HOT_FORMAT', 'uint8')
+
+def choose_encoders(df, categorical_columns, registered=None):
+    # Label encoding for columns with more than 20 unique values, one-hot encoding for the others.
+    # Choices registered for the layout are kept, so every upload of it gets the same features
+    registered = registered or {}
+    return {col: registered.get(col) or ('label' if df[col].nunique() > 20 else 'onehot')
+            for col in categorical_columns}
+
+def label_codes(series):
+    # Codes of the sorted distinct values of a column as text, the labels LabelEncoder gives them.
+    # Categories that are already sorted text are used as they are, other columns are made categories of their text
+    if (isinstance(series.dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(series.cat.categories)
+            and series.cat.categories.is_monotonic_increasing and series.notna().all()):
+        return series.cat.remove_unused_categories().cat.codes
+    return pd.Series(pd.Categorical(series.astype(str)).codes, index=series.index)
+
+def one_hot_block(series, prefix):
+    # Indicator columns of the sorted distinct values of a column, named and ordered like OneHotEncoder's,
+    # in ONE_HOT_FORMAT
+    codes, categories = pd.factorize(series, sort=True)
+    categories = list(categories)
+    if (codes == -1).any():
+        # missing values get their own indicator, last, like OneHotEncoder gives them
+        codes = np.where(codes == -1, len(categories), codes)
+        categories.append(np.nan)
+    names = [f'{prefix}_{category}' for category in categories]
+    if ONE_HOT_FORMAT == 'sparse':
+        matrix = sparse.csc_matrix((np.ones(len(codes), dtype='uint8'), (np.arange(len(codes)), codes)),
+                                   shape=(len(codes), len(categories)))
+        return pd.DataFrame.sparse.from_spmatrix(matrix, index=series.index, columns=names)
+    block = np.zeros((len(codes), len(categories)), dtype='uint8')
+    block[np.arange(len(codes)), codes] = 1
+    return pd.DataFrame(block, index=series.index, columns=names)
+
+def encoded_columns(df, categorical_columns, encoders):
+    # The columns encoding the categorical columns of the dataframe, in one frame
+    blocks = []
+
+    for col in categorical_columns:
+        if encoders[col] == 'label':
+            # Use Label Encoding for columns with more than 20 unique values
+            blocks.append(label_codes(df[col]).rename(f'{col}_encoded'))
+        else:
+            # Use One-Hot Encoding for columns with 20 or fewer unique values
+            blocks.append(one_hot_block(df[col], col))
+
+    if not blocks:
+        return pd.DataFrame(index=df.index)
+    return pd.concat(blocks, axis=1, copy=False)
+
+def encode_categorical_columns(df, categorical_columns, encoders=None):
+    # Add the encoded columns to the dataframe in a single concatenation, the original columns are not copied
+    encoders = encoders or choose_encoders(df, categorical_columns)
+    return pd.concat([df, encoded_columns(df, categorical_columns, encoders)], axis=1, copy=False)
+
+def write_encoded(columns, folder):
+    # Save encoded columns in a stage cache folder. Arrow has no sparse columns, sparse one-hot columns are saved
+    # dense and made sparse again by read_encoded. Returns the state of the stage
+    sparse = [col for col in columns.columns if isinstance(columns[col].dtype, pd.SparseDtype)]
+    write_dataset(columns.astype({col: columns[col].dtype.subtype for col in sparse}),
+                  os.path.join(folder, STAGE_DATA_FILE))
+    return {'sparse': sparse}
+
+def read_encoded(entry):
+    # The encoded columns write_encoded saved in a stage cache entry
+    columns = read_dataset(os.path.join(entry, STAGE_DATA_FILE))
+    sparse = read_stage_state(entry)['sparse']
+    return columns.astype({col: pd.SparseDtype(columns[col].dtype, 0) for col in sparse})
+
+def encoded_dataset(df, state, key, job_id=None, reuse=True):
+    # The 'encoded' stage after the cleaned dataset df of the given state and stage cache key: its categorical
+    # columns encoded with the encoders registered for its layout. The encoded columns are checkpointed in the stage
+    # cache, a later run reads them back instead of encoding again unless reuse is False.
+    # Returns the encoded dataset and its key
+    categorical_columns = state['column_types']['categorical_columns']
+    set_stage(job_id, 'encode')
+    schema = load_schema(state['fingerprint'], {})
+    encoders = choose_encoders(df, categorical_columns, schema.get('encoders') if schema else None)
+    save_schema(state['fingerprint'], {}, encoders=encoders)
+    encoded_key = hashlib.sha256(json.dumps([key, 'encoded', encoders, ONE_HOT_FORMAT]).encode()).hexdigest()
+    entry = stage_entry(encoded_key) if reuse else None
+    if entry is not None:
+        try:
+            columns = read_encoded(entry)
+        finally:
+            release_stage(entry)
+        set_metric(job_id, 'encode_checkpoint', 'resumed')
+    else:
+        columns = encoded_columns(df, categorical_columns, encoders)
+        store_stage(encoded_key, lambda folder: write_encoded(columns, folder))
+        set_metric(job_id, 'encode_checkpoint', 'saved')
+    return pd.concat([df, columns], axis=1, copy=False), encoded_key
+
+def preprocess_insights(input_path, output_dir, job_id=None):
+    # The insights start from the cleaned dataset the visualisation pipeline shares through the stage cache,
+    # the upload is only cleaned here if no pipeline cleaned the same content before.
+    # Returns the encoded dataset and a key of its content, for the later stages to checkpoint their outputs under
+    data_path, state, key = cleaned_dataset(input_path, output_dir, job_id)
+    try:
+        df = read_dataset(data_path)
+    finally:
+        release_stage(os.path.dirname(data_path))
+    return encoded_dataset(df, state, key, job_id)
@@ -0,0 +1,612 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import pandas as pd
+import numpy as np
+from src.data_process.backends import get_backend, PREPROCESS_BACKEND
+from src.data_process.pandas_backend import drop_rows, process_chunk
+from src.data_process.columnclassifier import categorize_columns, sample_positions
+from src.data_process.profiler import (
+    profile_dataset, profile_dataset_file, missing_counts, save_profile, read_profile, profile_sketch, append_profile)
+from src.data_process.schema_registry import (
+    schema_fingerprint, load_schema, known_columns, registered_drops, column_entries, save_schema)
+from src.data_process.jobs import set_stage, set_result, set_metric, raise_if_cancelled
+from src.data_process.imputation import (
+    kde_impute, fit_imputer, draw_values, column_rng, column_sample, impute_column, IMPUTE_SEED, IMPUTE_MODE,
+    IMPUTE_SAMPLE_SIZE, IMPUTE_HISTOGRAM_MIN_VALUES)
+from src.data_process.capping import iqr_bounds, cap_values, cap_columns, capping_report
+from src.data_process.compaction import (
+    summarize_columns, compact_dtypes, compact_dataset_file, report_memory, append_dtypes, COMPACT_CATEGORY_RATIO)
+from src.data_process.columnar_store import (
+    write_dataset, read_dataset, read_dtypes, append_rows, DatasetWriter, iter_batches)
+from src.data_process.chunked_csv import (
+    should_stream, read_csv_chunks, scan_csv, sample_chunk, append_csv_rows,
+    STREAM_CHUNK_ROWS, STREAM_SAMPLE_SIZE)
+from src.data_process.incremental import (
+    save_append_model, load_append_model, row_hashes, unseen_rows, pack_arrays, unpack_arrays, APPEND_MODEL_FILE)
+from src.data_process.result_cache import file_digest, stage_entry, read_stage_state, store_stage, release_stage, \
+    STAGE_DATA_FILE
+
+# Stages of the preprocessing whose outputs are cached, each computed from the output of the stage before it:
+# 'rows' holds the rows and columns kept from the upload, 'cleaned' the dataset both pipelines start from
+PREPROCESSING_STAGES = {'rows': None, 'cleaned': 'rows'}
+# Part of every stage cache key, bump it when a change to the code changes what the stages output
+STAGE_CACHE_VERSION = 2
+# Files the reports of the stages are written to, by the job result they are reported as
+REPORT_FILES = {'before_report': 'before.txt', 'after_report': 'after.txt'}
+
+# Appends to the dataset of a folder run one at a time, each on the dataset and append model the one before left.
+# folder -> lock
+_append_locks = {}
+_append_locks_lock = threading.Lock()
+
+def analyze_csv(df, output_path, capping_info=None, profile=None):
+    # Count the number of missing values in each column, or read them from the profile of df, and write the report
+    missing_values = missing_counts(profile) if profile is not None else df.isnull().sum()
+    return write_report(df.shape, missing_values, output_path, capping_info)
+
+def write_report(shape, missing_values, output_path, capping_info=None):
+    # Missing values and their percentage of the rows
+    missing_percentage = (missing_values / shape[0]) * 100
+    missing_values = missing_values[missing_values > 0]
+    missing_percentage = missing_percentage[missing_percentage > 0]
+    
+    # Build the report text
+    lines = []
+    if missing_values.empty:
+        lines.append("Your Data is cleaned !!!\n")
+        lines.append("New Features added to your dataset\n")
+        lines.append("Loan Duration\n")
+    else:
+        lines.append(f"Shape of the DataFrame: {shape}\n\n")
+        lines.append(f"{'Column Name':<28} | {'Missing Values':<15} | {'Missing Percentage':<5}\n")
+        lines.append(f"{'-'*28}-+-{'-'*15}-+-{'-'*5}\n")
+        for column in missing_values.index:
+            lines.append(f"{column:<28} | {missing_values[column]:<15} | {missing_percentage[column]:<5.2f}%\n")
+
+    # Add capping information if provided
+    if capping_info:
+        lines.append("\nOutlier Capping Information:\n")
+        for info in capping_info:
+            lines.append(f"{info}\n")
+    report = ''.join(lines)
+
+    # Write the results to the output file
+    with open(output_path, 'w') as f:
+        f.write(report)
+    return report
+
+def sparse_columns(profile):
+    # Columns of the profiled dataframe with more than 40% missing values, with the names drop_col_row gives them
+    threshold = 0.4 * profile['rows']
+    return [col.strip().lower() for col, stats in profile['columns'].items() if stats['nulls'] >= threshold]
+
+def report_dropped(job_id, dropped_columns, missing_dates, duplicates):
+    # What the cleaning stage dropped, in the job metrics
+    set_metric(job_id, 'dropped', {'columns': list(dropped_columns), 'rows_missing_dates': int(missing_dates),
+                                   'duplicate_rows': int(duplicates)})
+
+def required_dates(datetime_columns):
+    # Date columns rows missing a value in are dropped, with the agreement signing date in any case
+    datetime_columns = [col.lower().strip() for col in datetime_columns]
+    if 'agreement signing date' not in datetime_columns:
+        datetime_columns.append('agreement signing date')
+    return datetime_columns
+
+def drop_col_row(df, datetime_columns, dropped_columns=None, job_id=None):
+    # Strip and lower case the column names
+    df.columns = df.columns.str.strip().str.lower()
+    
+    # Drop columns with more than 40% missing values, counted in one pass over the null mask, or the columns
+    # given: registered as dropped for this layout or found sparse by the profile
+    if dropped_columns is None:
+        null_counts = df.isna().sum()
+        dropped_columns = null_counts.index[null_counts >= 0.4 * len(df)]
+    dropped_columns = [column for column in dropped_columns if column in df.columns]
+    df = df.drop(columns=dropped_columns)
+
+    # drop rows of missing values in the datetime columns and duplicate rows
+    df, missing_dates, duplicates = drop_rows(df, required_dates(datetime_columns), [])
+    report_dropped(job_id, dropped_columns, missing_dates, duplicates)
+    # reset the index
+    return df.reset_index(drop=True)
+
+def cap_outliers_iqr_with_zeros_pandas(df, numerical_columns, profile=None, sample_rows=None):
+    # Capping outliers using IQR, all numeric columns at once
+    if not numerical_columns:
+        return df, []
+    df, capping, _ = cap_columns(df, numerical_columns, profile, sample_rows)
+    return df, capping_report(capping)
+
+def classify_with_schema(df, schema, stage, job_id=None, profile=None):
+    # categorize_columns, reusing the classification of the columns registered at this stage of the layout
+    known = known_columns(schema, stage, df.dtypes)
+    set_metric(job_id, f'{stage}_columns', {'reused': len(known), 'inferred': len(df.columns) - len(known)})
+    return categorize_columns(df, known, profile)
+
+def rows_model(dtypes, dropped_columns, datetime_columns, hashes):
+    # The append model of the 'rows' stage: the columns of the upload, the columns and dates rows are dropped by
+    # and the hashes of the rows on the columns kept
+    names = [str(col).strip().lower() for col in dict(dtypes)]
+    state = {'raw_columns': names,
+             'text_columns': [name for name, dtype in zip(names, dict(dtypes).values()) if dtype == object],
+             'dropped_columns': [name for name in names if name in dropped_columns],
+             'date_columns': [col for col in required_dates(datetime_columns)
+                              if col in names and col not in dropped_columns]}
+    return state, {'row_hashes': np.unique(hashes)}
+
+def cleaned_model(model, column_types, samples, bounds, capping, sketch):
+    # The append model of the 'cleaned' stage: the model of the 'rows' stage with the values the imputers are fitted
+    # on and their number, the capping bounds and counts, and the sketch of the profile of the output
+    state, arrays = model
+    state = dict(state, column_types=column_types, capping=capping, appends=0,
+                 imputed_values={col: int(total) for col, (_, total) in samples.items()})
+    arrays = dict(arrays, lower=np.asarray(bounds[0], dtype='float64'), upper=np.asarray(bounds[1], dtype='float64'))
+    pack_arrays(state, arrays, 'imputer', {col: sample for col, (sample, _) in samples.items()})
+    distinct, values = sketch
+    pack_arrays(state, arrays, 'distinct', distinct)
+    pack_arrays(state, arrays, 'values', values)
+    return state, arrays
+
+def clean_rows(input_path, report_dir, job_id=None):
+    # The 'rows' stage: profile, classify and clean the upload. Returns the rows and columns kept, its state and
+    # its append model. The upload is read once and held by the backend, the classifier gets the rows it samples
+    # as pandas
+    backend = get_backend(PREPROCESS_BACKEND)
+    # Read CSV file, typed as pandas reads it with every backend
+    set_stage(job_id, 'profile')
+    df, dtypes = backend.read_upload(input_path)
+    # Profile every column once, the report, the classifier and the column drops read it
+    profile = backend.profile_upload(df)
+
+    # Generate the data report before preprocessing
+    before_report = analyze_csv(df, os.path.join(report_dir, 'before.txt'), profile=profile)
+    set_result(job_id, 'before_report', before_report)
+
+    # Categorize columns, the columns of a registered layout are not classified again
+    set_stage(job_id, 'classify')
+    fingerprint = schema_fingerprint(dtypes)
+    schema = load_schema(fingerprint, dtypes)
+    column_types = classify_with_schema(backend.sample_rows(df, sample_positions(len(df))), schema, 'raw', job_id,
+                                        profile)
+    raw_entries = column_entries(column_types, dtypes)
+    datetime_columns = column_types['datetime_columns']
+
+    # Drop columns and rows with missing values
+    set_stage(job_id, 'clean')
+    dropped_columns = registered_drops(schema, fingerprint)
+    if dropped_columns is None:
+        dropped_columns = sparse_columns(profile)
+    # Rows appended to the dataset later that it already holds are recognized by the hashes of its rows
+    hashes = backend.hash_rows(df, dropped_columns)
+    model = rows_model(dtypes, dropped_columns, datetime_columns, hashes)
+    df, missing_dates, duplicates = backend.drop_columns_and_rows(df, dropped_columns, required_dates(datetime_columns),
+                                                                  hashes)
+    report_dropped(job_id, model[0]['dropped_columns'], missing_dates, duplicates)
+    rows = backend.sample_rows(df, sample_positions(len(df)))
+    
+    # Categorize columns again after dropping column and rows
+    column_types = classify_with_schema(rows, schema, 'clean', job_id)
+    clean_entries = column_entries(column_types, rows.dtypes)
+
+    # Register the layout so the next upload of it skips classification
+    save_schema(fingerprint, dtypes, raw=raw_entries, clean=clean_entries, dropped_columns=dropped_columns)
+    state = {'fingerprint': fingerprint, 'column_types': column_types, 'results': {'before_report': before_report}}
+    return df, state, model
+
+def finish_cleaning(df, state, model, report_dir, job_id=None):
+    # The 'cleaned' stage after the 'rows' stage: impute, cap, transform and compact. Returns the cleaned dataset,
+    # its state with the profile of the output and the reports, and its append model
+    column_types = state['column_types']
+    backend = get_backend(PREPROCESS_BACKEND)
+
+    # Impute missing values using KDE and cap outliers using IQR in the numeric columns, then parse the dates, fill
+    # the text columns, add the loan duration and drop the index column. The samples the imputers are fitted on and
+    # the capping bounds are kept for the append model
+    df, samples, capping, bounds = backend.transform(df, column_types, report_dir, job_id)
+    capping_info = capping_report(capping)
+
+    # Hold repeated text as categories and numbers in the smallest dtype that keeps their values
+    set_stage(job_id, 'compact')
+    df = backend.compact(df, column_types, job_id)
+
+    # Generate the data report after preprocessing from the profile of the output
+    output_profile = profile_dataset(df)
+    after_report = analyze_csv(df, os.path.join(report_dir, 'after.txt'), capping_info, output_profile)
+    set_result(job_id, 'after_report', after_report)
+    model = cleaned_model(model, column_types, samples, bounds, capping,
+                          profile_sketch([df], np.random.default_rng([IMPUTE_SEED, 0])))
+    return df, dict(state, profile=output_profile, results=dict(state['results'], after_report=after_report)), model
+
+def stage_settings(stage, streamed):
+    # Settings the output of a stage depends on besides its input, a change to them runs the stage again
+    if stage == 'rows':
+        return {} if PREPROCESS_BACKEND == 'pandas' else {'backend': PREPROCESS_BACKEND}
+    settings = {'impute': [IMPUTE_MODE, IMPUTE_SEED, IMPUTE_SAMPLE_SIZE, IMPUTE_HISTOGRAM_MIN_VALUES],
+                'compact': COMPACT_CATEGORY_RATIO}
+    if streamed:
+        settings['stream'] = [STREAM_CHUNK_ROWS, STREAM_SAMPLE_SIZE]
+    return settings
+
+def preprocessing_settings():
+    # The code version and the settings of every stage, in the keys of the caches of what is derived from the
+    # cleaned dataset (pipeline results, charts) so a change to them does not serve the outputs of the old ones
+    return [STAGE_CACHE_VERSION, {stage: stage_settings(stage, True) for stage in PREPROCESSING_STAGES}]
+
+def stage_key(digest, stage, streamed):
+    # Cache key of a stage: the hash of the key of the stage before it (the content hash of the upload for
+    # the first one), the stage and its settings
+    upstream = PREPROCESSING_STAGES[stage]
+    source = digest if upstream is None else stage_key(digest, upstream, streamed)
+    key = json.dumps([STAGE_CACHE_VERSION, source, stage, stage_settings(stage, streamed)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def replay_results(state, report_dir, job_id=None):
+    # Report the results of stages taken from the cache, and write their report files
+    for key, value in state['results'].items():
+        with open(os.path.join(report_dir, REPORT_FILES[key]), 'w') as f:
+            f.write(value)
+        set_result(job_id, key, value)
+
+def cache_frame(key, df, state, model, write_frame=write_dataset, pin=False):
+    # Keep the output of a stage run in memory in the stage cache, with its append model. Rows a backend holds
+    # are written with its write_frame
+    def write(folder):
+        write_frame(df, os.path.join(folder, STAGE_DATA_FILE))
+        save_append_model(folder, *model)
+        return state
+    return store_stage(key, write, pin)
+
+def cleaned_key(input_path, digest=None):
+    # Stage cache key of the cleaned dataset of an upload, digest is the content hash of the upload if known
+    return stage_key(digest or file_digest(input_path), 'cleaned', should_stream(input_path))
+
+def cleaned_dataset(input_path, report_dir, job_id=None, digest=None, reuse=True):
+    # The cleaned dataset of an upload, shared by the visualisation and insight pipelines: the path of its file
+    # in the stage cache, its state and its cache key, for later stages to derive theirs from. Stages cached for the
+    # same content and settings, by either pipeline, are not run again unless reuse is False, the results they
+    # reported are reported again and their report files written to report_dir. The entry of the file is pinned in
+    # the stage cache, the caller releases it with release_stage once it has read the file
+    streamed = should_stream(input_path)
+    digest = digest or file_digest(input_path)
+    key = cleaned_key(input_path, digest)
+    # files streamed chunk by chunk are always cleaned by pandas
+    set_metric(job_id, 'backend', 'pandas' if streamed else PREPROCESS_BACKEND)
+    entry = stage_entry(key) if reuse else None
+    if entry is not None:
+        set_metric(job_id, 'stage_cache', {'reused': 'cleaned', 'run': []})
+        try:
+            state = read_stage_state(entry)
+            replay_results(state, report_dir, job_id)
+        except BaseException:
+            release_stage(entry)
+            raise
+        return os.path.join(entry, STAGE_DATA_FILE), state, key
+
+    # Files that may not fit in memory are cleaned chunk by chunk in one go, straight into the stage cache
+    if streamed:
+        set_metric(job_id, 'stage_cache', {'reused': None, 'run': ['cleaned']})
+        def write(folder):
+            state = process_csv_streaming(input_path, os.path.join(folder, STAGE_DATA_FILE), job_id=job_id)
+            for name in REPORT_FILES.values():
+                shutil.copyfile(os.path.join(folder, name), os.path.join(report_dir, name))
+            return state
+        entry = store_stage(key, write, pin=True)
+        return os.path.join(entry, STAGE_DATA_FILE), read_stage_state(entry), key
+
+    backend = get_backend(PREPROCESS_BACKEND)
+    rows_key = stage_key(digest, 'rows', streamed)
+    rows_entry = stage_entry(rows_key) if reuse else None
+    if rows_entry is not None:
+        set_metric(job_id, 'stage_cache', {'reused': 'rows', 'run': ['cleaned']})
+        try:
+            state = read_stage_state(rows_entry)
+            replay_results(state, report_dir, job_id)
+            df = backend.read_frame(os.path.join(rows_entry, STAGE_DATA_FILE))
+            model = load_append_model(rows_entry)
+        finally:
+            release_stage(rows_entry)
+    else:
+        set_metric(job_id, 'stage_cache', {'reused': None, 'run': ['rows', 'cleaned']})
+        df, state, model = clean_rows(input_path, report_dir, job_id)
+        cache_frame(rows_key, df, state, model, backend.write_frame)
+    df, state, model = finish_cleaning(df, state, model, report_dir, job_id)
+    entry = cache_frame(key, df, state, model, pin=True)
+    return os.path.join(entry, STAGE_DATA_FILE), state, key
+
+def process_csv(input_path, output_path, job_id=None):
+    # Take the cleaned dataset from the stage cache, cleaning the upload first if no pipeline did before
+    report_dir = os.path.dirname(output_path)
+    data_path, state, _ = cleaned_dataset(input_path, report_dir, job_id)
+
+    # Save the preprocessed dataset in a columnar format, with its profile for the charts and the append model
+    # rows appended to it later are cleaned with
+    try:
+        shutil.copyfile(data_path, output_path)
+        shutil.copyfile(os.path.join(os.path.dirname(data_path), APPEND_MODEL_FILE),
+                        os.path.join(report_dir, APPEND_MODEL_FILE))
+    finally:
+        release_stage(os.path.dirname(data_path))
+    save_profile(state['profile'], report_dir)
+
+def append_lock(folder):
+    # The lock appends to the dataset in the folder hold
+    with _append_locks_lock:
+        return _append_locks.setdefault(os.path.abspath(folder), threading.Lock())
+
+def append_csv(input_path, output_path, upload_path=None, job_id=None):
+    # Append the rows of a CSV to the processed dataset at output_path with merge_csv_rows, after the appends to it
+    # that are running. The CSV is the upload of the rows, it is removed once they are merged (or the append failed)
+    # so it does not use the workspace quota
+    try:
+        with append_lock(os.path.dirname(output_path)):
+            merge_csv_rows(input_path, output_path, upload_path, job_id)
+    finally:
+        os.remove(input_path)
+
+def merge_csv_rows(input_path, output_path, upload_path=None, job_id=None):
+    # Append the rows of a CSV to the processed dataset at output_path. Only the rows the dataset does not hold yet
+    # are cleaned, so the CSV may hold just the new rows or the whole grown statement: they are cleaned with the
+    # column types, imputers and capping bounds fitted when the dataset was processed and merged into it, and its
+    # profile and reports are updated from its append model. The rows are added to the CSV at upload_path too, so
+    # processing it again gives the dataset they were appended to. Appends to the same dataset hold its append_lock
+    report_dir = os.path.dirname(output_path)
+    # the few rows appended are cleaned by pandas with every backend
+    set_metric(job_id, 'backend', 'pandas')
+    model = load_append_model(report_dir)
+    profile = read_profile(report_dir)
+    if model is None or profile is None:
+        raise ValueError("The processed dataset has no append model, process the data again to append rows to it")
+    state, arrays = model
+    generation = state['appends'] + 1
+
+    # Keep the rows whose hash on the columns kept is not the hash of a row processed before
+    set_stage(job_id, 'profile')
+    header = pd.read_csv(input_path, nrows=0).columns
+    names = header.str.strip().str.lower()
+    if list(names) != state['raw_columns']:
+        raise ValueError("The appended file does not have the columns of the processed dataset")
+    text_columns = {col: 'object' for col, name in zip(header, names) if name in state['text_columns']}
+    raw = pd.read_csv(input_path, dtype=text_columns, low_memory=False)
+    df = raw.set_axis(names, axis=1).drop(columns=state['dropped_columns'])
+    hashes = row_hashes(df)
+    new = unseen_rows(hashes, arrays['row_hashes'])
+    if not new.any():
+        set_metric(job_id, 'appended', {'rows': len(raw), 'new_rows': 0, 'rows_missing_dates': 0})
+        for key, name in REPORT_FILES.items():
+            with open(os.path.join(report_dir, name)) as f:
+                set_result(job_id, key, f.read())
+        return
+    raw = raw[new]
+    before_report = analyze_csv(raw, os.path.join(report_dir, 'before.txt'))
+    set_result(job_id, 'before_report', before_report)
+
+    # Drop the rows missing a date
+    set_stage(job_id, 'clean')
+    df = df[new].dropna(subset=state['date_columns']).reset_index(drop=True)
+    set_metric(job_id, 'appended', {'rows': len(new), 'new_rows': len(raw), 'rows_missing_dates': len(raw) - len(df)})
+
+    column_types = state['column_types']
+    numeric_columns = column_types['numeric_columns']
+    # Impute the missing values from the values the imputers were fitted on, drawing from streams of this append
+    set_stage(job_id, 'impute')
+    samples = unpack_arrays(state, arrays, 'imputer')
+    for col in numeric_columns:
+        missing_indices = df[col].isna().to_numpy()
+        if not missing_indices.any():
+            continue
+        imputer = fit_imputer(samples[col], total_values=state['imputed_values'][col])
+        if imputer is not None:
+            df.loc[missing_indices, col] = draw_values(imputer, missing_indices.sum(),
+                                                       column_rng(IMPUTE_SEED, col, 1, generation))
+    # Cap to the bounds of the dataset
+    set_stage(job_id, 'cap')
+    df, capping, _ = cap_columns(df, numeric_columns, bounds=(arrays['lower'], arrays['upper']))
+    capping = {col: None if capped is None and state['capping'][col] is None
+               else (capped or 0) + (state['capping'][col] or 0) for col, capped in capping.items()}
+
+    set_stage(job_id, 'transform')
+    df = process_chunk(df, column_types['datetime_columns'], column_types['categorical_columns'],
+                       column_types['id_columns'], column_types['date_formats'])
+    if 'unnamed: 0' in df.columns:
+        df = df.drop(columns=['unnamed: 0'])
+
+    # The dtypes of the dataset widened to hold the new values, and its profile with the new rows merged into it
+    set_stage(job_id, 'merge')
+    dtypes = append_dtypes(dict(read_dtypes(output_path)), df)
+    df = df[list(dtypes)].astype(dtypes)
+    distinct = unpack_arrays(state, arrays, 'distinct')
+    values = unpack_arrays(state, arrays, 'values')
+    profile = append_profile(profile, distinct, values, df, dtypes, np.random.default_rng([IMPUTE_SEED, generation]))
+    state = dict(state, capping=capping, appends=generation)
+    arrays = dict(arrays, row_hashes=np.union1d(arrays['row_hashes'], hashes[new]))
+    pack_arrays(state, arrays, 'distinct', distinct)
+    pack_arrays(state, arrays, 'values', values)
+
+    # Write the dataset again with the rows appended, and report on the whole dataset. Each file is replaced whole,
+    # the append model with the hashes of the rows merged last: until it is saved the rows count as not merged
+    append_rows(output_path, df)
+    save_profile(profile, report_dir)
+    if upload_path is not None:
+        append_csv_rows(raw, upload_path)
+    save_append_model(report_dir, state, arrays)
+    after_report = write_report((profile['rows'], len(profile['columns'])), missing_counts(profile),
+                                os.path.join(report_dir, 'after.txt'), capping_report(capping))
+    set_result(job_id, 'after_report', after_report)
+    # charts drawn from the dataset before are drawn again
+    shutil.rmtree(os.path.join(report_dir, 'visual_images'), ignore_errors=True)
+
+def drop_rows_chunk(chunk, dropped_columns, datetime_columns, seen_blocks):
+    # drop_col_row for one chunk: the columns to drop were found over the whole file,
+    # duplicates are looked up in the rows kept from earlier chunks. The hashes of all rows of the chunk
+    # on the columns kept are returned after the rows left and the rows dropped for each reason
+    chunk.columns = chunk.columns.str.strip().str.lower()
+    chunk = chunk.drop(columns=dropped_columns)
+    return drop_rows(chunk, datetime_columns, seen_blocks) + (row_hashes(chunk),)
+
+def impute_column_file(path, col, draws_path):
+    # What kde_impute does to one numeric column of the cleaned rows in the Arrow file at path, with the column read
+    # whole: the imputer is fitted on the column_sample of its values and the values for its missing cells are drawn
+    # from the same stream. The drawn values are saved to draws_path for the rows to be filled chunk by chunk.
+    # Returns the sample and number of values, and whether values were drawn
+    column = read_dataset(path, [col])
+    sample, total_values = column_sample(column, col, IMPUTE_SEED)
+    missing = int(column[col].isna().sum())
+    drawn = impute_column((col, sample, total_values, missing), IMPUTE_SEED) if missing else None
+    if drawn is not None:
+        np.save(draws_path, drawn)
+    return (sample, total_values), drawn is not None
+
+def imputed_column_file(path, col, draws_path=None):
+    # A numeric column of the cleaned rows in the Arrow file at path as floats, its missing cells filled with the
+    # values impute_column_file saved to draws_path
+    values = read_dataset(path, [col])[col].to_numpy(dtype='float64', na_value=np.nan)
+    if draws_path is not None:
+        values[np.isnan(values)] = np.load(draws_path)
+    return values
+
+def process_csv_streaming(input_path, output_path, job_id=None):
+    # Same pipeline as process_csv for CSV files larger than memory, with the same output. Only one chunk of rows
+    # (or one numeric column) is held at a time: the first pass collects missing counts and dtypes, the second drops
+    # columns, rows and duplicates into a temporary Arrow file, the numeric columns of which are imputed and capped
+    # one at a time, and the third transforms that file chunk by chunk straight into the output
+    set_stage(job_id, 'profile')
+    scan = scan_csv(input_path)
+    report_dir = os.path.dirname(output_path)
+    before_report = write_report((scan['rows'], len(scan['dtypes'])), scan['missing'],
+                                 os.path.join(report_dir, 'before.txt'))
+    set_result(job_id, 'before_report', before_report)
+
+    # Categorize columns on the rows sampled across the file, the columns of a registered layout are not
+    # classified again
+    set_stage(job_id, 'classify')
+    fingerprint = schema_fingerprint(scan['dtypes'])
+    schema = load_schema(fingerprint, scan['dtypes'])
+    column_types = classify_with_schema(scan['sample'], schema, 'raw', job_id)
+    raw_entries = column_entries(column_types, scan['sample'].dtypes)
+    datetime_columns = required_dates(column_types['datetime_columns'])
+
+    # Drop columns with more than 40% missing values, then rows and duplicates chunk by chunk
+    set_stage(job_id, 'clean')
+    threshold = 0.4 * scan['rows']
+    missing = scan['missing']
+    missing.index = missing.index.str.strip().str.lower()
+    dropped_columns = registered_drops(schema, fingerprint)
+    if dropped_columns is None:
+        dropped_columns = [col for col in missing.index if missing[col] >= threshold]
+
+    clean_path = os.path.join(report_dir, 'clean.tmp.feather')
+    seen_blocks = []
+    classify_samples = []
+    hashes = []
+    missing_dates = duplicates = 0
+    with DatasetWriter(clean_path) as writer:
+        for chunk in read_csv_chunks(input_path, dtype=scan['dtypes']):
+            raise_if_cancelled(job_id)
+            chunk, chunk_missing_dates, chunk_duplicates, chunk_hashes = drop_rows_chunk(
+                chunk, dropped_columns, datetime_columns, seen_blocks)
+            hashes.append(chunk_hashes)
+            missing_dates += chunk_missing_dates
+            duplicates += chunk_duplicates
+            classify_samples.append(sample_chunk(chunk))
+            writer.write(chunk)
+    report_dropped(job_id, dropped_columns, missing_dates, duplicates)
+    model = rows_model(scan['dtypes'], dropped_columns, datetime_columns, np.concatenate(hashes))
+
+    # Categorize columns again after dropping column and rows
+    classify_sample = pd.concat(classify_samples)
+    column_types = classify_with_schema(classify_sample, schema, 'clean', job_id)
+    clean_entries = column_entries(column_types, classify_sample.dtypes)
+    datetime_columns = column_types['datetime_columns']
+    numeric_columns = column_types['numeric_columns']
+    categorical_columns = column_types['categorical_columns']
+    id_columns = column_types['id_columns']
+    date_formats = column_types['date_formats']
+
+    # Impute and cap the numeric columns as kde_impute and cap_columns do on the whole dataset, one column read from
+    # the cleaned rows at a time: the same samples, imputed values, bounds and capped counts
+    set_stage(job_id, 'impute')
+    samples = {}
+    draws = {}
+    for i, col in enumerate(numeric_columns):
+        raise_if_cancelled(job_id)
+        draws_path = os.path.join(report_dir, f'draws.{i}.tmp.npy')
+        samples[col], drawn = impute_column_file(clean_path, col, draws_path)
+        if drawn:
+            draws[col] = draws_path
+    set_stage(job_id, 'cap')
+    lower = np.full(len(numeric_columns), np.nan)
+    upper = np.full(len(numeric_columns), np.nan)
+    capping = {}
+    for i, col in enumerate(numeric_columns):
+        raise_if_cancelled(job_id)
+        values = imputed_column_file(clean_path, col, draws.get(col))[:, None]
+        (lower[i],), (upper[i],) = iqr_bounds(values)
+        capped, non_zero = cap_values(values, lower[i:i + 1], upper[i:i + 1])
+        capping[col] = int(capped[0]) if non_zero[0] else None
+    drawn = {col: np.load(path, mmap_mode='r') for col, path in draws.items()}
+    offsets = dict.fromkeys(drawn, 0)
+    # only the columns imputed or capped are written back, as floats, the others keep their dtype
+    changed = [i for i, col in enumerate(numeric_columns) if col in drawn or capping[col]]
+    changed_columns = [numeric_columns[i] for i in changed]
+
+    # Impute, cap and transform the cleaned rows chunk by chunk into the output
+    set_stage(job_id, 'transform')
+    rows = 0
+    summary = {}
+    before = 0
+    with DatasetWriter(output_path) as writer:
+        for chunk in iter_batches(clean_path):
+            raise_if_cancelled(job_id)
+            if changed:
+                values = chunk[changed_columns].to_numpy(dtype='float64', na_value=np.nan)
+                for i, col in enumerate(changed_columns):
+                    missing_indices = np.isnan(values[:, i])
+                    if col in drawn and missing_indices.any():
+                        end = offsets[col] + missing_indices.sum()
+                        values[missing_indices, i] = drawn[col][offsets[col]:end]
+                        offsets[col] = end
+                cap_values(values, lower[changed], upper[changed])
+                for i, col in enumerate(changed_columns):
+                    chunk[col] = values[:, i]
+            chunk = process_chunk(chunk, datetime_columns, categorical_columns, id_columns, date_formats)
+            if 'unnamed: 0' in chunk.columns:
+                chunk = chunk.drop(columns=['unnamed: 0'])
+            rows += len(chunk)
+            # text columns with too many distinct values to become categories stop being tracked
+            summary = summarize_columns(chunk, summary, COMPACT_CATEGORY_RATIO * scan['rows'])
+            before = before + chunk.memory_usage(deep=True, index=False)
+            writer.write(chunk)
+    os.remove(clean_path)
+    del drawn
+    for path in draws.values():
+        os.remove(path)
+    if rows == 0:
+        raise ValueError("No rows are left after dropping rows with missing dates and duplicates")
+
+    # Hold repeated text as categories and numbers in the smallest dtype that keeps their values, the dtypes are
+    # known once every chunk was seen so the output is rewritten with them
+    set_stage(job_id, 'compact')
+    dtypes = compact_dtypes(summary, rows)
+    after = compact_dataset_file(output_path, dtypes) if dtypes else before
+    report_memory(job_id, before, after, {**chunk.dtypes, **dtypes})
+
+    # Generate the data report after preprocessing from the profile of the output, saved with it for the charts
+    output_profile = profile_dataset_file(output_path)
+    save_profile(output_profile, report_dir)
+    after_report = write_report((rows, len(output_profile['columns'])), missing_counts(output_profile),
+                                os.path.join(report_dir, 'after.txt'), capping_report(capping))
+    set_result(job_id, 'after_report', after_report)
+
+    # The append model is saved next to the output, with the values the imputers were fitted on
+    model = cleaned_model(model, column_types, samples, (lower, upper), capping,
+                          profile_sketch(iter_batches(output_path), np.random.default_rng([IMPUTE_SEED, 0])))
+    save_append_model(report_dir, *model)
+
+    # Register the layout so the next upload of it skips classification. The state of the cleaned dataset is
+    # returned as the 'cleaned' stage returns it
+    save_schema(fingerprint, scan['dtypes'], raw=raw_entries, clean=clean_entries, dropped_columns=dropped_columns)
+    return {'fingerprint': fingerprint, 'column_types': column_types, 'profile': output_profile,
+            'results': {'before_report': before_report, 'after_report': after_report}}
@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from src.data_process.columnar_store import read_dataset, read_schema, numeric_columns
+
+# Memory the cached dataset columns may use before the least recently used ones are dropped
+DATASET_CACHE_BYTES = int(os.getenv('DATASET_CACHE_BYTES', 1024 ** 3))
+
+# (path, column) -> (modification time, Series, size in bytes), least recently used first
+_columns = OrderedDict()
+# path -> (modification time, Arrow schema)
+_schemas = {}
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def _evict(key):
+    # Drop a column from the cache (caller holds the lock)
+    global _cache_bytes
+    entry = _columns.pop(key, None)
+    if entry is not None:
+        _cache_bytes -= entry[2]
+
+
+def _schema(path, mtime):
+    # Cached Arrow schema of the dataset at path
+    with _cache_lock:
+        entry = _schemas.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+    schema = read_schema(path)
+    with _cache_lock:
+        _schemas[path] = (mtime, schema)
+    return schema
+
+
+def get_dataset(path, columns=None):
+    # Return a new DataFrame with the given columns (all if None) of the processed dataset at path.
+    # Columns are read from the memory-mapped file only if they are not cached or the file changed on disk
+    global _cache_bytes
+    mtime = os.path.getmtime(path)
+    if columns is None:
+        columns = _schema(path, mtime).names
+    columns = list(columns)
+
+    series = {}
+    with _cache_lock:
+        for column in columns:
+            entry = _columns.get((path, column))
+            if entry is not None and entry[0] == mtime:
+                _columns.move_to_end((path, column))
+                series[column] = entry[1]
+
+    missing = [column for column in columns if column not in series]
+    if missing:
+        loaded = read_dataset(path, missing)
+        with _cache_lock:
+            for column in missing:
+                series[column] = loaded[column]
+                size = int(loaded[column].memory_usage(deep=True, index=False))
+                _evict((path, column))
+                # columns larger than the whole budget are not kept
+                if size <= DATASET_CACHE_BYTES:
+                    _columns[(path, column)] = (mtime, loaded[column], size)
+                    _cache_bytes += size
+            while _cache_bytes > DATASET_CACHE_BYTES:
+                _evict(next(iter(_columns)))
+
+    return pd.DataFrame({column: series[column] for column in columns})
+
+
+def get_columns(path):
+    # Return the column names of the dataset at path without reading its rows
+    return list(_schema(path, os.path.getmtime(path)).names)
+
+
+def get_numeric_columns(path):
+    # Return the names of the numeric columns of the dataset at path without reading its rows
+    return numeric_columns(_schema(path, os.path.getmtime(path)))
+
+
+def evict_folder(folder):
+    # Forget every cached dataset stored below the folder, e.g. before it is cleared for a new upload
+    folder = os.path.join(folder, '')
+    with _cache_lock:
+        for key in [key for key in _columns if key[0].startswith(folder)]:
+            _evict(key)
+        for path in [path for path in _schemas if path.startswith(folder)]:
+            del _schemas[path]
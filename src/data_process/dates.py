@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+# How dates are shown in plots and reports, and the text the insight models were trained on
+DATE_FORMAT = '%d/%m/%Y'
+
+
+def format_dates(series):
+    # Format a datetime column as DATE_FORMAT text, formatting each distinct date only once.
+    # Missing dates stay missing
+    codes, uniques = pd.factorize(series)
+    text = np.append(pd.DatetimeIndex(uniques).strftime(DATE_FORMAT).to_numpy(dtype=object), np.nan)
+    return pd.Series(text[codes], index=series.index, name=series.name)
+
+
+def dates_as_text(df):
+    # Replace the datetime columns of a DataFrame with their DATE_FORMAT text
+    for column in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        df[column] = format_dates(df[column])
+    return df
@@ -0,0 +1,107 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from scipy.stats import gaussian_kde
+from src.data_process.jobs import set_metric
+from src.data_process.worker_pool import map_in_pool, plan_chunks
+
+# Values of a column the imputer is fitted on, a random sample of them for larger columns
+IMPUTE_SAMPLE_SIZE = int(os.getenv('IMPUTE_SAMPLE_SIZE', 100_000))
+# Seed of the random draws, so the same file is imputed the same way on every run
+IMPUTE_SEED = int(os.getenv('IMPUTE_SEED', 0))
+# 'kde' draws from a Gaussian KDE of the values, 'histogram' from a histogram of their quantiles (cheaper),
+# 'auto' uses the histogram for columns with more than IMPUTE_HISTOGRAM_MIN_VALUES values
+IMPUTE_MODE = os.getenv('IMPUTE_MODE', 'kde')
+IMPUTE_HISTOGRAM_MIN_VALUES = int(os.getenv('IMPUTE_HISTOGRAM_MIN_VALUES', 1_000_000))
+# Bins of the histogram sampler, each holding the same share of the values, with finer bins in the tails
+# so a few extreme values do not spread over a whole bin
+IMPUTE_HISTOGRAM_BINS = 256
+_TAILS = np.array([1e-5, 1e-4, 1e-3])
+HISTOGRAM_LEVELS = np.unique(np.concatenate([np.linspace(0, 1, IMPUTE_HISTOGRAM_BINS + 1), _TAILS, 1 - _TAILS]))
+
+
+def column_rng(seed, column, stream=0, generation=0):
+    # Random generator of a column, from the seed and the column name so the draws of a column
+    # do not depend on the other columns or on the order or process columns are imputed in.
+    # Sampling the values (stream 0) and drawing the imputed ones (stream 1) use separate streams,
+    # every batch of rows appended to the dataset later draws from a generation of its own
+    entropy = [seed, zlib.crc32(str(column).encode()), stream]
+    return np.random.default_rng(entropy + [generation] if generation else entropy)
+
+
+def sample_values(values, rng, size=IMPUTE_SAMPLE_SIZE):
+    # At most size of the values, drawn without replacement
+    if len(values) <= size:
+        return values
+    return rng.choice(values, size, replace=False)
+
+
+def column_sample(df, column, seed):
+    # The non-null values of a column the imputer is fitted on, a sample of them for larger columns,
+    # and the number of non-null values
+    values = df[column].dropna().to_numpy(dtype='float64')
+    return sample_values(values, column_rng(seed, column)), len(values)
+
+
+def fit_imputer(values, mode=None, total_values=None):
+    # Sampler of a column fitted on (a sample of) its non-null values: ('kde', gaussian_kde) or
+    # ('histogram', its quantiles at HISTOGRAM_LEVELS, so skewed columns and repeated values keep their shape).
+    # total_values is the size of the whole column when values is a sample of it.
+    # None when there is nothing to draw from: no values, or a single distinct value
+    if len(values) == 0 or values.min() == values.max():
+        return None
+    mode = mode or IMPUTE_MODE
+    total_values = len(values) if total_values is None else total_values
+    if mode == 'histogram' or (mode == 'auto' and total_values > IMPUTE_HISTOGRAM_MIN_VALUES):
+        return 'histogram', np.quantile(values, HISTOGRAM_LEVELS)
+    return 'kde', gaussian_kde(values)
+
+
+def draw_values(imputer, n, rng):
+    # n values drawn from a fitted sampler in one vectorized call
+    kind, model = imputer
+    if kind == 'kde':
+        return model.resample(n, seed=rng)[0]
+    # inverse transform sampling, linear between the quantiles
+    return np.interp(rng.random(n), HISTOGRAM_LEVELS, model)
+
+
+def impute_column(item, seed, mode=None):
+    # Values for the missing cells of one column, possibly in a worker process.
+    # item is (column, sample of its non-null values, number of non-null values, number of missing values)
+    column, sample, total_values, missing = item
+    imputer = fit_imputer(sample, mode, total_values)
+    return None if imputer is None else draw_values(imputer, missing, column_rng(seed, column, 1))
+
+
+def impute_columns(items, seed, mode=None, job_id=None):
+    # impute_column for every item, in the process pool when there is enough work
+    plan = plan_chunks(sum(len(sample) + missing for _, sample, _, missing in items), 8)
+    set_metric(job_id, 'impute_schedule', dict(plan, columns=len(items)))
+    if plan['mode'] == 'in_process' or len(items) < 2:
+        return [impute_column(item, seed, mode) for item in items]
+    return map_in_pool(impute_column, items, seed, mode, job_id=job_id)
+
+
+def kde_impute(df: pd.DataFrame, numeric_columns: list, seed=None, mode=None, job_id=None, samples=None):
+    # Impute missing values using KDE, every column drawing all its missing values at once from a sampler
+    # fitted on at most IMPUTE_SAMPLE_SIZE of its values. Columns are imputed in the process pool when
+    # there is enough work, and the draws are seeded so they are the same wherever they run.
+    # samples holds the column_sample of the columns already taken with the same seed, they are not sampled again
+    seed = IMPUTE_SEED if seed is None else seed
+    samples = samples or {}
+    items = []
+    for col in numeric_columns:
+        missing = int(df[col].isna().sum())
+        if missing:
+            # only a sample of the values is fitted on, and handed to a worker
+            sample, total_values = samples[col] if col in samples else column_sample(df, col, seed)
+            items.append((col, sample, total_values, missing))
+
+    # only the columns with missing values need a sampler
+    imputed = impute_columns(items, seed, mode, job_id)
+    for (col, _, _, _), values in zip(items, imputed):
+        if values is not None:
+            df.loc[df[col].isna(), col] = values
+    return df
@@ -0,0 +1,70 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# What cleaning a dataset fitted (the column types, capping bounds and the values the imputers are fitted on), the
+# hashes of its rows and a sketch of its profile, saved next to the processed dataset so rows appended to it later
+# are cleaned the same way without cleaning the rows it already holds again
+APPEND_MODEL_FILE = 'append_model.npz'
+
+
+def save_append_model(folder, state, arrays):
+    # state is a JSON-serializable dict, arrays a dict of numpy arrays
+    path = os.path.join(folder, APPEND_MODEL_FILE)
+    with open(f'{path}.tmp', 'wb') as f:
+        np.savez(f, state=np.array(json.dumps(state)), **arrays)
+    os.replace(f'{path}.tmp', path)
+
+
+def load_append_model(folder):
+    # The state and arrays saved with the dataset in the folder, None if it was processed without them
+    try:
+        with np.load(os.path.join(folder, APPEND_MODEL_FILE), allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    return json.loads(str(arrays.pop('state'))), arrays
+
+
+def canonical_numbers(df):
+    # Numeric columns as float64, so a value hashes the same in a file where its column was read as integers
+    # and in one where missing values made it floats
+    numeric = {col: df[col].astype('float64') for col in df.columns
+               if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])}
+    return df.assign(**numeric) if numeric else df
+
+
+def row_hashes(df):
+    # 64-bit hash of every row of df
+    return pd.util.hash_pandas_object(canonical_numbers(df), index=False).to_numpy()
+
+
+def value_hashes(series):
+    # Sorted 64-bit hashes of the distinct non-null values of a column, whatever dtype it is held in
+    series = series.dropna()
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        series = series.astype('float64')
+    elif isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(series.cat.categories.dtype)
+    return np.unique(pd.util.hash_pandas_object(series, index=False).to_numpy())
+
+
+def unseen_rows(hashes, seen):
+    # Mask of the row hashes that are neither in the sorted array seen nor repeated earlier in hashes
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    if len(seen):
+        positions = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+        keep &= seen[positions] != hashes
+    return keep
+
+
+def pack_arrays(state, arrays, prefix, by_column):
+    # Add an array of every column to the arrays of a model under numbered names, the columns go in the state
+    state[f'{prefix}_columns'] = list(by_column)
+    arrays.update({f'{prefix}_{i}': values for i, values in enumerate(by_column.values())})
+
+
+def unpack_arrays(state, arrays, prefix):
+    # The arrays pack_arrays added, by column
+    return {col: arrays[f'{prefix}_{i}'] for i, col in enumerate(state[f'{prefix}_columns'])}
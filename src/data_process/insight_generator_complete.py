@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+import hashlib
+from src.data_process.columnar_store import read_dataset
+from src.data_process.data_preprocessor_for_insights import encoded_dataset, ONE_HOT_FORMAT
+from src.data_process.data_preprocessor_for_visualisation import (
+    cleaned_dataset, cleaned_key, replay_results, STAGE_CACHE_VERSION)
+from src.data_process.raw_insight_maker import generate_insights, MODEL_PATH
+from src.data_process.report_generator import generate_financial_analysis
+from src.data_process.jobs import set_stage, set_result, set_metric, add_image
+from src.data_process.result_cache import file_digest, stage_entry, read_stage_state, store_stage, release_stage
+
+def models_signature():
+    # Name, size and modification time of every model file, so retrained models do not reuse old checkpoints
+    if not os.path.isdir(MODEL_PATH):
+        return []
+    return [[name, os.path.getsize(os.path.join(MODEL_PATH, name)), os.path.getmtime(os.path.join(MODEL_PATH, name))]
+            for name in sorted(os.listdir(MODEL_PATH))]
+
+def insights_key(encoded_key):
+    # Stage cache key of the insights of the encoded dataset of the given key, for the models in MODEL_PATH
+    checkpoint = json.dumps([STAGE_CACHE_VERSION, encoded_key, 'insights', models_signature()])
+    return hashlib.sha256(checkpoint.encode()).hexdigest()
+
+def restore_insights(entry, output_path, job_id=None):
+    # Copy the plots of an insights checkpoint into the output folder and release it. Returns the raw report
+    try:
+        state = read_stage_state(entry)
+        for filename in state['images']:
+            shutil.copyfile(os.path.join(entry, filename), os.path.join(output_path, filename))
+            add_image(job_id, filename)
+    finally:
+        release_stage(entry)
+    set_metric(job_id, 'insights_checkpoint', 'resumed')
+    return state['raw_report']
+
+def model_insights(df, key, output_path, job_id=None, reuse=True):
+    # The insights the models predict for the encoded dataset and their plots. They are checkpointed in the stage
+    # cache, a run that failed after them (e.g. generating the report) or is run again resumes from the checkpoint
+    # unless reuse is False
+    set_stage(job_id, 'insights')
+    checkpoint_key = insights_key(key)
+    entry = stage_entry(checkpoint_key) if reuse else None
+    if entry is not None:
+        return restore_insights(entry, output_path, job_id)
+
+    raw_report = generate_insights(df, output_path, job_id=job_id)
+
+    def write(folder):
+        images = sorted(name for name in os.listdir(output_path) if name.endswith('.png'))
+        for filename in images:
+            shutil.copyfile(os.path.join(output_path, filename), os.path.join(folder, filename))
+        return {'raw_report': raw_report, 'images': images}
+    store_stage(checkpoint_key, write)
+    set_metric(job_id, 'insights_checkpoint', 'saved')
+    return raw_report
+
+def manifest_key(key):
+    # Stage cache key of the manifest of the checkpoints of an upload: the key of its cleaned dataset (its content and
+    # the preprocessing settings), and the settings of the stages after it
+    manifest = json.dumps([key, 'manifest', ONE_HOT_FORMAT, models_signature()])
+    return hashlib.sha256(manifest.encode()).hexdigest()
+
+def read_manifest(key):
+    # The manifest of the checkpoints of an upload: the stage cache key of every stage completed for it, in order,
+    # and the results the cleaning reported. Empty if no stage completed
+    entry = stage_entry(key)
+    if entry is None:
+        return {'stages': {}, 'results': {}}
+    try:
+        return read_stage_state(entry)
+    finally:
+        release_stage(entry)
+
+def complete_stage(key, manifest, stage, checkpoint_key, results=None):
+    # Add a completed stage to the manifest stored under key, returns the new manifest
+    manifest = {'stages': {**manifest['stages'], stage: checkpoint_key},
+                'results': manifest['results'] if results is None else results}
+    store_stage(key, lambda folder: manifest)
+    return manifest
+
+def aio_insights(input_path, output_path, job_id=None, resume=True):
+    # Step 1: Read the manifest of the stages completed for the upload. The job resumes after the last one: a
+    # completed stage is read from its checkpoint instead of running again. With resume=False every stage runs
+    # again and replaces its checkpoint
+    digest = file_digest(input_path)
+    key = manifest_key(cleaned_key(input_path, digest))
+    manifest = read_manifest(key) if resume else {'stages': {}, 'results': {}}
+    set_metric(job_id, 'completed_stages', list(manifest['stages']))
+    insights_entry = stage_entry(manifest['stages']['insights']) if 'insights' in manifest['stages'] else None
+
+    if insights_entry is not None:
+        # Steps 2 and 3: the insights were checkpointed, the dataset is neither read nor encoded again
+        replay_results(manifest, output_path, job_id)
+        raw_report = restore_insights(insights_entry, output_path, job_id)
+    else:
+        # Step 2: Preprocess the data, the stages other runs of the same content completed are taken from the cache
+        print("Starting data preprocessing...")
+        data_path, state, cleaned = cleaned_dataset(input_path, output_path, job_id, digest, reuse=resume)
+        try:
+            df = read_dataset(data_path)
+        finally:
+            release_stage(os.path.dirname(data_path))
+        manifest = complete_stage(key, manifest, 'cleaned', cleaned, state['results'])
+        df, encoded = encoded_dataset(df, state, cleaned, job_id, reuse=resume)
+        manifest = complete_stage(key, manifest, 'encoded', encoded)
+        print("Preprocessing completed. DataFrame shape:", df.shape)
+
+        # Step 3: Generate insights
+        print('output path', output_path)
+        print("Generating insights...")
+        raw_report = model_insights(df, encoded, output_path, job_id=job_id, reuse=resume)
+        complete_stage(key, manifest, 'insights', insights_key(encoded))
+        # delete df to save memory
+        del df
+
+    # Step 4: Generate the financial report with the LLM
+    set_stage(job_id, 'report')
+    insight_report = generate_financial_analysis(raw_report, os.path.join(output_path, 'generated_report.txt'))
+    if insight_report is None:
+        raise RuntimeError("Failed to generate the financial report")
+    set_result(job_id, 'insight_report', insight_report)
+    print("Insights generation completed.")
@@ -0,0 +1,306 @@
+import os
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+# Stages reported by the visualisation and insight pipelines, in the order they run
+VISUALISATION_STAGES = ['profile', 'classify', 'clean', 'impute', 'cap', 'transform', 'compact']
+INSIGHT_STAGES = VISUALISATION_STAGES + ['encode', 'insights', 'report']
+PLOT_STAGES = ['render']
+# Stages of a job that appends rows to a processed dataset
+APPEND_STAGES = ['profile', 'clean', 'impute', 'cap', 'transform', 'merge']
+# Stages of a job that restores the outputs of an upload that was processed before
+RESTORE_STAGES = ['restore']
+
+# Finished jobs are kept around for this long so clients can still read their results
+JOB_RETENTION_SECONDS = 60 * 60
+
+# Number of jobs that run at the same time and number of jobs that may wait for a free runner
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', 8))
+# Events kept per job for the streams, older ones are dropped (the job status still holds every result)
+JOB_MAX_EVENTS = int(os.getenv('JOB_MAX_EVENTS', 200))
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+# Notified whenever any job emits an event, used by the event streams
+_jobs_changed = threading.Condition(_jobs_lock)
+
+# Queued jobs waiting for a runner thread, as (job_id, target, args)
+_queue = deque()
+_queue_changed = threading.Condition(_jobs_lock)
+_runners = []
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _prune_jobs(now):
+    # Forget finished jobs that are older than the retention period (caller holds the lock)
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['finished_at'] is not None and now - job['finished_at'] > JOB_RETENTION_SECONDS]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def create_job(kind, stages, workspace_id=None):
+    # Register a new job for a workspace and return its id
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _jobs_lock:
+        _prune_jobs(now)
+        _jobs[job_id] = {
+            'id': job_id,
+            'kind': kind,
+            'workspace': workspace_id,
+            'status': 'queued',
+            'stage': None,
+            'stages': list(stages),
+            'completed_stages': [],
+            'progress': 0.0,
+            'timings': {},
+            'results': {},
+            'metrics': {},
+            'error': None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            '_stage_started_at': None,
+            '_events': [],
+            '_event_count': 0,
+            '_cancel_requested': False,
+        }
+    return job_id
+
+
+def _emit(job, event, data):
+    # Append an event to the job's event log and wake up the streams (caller holds the lock).
+    # Events are numbered for the whole life of the job. A queue position replaces the one before it, and only the
+    # last JOB_MAX_EVENTS events are kept
+    entry = (job['_event_count'], event, data)
+    job['_event_count'] += 1
+    events = job['_events']
+    if event == 'queued' and events and events[-1][1] == 'queued':
+        events[-1] = entry
+    else:
+        events.append(entry)
+        if len(events) > JOB_MAX_EVENTS:
+            del events[:len(events) - JOB_MAX_EVENTS]
+    _jobs_changed.notify_all()
+
+
+def _close_stage(job, now):
+    # Record the timing of the stage that is currently running (caller holds the lock)
+    if job['stage'] is not None:
+        job['timings'][job['stage']] = round(now - job['_stage_started_at'], 3)
+        job['completed_stages'].append(job['stage'])
+        job['progress'] = round(len(job['completed_stages']) / len(job['stages']), 3)
+        job['stage'] = None
+
+
+def raise_if_cancelled(job_id):
+    # Stop the pipeline if the job has been cancelled
+    if job_id is None:
+        return
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None and job['_cancel_requested']:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+
+
+def set_stage(job_id, stage):
+    # Mark the start of a pipeline stage, closing the previous one. Raises JobCancelled if the job was cancelled
+    if job_id is None:
+        return
+    now = time.time()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        if job['_cancel_requested']:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+        _close_stage(job, now)
+        job['stage'] = stage
+        job['_stage_started_at'] = now
+        _emit(job, 'stage', {'stage': stage, 'progress': job['progress'], 'timings': dict(job['timings'])})
+
+
+def set_result(job_id, key, value):
+    # Attach a result (report text, ...) to the job
+    if job_id is None:
+        return
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job['results'][key] = value
+            _emit(job, 'result', {'key': key, 'value': value})
+
+
+def set_metric(job_id, key, value):
+    # Record how the job ran (e.g. how its work was scheduled), reported with its status
+    if job_id is None:
+        return
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job['metrics'][key] = value
+
+
+def add_image(job_id, filename):
+    # Record an image the job has finished writing
+    if job_id is None:
+        return
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job['results'].setdefault('images', []).append(filename)
+            _emit(job, 'image', {'filename': filename})
+
+
+def _finish_job(job_id, status, error=None):
+    now = time.time()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        _close_stage(job, now)
+        job['status'] = status
+        job['error'] = error
+        job['finished_at'] = now
+        if status == 'completed':
+            job['progress'] = 1.0
+        _emit(job, status, {'error': error, 'progress': job['progress'], 'timings': dict(job['timings'])})
+
+
+def get_job(job_id):
+    # Return a snapshot of the job status, or None if the job is unknown
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = {key: value for key, value in job.items() if not key.startswith('_')}
+        snapshot['completed_stages'] = list(job['completed_stages'])
+        snapshot['timings'] = dict(job['timings'])
+        snapshot['results'] = dict(job['results'])
+        snapshot['metrics'] = dict(job['metrics'])
+        if job['status'] == 'queued':
+            snapshot['queue_position'] = _queue_position(job_id)
+    now = snapshot['finished_at'] or time.time()
+    if snapshot['started_at'] is not None:
+        snapshot['elapsed'] = round(now - snapshot['started_at'], 3)
+    return snapshot
+
+
+def wait_for_events(job_id, after, timeout):
+    # Block until the job has events from index `after` on or the timeout expires.
+    # Returns (events, finished) where events is a list of (index, event, data), or (None, True) for unknown jobs.
+    # Once a finished job's events have been streamed only its final event is kept
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None, True
+        if job['_event_count'] <= after and job['finished_at'] is None:
+            _jobs_changed.wait_for(lambda: job['_event_count'] > after or job['finished_at'] is not None, timeout)
+        events = [entry for entry in job['_events'] if entry[0] >= after]
+        finished = job['finished_at'] is not None
+        if finished:
+            del job['_events'][:-1]
+        return events, finished
+
+
+def active_workspaces():
+    # Workspaces that still have a queued or running job
+    with _jobs_lock:
+        return {job['workspace'] for job in _jobs.values()
+                if job['status'] in ('queued', 'running') and job['workspace'] is not None}
+
+
+def _run(job_id, target, args):
+    # Run the target, passing the job id so it can report its stages, and record how it ended
+    with _jobs_lock:
+        _jobs[job_id]['status'] = 'running'
+        _jobs[job_id]['started_at'] = time.time()
+    try:
+        target(*args, job_id=job_id)
+    except JobCancelled:
+        _finish_job(job_id, 'cancelled', 'Job was cancelled')
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        _finish_job(job_id, 'failed', str(e))
+    else:
+        _finish_job(job_id, 'completed')
+
+
+def _queue_position(job_id):
+    # 1-based position of a queued job (caller holds the lock)
+    for position, (queued_id, _, _) in enumerate(_queue, start=1):
+        if queued_id == job_id:
+            return position
+    return None
+
+
+def _announce_queue_positions():
+    # Tell every waiting job where it is in the queue (caller holds the lock)
+    for position, (job_id, _, _) in enumerate(_queue, start=1):
+        _emit(_jobs[job_id], 'queued', {'queue_position': position})
+
+
+def _runner():
+    # Take jobs from the queue one at a time, forever
+    while True:
+        with _queue_changed:
+            _queue_changed.wait_for(lambda: len(_queue) > 0)
+            job_id, target, args = _queue.popleft()
+            _announce_queue_positions()
+        _run(job_id, target, args)
+
+
+def submit_job(job_id, target, *args):
+    # Queue a job for the bounded pool of runner threads and return its queue position.
+    # Raises JobQueueFull (and forgets the job) when the queue has no room left
+    with _queue_changed:
+        if len(_queue) >= JOB_QUEUE_SIZE:
+            del _jobs[job_id]
+            raise JobQueueFull(f"{len(_queue)} jobs are already waiting")
+        while len(_runners) < JOB_WORKERS:
+            runner = threading.Thread(target=_runner, daemon=True)
+            runner.start()
+            _runners.append(runner)
+        _queue.append((job_id, target, args))
+        position = len(_queue)
+        _emit(_jobs[job_id], 'queued', {'queue_position': position})
+        _queue_changed.notify()
+    return position
+
+
+def queue_length():
+    # Number of jobs waiting for a runner thread
+    with _jobs_lock:
+        return len(_queue)
+
+
+def cancel_job(job_id):
+    # Cancel a job: queued jobs are dropped at once, running jobs stop at their next stage.
+    # Returns False if the job is unknown or already finished
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['finished_at'] is not None:
+            return False
+        job['_cancel_requested'] = True
+        queued = [entry for entry in _queue if entry[0] == job_id]
+        for entry in queued:
+            _queue.remove(entry)
+        if queued:
+            _announce_queue_positions()
+    if queued:
+        _finish_job(job_id, 'cancelled', 'Job was cancelled')
+    return True
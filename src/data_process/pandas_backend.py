@@ -0,0 +1,164 @@
+import os
+import pandas as pd
+from src.data_process.jobs import set_stage, set_metric
+from src.data_process.profiler import profile_dataset
+from src.data_process.imputation import kde_impute, column_sample, IMPUTE_SEED
+from src.data_process.capping import cap_columns
+from src.data_process.compaction import compact_dataset
+from src.data_process.worker_pool import (map_rows_in_pool, plan_chunks, estimate_row_bytes,
+                                          TRANSFORM_IN_PROCESS_MAX_ROWS)
+from src.data_process.columnar_store import write_dataset, read_dataset, read_rows
+from src.data_process.chunked_csv import drop_seen_rows
+from src.data_process.incremental import row_hashes
+
+
+def drop_rows(df, datetime_columns, seen_blocks):
+    # Drop the rows missing a date, and the duplicates of rows earlier in df or in seen_blocks (the rows kept
+    # from earlier chunks) found by their 64-bit hashes. Returns the rows left and the rows dropped for each reason
+    rows = len(df)
+    df = df.dropna(subset=[col for col in datetime_columns if col in df.columns])
+    dated = len(df)
+    df = drop_seen_rows(df, seen_blocks)
+    return df, rows - dated, dated - len(df)
+
+def process_datetime_columns(df, datetime_columns, date_formats=None):
+    # Parse the datetime columns into native datetime64 values, they are only formatted as text for display.
+    # Each column is parsed in the format categorize_columns detected for it, values not in it become NaT
+    date_formats = date_formats or {}
+    for column in datetime_columns:
+        df[column] = pd.to_datetime(df[column], format=date_formats.get(column, '%m/%d/%Y %I:%M:%S %p'),
+                                    errors='coerce')
+    return df
+
+def fill_empty_values(df, columns_to_fill):
+    # Fill empty values with 'Unknown'
+    df[columns_to_fill] = df[columns_to_fill].fillna('Unknown')
+    return df
+
+def calculate_loan_duration(df):
+    # Calculate loan duration in days and months
+    if not isinstance(df, pd.DataFrame):
+        raise TypeError("Input must be a pandas DataFrame")
+
+    df.columns = df.columns.str.lower().str.strip()
+
+    required_columns = ['end of period', 'agreement signing date']
+    if not all(col in df.columns for col in required_columns):
+        raise KeyError("Required columns for loan duration calculation are missing")
+
+    for col in required_columns:
+        temp_col = f'temp_{col}'
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[temp_col] = pd.to_datetime(df[col], format='%d/%m/%Y')
+        else:
+            df[temp_col] = df[col]
+
+    df['loan duration (days)'] = (df['temp_end of period'] - df['temp_agreement signing date']).dt.days
+    df['loan duration (months)'] = ((df['temp_end of period'].dt.year - df['temp_agreement signing date'].dt.year) * 12 +
+                                    (df['temp_end of period'].dt.month - df['temp_agreement signing date'].dt.month))
+    df['loan duration (years)'] = df['loan duration (days)'] / 365.25
+
+    df = df.drop(columns=[f'temp_{col}' for col in required_columns])
+
+    new_columns = ['loan duration (days)', 'loan duration (months)', 'loan duration (years)']
+    existing_columns = [col for col in df.columns if col not in new_columns]
+    df = df[new_columns + existing_columns]
+
+    return df
+
+def process_chunk(chunk, datetime_columns, categorical_columns, id_columns, date_formats=None):
+    # Process each chunk in parallel
+    chunk = process_datetime_columns(chunk, datetime_columns, date_formats)
+    chunk = fill_empty_values(chunk, categorical_columns + id_columns)
+    chunk = calculate_loan_duration(chunk)
+    return chunk
+
+def parse_datetime_rows(rows, path, datetime_columns, date_formats=None):
+    # Parse the datetime columns of a range of rows of the shared Arrow file, in a worker process
+    start, stop = rows
+    return process_datetime_columns(read_rows(path, datetime_columns, start, stop), datetime_columns, date_formats)
+
+def transform_in_pool(df, work_dir, datetime_columns, categorical_columns, id_columns, date_formats=None,
+                      job_id=None):
+    # process_chunk for the whole DataFrame. Date parsing, the only costly step, runs in the process pool:
+    # the date columns are written once to a memory-mapped Arrow file the workers read their rows from,
+    # and only the parsed columns come back. Filling and duration arithmetic are vectorized in place.
+    # Inputs with fewer rows than TRANSFORM_IN_PROCESS_MAX_ROWS (all of them by default), and machines with a single
+    # CPU, run everything here
+    plan = plan_chunks(len(df), estimate_row_bytes(df[datetime_columns]), TRANSFORM_IN_PROCESS_MAX_ROWS)
+    set_metric(job_id, 'transform_schedule', plan)
+    if plan['mode'] == 'in_process' or not datetime_columns:
+        return process_chunk(df, datetime_columns, categorical_columns, id_columns, date_formats)
+    shared_path = os.path.join(work_dir, 'shared.tmp.feather')
+    write_dataset(df[datetime_columns], shared_path)
+    try:
+        parsed = map_rows_in_pool(parse_datetime_rows, shared_path, len(df), plan['chunk_rows'],
+                                  datetime_columns, date_formats, job_id=job_id)
+    finally:
+        os.remove(shared_path)
+    parsed = pd.concat(parsed)
+    for column in datetime_columns:
+        df[column] = parsed[column].to_numpy()
+    df = fill_empty_values(df, categorical_columns + id_columns)
+    return calculate_loan_duration(df)
+
+# The backend interface of backends.get_backend, on pandas DataFrames
+
+def read_upload(input_path):
+    # The upload as pandas reads it, and its dtypes
+    df = pd.read_csv(input_path, low_memory=False)
+    return df, df.dtypes
+
+def profile_upload(df):
+    # profiler.profile_dataset
+    return profile_dataset(df)
+
+def hash_rows(df, dropped_columns):
+    # The hashes of the rows of the upload df on the columns kept
+    kept = ~df.columns.str.strip().str.lower().isin(dropped_columns)
+    return row_hashes(df.loc[:, kept])
+
+def drop_columns_and_rows(df, dropped_columns, datetime_columns, hashes):
+    # The rows and columns of the upload df kept: the dropped columns, the rows missing one of the datetime columns
+    # and duplicate rows are dropped. pandas finds the duplicates itself, the hashes are only read by the other
+    # backends. Returns the rows left and the rows dropped for each reason
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.drop(columns=[col for col in dropped_columns if col in df.columns])
+    df, missing_dates, duplicates = drop_rows(df, datetime_columns, [])
+    return df.reset_index(drop=True), missing_dates, duplicates
+
+def sample_rows(df, positions):
+    # Rows at the given positions, for the column classifier
+    return df.iloc[positions]
+
+def impute_and_cap(df, numeric_columns, job_id=None):
+    # kde_impute and cap_columns for the numeric columns of df. Returns df, the samples the imputers are fitted on,
+    # the number of values capped in every column and the capping bounds
+    set_stage(job_id, 'impute')
+    samples = {col: column_sample(df, col, IMPUTE_SEED) for col in numeric_columns}
+    df = kde_impute(df, numeric_columns, IMPUTE_SEED, job_id=job_id, samples=samples)
+    set_stage(job_id, 'cap')
+    df, capping, bounds = cap_columns(df, numeric_columns)
+    return df, samples, capping, bounds
+
+def transform(df, column_types, work_dir, job_id=None):
+    # impute_and_cap, then transform_in_pool for the cleaned rows. The index column is dropped
+    df, samples, capping, bounds = impute_and_cap(df, column_types['numeric_columns'], job_id)
+    set_stage(job_id, 'transform')
+    df = transform_in_pool(df, work_dir, column_types['datetime_columns'], column_types['categorical_columns'],
+                           column_types['id_columns'], column_types['date_formats'], job_id=job_id)
+    if 'unnamed: 0' in df.columns:
+        df = df.drop(columns=['unnamed: 0'])
+    return df, samples, capping, bounds
+
+def compact(df, column_types, job_id=None):
+    # compaction.compact_dataset
+    return compact_dataset(df, job_id)
+
+def write_frame(df, path):
+    # Save the rows as columnar_store.write_dataset does
+    write_dataset(df, path)
+
+def read_frame(path):
+    # Read the rows write_frame saved
+    return read_dataset(path)
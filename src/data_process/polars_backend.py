@@ -0,0 +1,286 @@
+from functools import partial
+import numpy as np
+import pandas as pd
+import polars as pl
+from src.data_process.jobs import set_stage, set_metric
+from src.data_process.columnclassifier import sample_positions
+from src.data_process.profiler import profile_numeric
+from src.data_process.incremental import row_hashes
+from src.data_process.chunked_csv import STREAM_CHUNK_ROWS
+from src.data_process.imputation import impute_columns, sample_values, column_rng, IMPUTE_SEED
+from src.data_process.compaction import compact_dtypes, report_memory, COMPACT_CATEGORY_RATIO
+
+# Text pandas.read_csv reads as missing by default, read as missing here too so both backends see the same values
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+# Text pandas.read_csv reads as booleans
+BOOLEAN_TEXT = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+# pandas dtypes of the polars types read_upload gives columns, booleans with missing values are objects there
+PANDAS_DTYPES = {pl.Int64: 'int64', pl.Float64: 'float64', pl.Boolean: 'bool', pl.String: 'object'}
+# Format of the dates of columns classified without one, as process_datetime_columns parses them
+DEFAULT_DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+# Columns calculate_loan_duration derives the loan duration from, and the columns it adds
+DURATION_COLUMNS = ['end of period', 'agreement signing date']
+LOAN_DURATION_COLUMNS = ['loan duration (days)', 'loan duration (months)', 'loan duration (years)']
+NANOSECONDS_PER_DAY = 86_400 * 10 ** 9
+# Column the position of every row of the upload is kept in while rows are dropped
+ROW_INDEX = '__row__'
+# Polars types of the dtypes compaction.compact_dtypes picks, besides categories
+COMPACT_TYPES = {'int8': pl.Int8, 'int16': pl.Int16, 'int32': pl.Int32, 'float32': pl.Float32}
+
+
+def typed_column(values, sample, nulls):
+    # A column read as text typed as pandas.read_csv types it: integers, floats or booleans when all its values are
+    # (integers with missing values and empty columns as floats), text otherwise. Like pandas, numbers may be padded
+    # with whitespace, booleans may not. A type is tried on the sample first, a value of the sample it fails on fails
+    # it for the column
+    if nulls == len(values):
+        return values.cast(pl.Float64)
+    sample = sample.drop_nulls()
+    for dtype in (pl.Int64, pl.Float64):
+        if not sample.str.strip_chars().cast(dtype, strict=False).null_count():
+            typed = values.str.strip_chars().cast(pl.Float64 if nulls else dtype, strict=False)
+            if typed.null_count() == nulls:
+                return typed
+    if sample.is_in(list(BOOLEAN_TEXT)).all():
+        typed = values.replace_strict(BOOLEAN_TEXT, default=None, return_dtype=pl.Boolean)
+        if typed.null_count() == nulls:
+            return typed
+    return values
+
+
+def pandas_dtypes(df):
+    # The dtypes of the columns of a frame read_upload typed once converted to pandas
+    return pd.Series({col: np.dtype(object if dtype == pl.Boolean and df[col].null_count() else PANDAS_DTYPES[dtype])
+                      for col, dtype in df.schema.items()}, dtype=object)
+
+
+def read_upload(input_path):
+    # The upload read once, as text, and every column typed as pandas reads it (see typed_column) under the names
+    # pandas gives the columns. The whole upload is read: the profile, the classifier and the row hashes read every
+    # column, the ones dropped later too. Columns are typed one at a time in place, so the text of a column is freed
+    # once it is typed. Returns the frame and its pandas dtypes
+    names = list(pd.read_csv(input_path, nrows=0).columns)
+    df = pl.read_csv(input_path, has_header=False, skip_rows=1, new_columns=names, infer_schema=False,
+                     null_values=NA_VALUES)
+    sample = df[sample_positions(len(df))]
+    for i, missing in enumerate(df.null_count().row(0)):
+        df.replace_column(i, typed_column(df[:, i], sample[:, i], missing))
+    return df, pandas_dtypes(df)
+
+
+def profile_upload(df):
+    # profiler.profile_dataset of the upload: the counts are taken by polars, the statistics of the numeric columns
+    # from their values as pandas takes them
+    dtypes = pandas_dtypes(df)
+    nulls = df.null_count().row(0, named=True)
+    distinct = df.select(pl.all().drop_nulls().n_unique()).row(0, named=True)
+    profile = {'rows': len(df), 'columns': {col: {'dtype': str(dtypes[col]), 'nulls': nulls[col],
+                                                  'distinct': distinct[col]} for col in df.columns}}
+    numeric = [col for col, dtype in df.schema.items() if dtype in (pl.Int64, pl.Float64)]
+    if not numeric or len(df) == 0:
+        return profile
+    return profile_numeric(profile, numeric, df.select(pl.col(numeric).cast(pl.Float64)).to_numpy())
+
+
+def hash_rows(df, dropped_columns):
+    # The hashes of the rows of the upload df on the columns kept, as incremental.row_hashes hashes them in pandas:
+    # text is handed over as categories, which pandas hashes like the text. The rows are converted and hashed
+    # STREAM_CHUNK_ROWS at a time, so pandas never holds a copy of the whole upload
+    kept = [col for col in df.columns if col.strip().lower() not in dropped_columns]
+    text = [col for col in kept if df.schema[col] == pl.String]
+    rows = df.select(kept).with_columns(pl.col(text).cast(pl.Categorical))
+    return np.concatenate([row_hashes(rows.slice(start, STREAM_CHUNK_ROWS).to_pandas())
+                           for start in range(0, len(rows), STREAM_CHUNK_ROWS)] or [np.empty(0, dtype='uint64')])
+
+
+def drop_columns_and_rows(df, dropped_columns, datetime_columns, hashes):
+    # drop_col_row over the upload df: the positions of the rows kept are found by a lazy query that only reads the
+    # date columns, rows missing a date are filtered out. Duplicates are then dropped by hashes, the hashes of all
+    # rows of the upload on the columns kept, keeping the first like drop_seen_rows. The columns kept are copied
+    # once, at the positions left. Returns the rows left and the rows dropped for each reason
+    names = {col: col.strip().lower() for col in df.columns}
+    kept = [name for name in names.values() if name not in dropped_columns]
+    rows = df.lazy().rename(names).select(kept).with_row_index(ROW_INDEX)
+    dates = [col for col in datetime_columns if col in kept]
+    if dates:
+        rows = rows.filter(pl.all_horizontal([pl.col(col).is_not_null() for col in dates]))
+    positions = rows.select(ROW_INDEX).collect()[ROW_INDEX].to_numpy()
+    first = ~pd.Series(hashes[positions]).duplicated().to_numpy()
+    return (df.rename(names).select(kept)[positions[first]], len(hashes) - len(positions),
+            len(positions) - int(first.sum()))
+
+
+def sample_rows(df, positions):
+    # Rows of a frame at the given positions, as a pandas DataFrame of the dtypes of the frame for the column
+    # classifier
+    return df[positions].to_pandas().astype(pandas_dtypes(df).to_dict())
+
+
+def write_frame(df, path):
+    # Save a frame as an uncompressed Arrow IPC file, like columnar_store.write_dataset
+    df.write_ipc(path, compression='uncompressed')
+
+
+def read_frame(path):
+    # Read a frame write_frame saved
+    return pl.read_ipc(path)
+
+
+def parse_dates(column, date_format):
+    # process_datetime_columns for one column: values not in the format become null. Dates in no single format are
+    # parsed value by value by pandas
+    if date_format == 'mixed':
+        return pl.col(column).map_batches(
+            lambda values: pl.from_pandas(pd.to_datetime(values.to_pandas(), format='mixed', errors='coerce')),
+            return_dtype=pl.Datetime('ns'))
+    return pl.col(column).cast(pl.String).str.strptime(pl.Datetime('ns'), date_format, strict=False)
+
+
+def _years(days):
+    # Days as years, divided by numpy: polars divides by a constant as a multiplication by its inverse, which may
+    # round the last bit differently
+    return pl.Series(days.to_numpy() / 365.25, nan_to_null=True)
+
+
+def loan_duration(schema):
+    # calculate_loan_duration as expressions: days (rounded down like pandas), calendar months and years.
+    # Dates still held as text are parsed as DATE_FORMAT text, failing on values not in it
+    if not all(col in schema for col in DURATION_COLUMNS):
+        raise KeyError("Required columns for loan duration calculation are missing")
+    end, start = [pl.col(col) if schema[col] == pl.Datetime('ns')
+                  else pl.col(col).str.strptime(pl.Datetime('ns'), '%d/%m/%Y') for col in DURATION_COLUMNS]
+    days = (end - start).dt.total_nanoseconds() // NANOSECONDS_PER_DAY
+    months = (end.dt.year() - start.dt.year()) * 12 + (end.dt.month() - start.dt.month())
+    return [days.alias(LOAN_DURATION_COLUMNS[0]), months.alias(LOAN_DURATION_COLUMNS[1]),
+            days.map_batches(_years, return_dtype=pl.Float64).alias(LOAN_DURATION_COLUMNS[2])]
+
+
+def fill_missing(values, drawn):
+    # A column with its missing values replaced by the values drawn for them, in order
+    return values.scatter(values.is_null().arg_true(), drawn)
+
+
+def impute(df, numeric_columns, job_id=None):
+    # imputation.kde_impute as expressions over the rows df: the values of the missing cells are drawn as kde_impute
+    # draws them, from samplers fitted on the samples of column_sample, and filled in by the query. Returns the
+    # expressions and the samples
+    samples = {}
+    items = []
+    for col in numeric_columns:
+        values = df[col].drop_nulls().cast(pl.Float64).to_numpy()
+        samples[col] = sample_values(values, column_rng(IMPUTE_SEED, col)), len(values)
+        if df[col].null_count():
+            items.append((col,) + samples[col] + (df[col].null_count(),))
+    imputed = impute_columns(items, IMPUTE_SEED, job_id=job_id)
+    return [pl.col(col).cast(pl.Float64).map_batches(partial(fill_missing, drawn=drawn), return_dtype=pl.Float64)
+            for (col, _, _, _), drawn in zip(items, imputed) if drawn is not None], samples
+
+
+def iqr_bounds(col):
+    # capping.iqr_bounds of a column as expressions, polars interpolates the quartiles as column_quantiles does
+    values = pl.col(col).cast(pl.Float64)
+    non_zero = values.filter(values != 0)
+    Q1, Q3 = non_zero.quantile(0.25, 'linear'), non_zero.quantile(0.75, 'linear')
+    IQR = Q3 - Q1
+    return Q1 - 1.5 * IQR, Q3 + 1.5 * IQR
+
+
+def cap(plan, numeric_columns):
+    # capping.cap_columns for the numeric columns of a query: the bounds and the number of values beyond them are
+    # taken in one query, the values are clipped by the query returned. Like cap_columns only the columns with
+    # values capped become floats. Returns the query, the number of values capped in every column (None for columns
+    # without non-zero values) and the bounds
+    stats = []
+    for col in numeric_columns:
+        values = pl.col(col).cast(pl.Float64)
+        lower, upper = iqr_bounds(col)
+        stats += [lower.alias(f'{col} lower'), upper.alias(f'{col} upper'), (values != 0).sum().alias(f'{col} values'),
+                  ((values != 0) & ((values < lower) | (values > upper))).sum().alias(f'{col} capped')]
+    stats = plan.select(stats).collect().row(0, named=True) if numeric_columns else {}
+    bounds = tuple(np.array([np.nan if stats[f'{col} {bound}'] is None else stats[f'{col} {bound}']
+                             for col in numeric_columns], dtype='float64') for bound in ('lower', 'upper'))
+    capping = {col: stats[f'{col} capped'] if stats[f'{col} values'] else None for col in numeric_columns}
+    clipped = [pl.when(pl.col(col) != 0).then(pl.col(col).cast(pl.Float64).clip(lower, upper))
+               .otherwise(pl.col(col).cast(pl.Float64)).alias(col)
+               for col, lower, upper in zip(numeric_columns, *bounds) if capping[col]]
+    return plan.with_columns(clipped), capping, bounds
+
+
+def transform(df, column_types, work_dir=None, job_id=None):
+    # Impute, cap and process_chunk as lazy queries over the cleaned rows, the index column dropped. The numeric
+    # columns are imputed and capped in the query and never leave polars: the query taking the capping bounds and
+    # the one transforming the rows both start from the imputed rows. Polars runs the queries on its own threads,
+    # the imputers are fitted in the process pool like kde_impute fits them. Returns the rows, the samples the
+    # imputers are fitted on, the number of values capped in every column and the capping bounds
+    numeric_columns = column_types['numeric_columns']
+    set_stage(job_id, 'impute')
+    imputed, samples = impute(df, numeric_columns, job_id)
+    plan = df.lazy().with_columns(imputed)
+    set_stage(job_id, 'cap')
+    plan, capping, bounds = cap(plan, numeric_columns)
+
+    set_stage(job_id, 'transform')
+    set_metric(job_id, 'transform_schedule', {'mode': 'polars', 'threads': pl.thread_pool_size()})
+    datetime_columns = column_types['datetime_columns']
+    date_formats = column_types['date_formats']
+    plan = plan.with_columns([parse_dates(col, date_formats.get(col, DEFAULT_DATE_FORMAT))
+                              for col in datetime_columns])
+    # only text columns are filled here, see compact
+    schema = plan.collect_schema()
+    text = [col for col in column_types['categorical_columns'] + column_types['id_columns'] if schema[col] == pl.String]
+    plan = plan.with_columns(pl.col(text).fill_null('Unknown')).with_columns(loan_duration(schema))
+    existing = [col for col in schema if col not in LOAN_DURATION_COLUMNS and col != 'unnamed: 0']
+    return plan.select(LOAN_DURATION_COLUMNS + existing).collect(), samples, capping, bounds
+
+
+def summarize_columns(df, skipped):
+    # compaction.summarize_columns for a frame, its columns seen as the dtypes they get in pandas (integers with
+    # nulls are floats there). The distinct values of text columns are only listed when there are few enough of them
+    # to become categories, the columns skipped are left as they are
+    rows = len(df)
+    summary = {col: {'kind': None} for col in df.columns}
+    columns = [col for col in df.columns if col not in skipped]
+    text = [col for col in columns if df.schema[col] == pl.String]
+    integers = [col for col in columns if df.schema[col].is_integer() and not df[col].null_count()]
+    floats = [col for col in columns if df.schema[col].is_float()
+              or (df.schema[col].is_integer() and df[col].null_count())]
+    # float32 holds a value exactly when it survives the round trip
+    exact = [(pl.col(col).cast(pl.Float32).cast(pl.Float64) == pl.col(col).cast(pl.Float64)).or_(
+        pl.col(col).is_null(), pl.col(col).cast(pl.Float64).is_nan()).all().alias(col) for col in floats]
+    stats = df.select([pl.col(text).drop_nulls().n_unique().name.suffix(' distinct'),
+                       pl.col(integers).min().name.suffix(' min'), pl.col(integers).max().name.suffix(' max')]
+                      + exact).row(0, named=True) if columns else {}
+    for col in text:
+        distinct = stats[f'{col} distinct']
+        values = set(df[col].drop_nulls().unique().to_list()) if distinct <= COMPACT_CATEGORY_RATIO * rows else None
+        summary[col] = {'kind': 'text', 'values': values}
+    for col in integers:
+        summary[col] = {'kind': 'integer', 'min': stats[f'{col} min'] if rows else np.inf,
+                        'max': stats[f'{col} max'] if rows else -np.inf}
+    for col in floats:
+        summary[col] = {'kind': 'float', 'exact': stats[col]}
+    return summary
+
+
+def compact(df, column_types, job_id=None):
+    # compaction.compact_dataset for a transformed frame, compacted before it is converted to pandas: repeated text
+    # arrives as pandas categories straight from polars enums. The categorical and ID columns of other types pandas
+    # fills with text become mixed object columns, they are filled once converted and not compacted. The memory
+    # saved is measured in polars, on the frame before and after the casts
+    fill = [col for col in column_types['categorical_columns'] + column_types['id_columns']
+            if df.schema[col] != pl.String and df[col].null_count()]
+    dtypes = compact_dtypes(summarize_columns(df, fill), len(df))
+    casts = [pl.col(col).cast(pl.Enum(list(dtype.categories)) if dtype == 'category' else COMPACT_TYPES[dtype])
+             for col, dtype in dtypes.items()]
+    compacted = df.with_columns(casts)
+    before, after = [pd.Series({col: frame[col].estimated_size() for col in frame.columns})
+                     for frame in (df, compacted)]
+    df = compacted.to_pandas()
+    for col, dtype in dtypes.items():
+        if dtype == 'category':
+            df[col] = df[col].cat.as_unordered()
+    if fill:
+        df[fill] = df[fill].fillna('Unknown')
+    report_memory(job_id, before, after, df.dtypes)
+    return df
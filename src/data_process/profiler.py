@@ -0,0 +1,191 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from src.data_process.columnar_store import read_dataset, read_schema
+from src.data_process.chunked_csv import update_sample
+from src.data_process.incremental import value_hashes
+
+# Quantiles kept for every numeric column, of all values and of the non-zero values outlier capping looks at
+PROFILE_QUANTILES = [0.25, 0.5, 0.75]
+# Bins of the histogram kept for every numeric column
+PROFILE_BINS = 20
+# The profile of a processed dataset is saved next to it under this name
+PROFILE_FILE = 'profile.json'
+
+
+def _number(value):
+    # JSON has no NaN, missing statistics are null
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def column_quantiles(values, quantiles=PROFILE_QUANTILES):
+    # Quantiles of every column of a 2D float array ignoring NaNs, interpolated linearly like pandas does.
+    # The columns are sorted once, NaNs end up last and are left out by counting the values before them.
+    # Returns the quantiles (one row per quantile), the sorted columns and the number of values in each
+    values = np.sort(values, axis=0)
+    counts = (~np.isnan(values)).sum(axis=0)
+    columns = np.arange(values.shape[1])
+    result = []
+    for q in quantiles:
+        position = q * np.maximum(counts - 1, 0)
+        lower = np.floor(position).astype(int)
+        upper = np.ceil(position).astype(int)
+        value = values[lower, columns] + (values[upper, columns] - values[lower, columns]) * (position - lower)
+        result.append(np.where(counts > 0, value, np.nan))
+    return np.array(result).reshape(len(quantiles), values.shape[1]), values, counts
+
+
+def profile_dataset(df, columns=None):
+    # Statistics of the columns in one vectorized pass: null and distinct counts of every column, and for the
+    # numeric ones min/max, mean/std, quantiles of all and of the non-zero values, zero counts and a histogram
+    columns = list(df.columns) if columns is None else columns
+    profile = {'rows': len(df), 'columns': {}}
+    nulls = df[columns].isna().sum()
+    for col in columns:
+        profile['columns'][col] = {'dtype': str(df[col].dtype), 'nulls': int(nulls[col]),
+                                   'distinct': int(df[col].nunique())}
+        if pd.api.types.is_datetime64_any_dtype(df[col]) and nulls[col] < len(df):
+            profile['columns'][col].update(min=df[col].min().isoformat(), max=df[col].max().isoformat())
+
+    numeric = [col for col in columns
+               if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+    if not numeric or len(df) == 0:
+        return profile
+    return profile_numeric(profile, numeric, df[numeric].to_numpy(dtype='float64', na_value=np.nan))
+
+
+def profile_numeric(profile, numeric, values):
+    # The statistics of the numeric columns of a profile, from their values as a 2D float array with NaN for the
+    # missing ones
+    quantiles, ordered, counts = column_quantiles(values)
+    non_zero_quantiles, _, non_zero_counts = column_quantiles(np.where(values == 0, np.nan, values))
+    last = np.maximum(counts - 1, 0)
+    minimum = np.where(counts > 0, ordered[0], np.nan)
+    maximum = np.where(counts > 0, ordered[last, np.arange(len(numeric))], np.nan)
+    sums = np.nansum(values, axis=0)
+    means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    squares = np.nansum((values - means) ** 2, axis=0)
+    stds = np.where(counts > 1, np.sqrt(squares / np.maximum(counts - 1, 1)), np.nan)
+    zeros = (values == 0).sum(axis=0)
+
+    for i, col in enumerate(numeric):
+        stats = profile['columns'][col]
+        stats.update(min=_number(minimum[i]), max=_number(maximum[i]), mean=_number(means[i]), std=_number(stds[i]),
+                     quantiles=[_number(q) for q in quantiles[:, i]],
+                     non_zero_quantiles=[_number(q) for q in non_zero_quantiles[:, i]],
+                     zeros=int(zeros[i]), non_zero=int(non_zero_counts[i]))
+        if counts[i] > 0:
+            hist, edges = np.histogram(ordered[:counts[i], i], bins=PROFILE_BINS)
+            stats['histogram'] = {'counts': hist.tolist(), 'edges': edges.tolist()}
+    return profile
+
+
+def profile_dataset_file(path):
+    # profile_dataset of a dataset file too large to load whole, one memory-mapped column at a time
+    profile = {'rows': 0, 'columns': {}}
+    for column in read_schema(path).names:
+        column_profile = profile_dataset(read_dataset(path, [column]))
+        profile['rows'] = column_profile['rows']
+        profile['columns'].update(column_profile['columns'])
+    return profile
+
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def profile_sketch(batches, rng):
+    # What append_profile needs besides the profile of a dataset, built from its batches of rows: the hashes of the
+    # distinct values of every column, and a uniform sample of the values of every numeric column
+    distinct = {}
+    samples = {}
+    seen = {}
+    for batch in batches:
+        for col in batch.columns:
+            distinct[col] = np.union1d(distinct.get(col, np.empty(0, dtype='uint64')), value_hashes(batch[col]))
+            if _is_numeric(batch[col]):
+                values = batch[col].dropna().to_numpy(dtype='float64')
+                samples[col], seen[col] = update_sample(samples.get(col, np.empty(0)), seen.get(col, 0), values, rng)
+    return distinct, samples
+
+
+def _merge_extreme(function, current, new):
+    # min or max of two statistics that are None when there were no values
+    values = [value for value in (current, new) if value is not None]
+    return function(values) if values else None
+
+
+def append_profile(profile, distinct, samples, df, dtypes, rng):
+    # The profile of a dataset after the rows of df are appended to it, without reading the rows it held before:
+    # counts, min/max, means and standard deviations are merged exactly, distinct counts come from the hashes of
+    # the distinct values, histograms keep their bins (new values beyond them are counted in the outer bins) and
+    # quantiles are taken over the sample, which is exact as long as it holds every value. The sketch (distinct
+    # and samples) is updated in place, dtypes are the dtypes of the columns of the merged dataset
+    delta = profile_dataset(df)
+    merged = {'rows': profile['rows'] + delta['rows'], 'columns': {}}
+    for col, stats in profile['columns'].items():
+        new = delta['columns'][col]
+        stats = dict(stats, dtype=str(dtypes[col]), nulls=stats['nulls'] + new['nulls'])
+        distinct[col] = np.union1d(distinct[col], value_hashes(df[col]))
+        stats['distinct'] = len(distinct[col])
+        merged['columns'][col] = stats
+        if col not in samples:
+            if 'min' in new:
+                stats['min'] = _merge_extreme(min, stats.get('min'), new['min'])
+                stats['max'] = _merge_extreme(max, stats.get('max'), new['max'])
+            continue
+
+        values = df[col].dropna().to_numpy(dtype='float64')
+        previous = profile['rows'] - profile['columns'][col]['nulls']
+        count = previous + len(values)
+        if len(values):
+            stats['min'] = _merge_extreme(min, stats['min'], float(values.min()))
+            stats['max'] = _merge_extreme(max, stats['max'], float(values.max()))
+            # means and sums of squared deviations of both parts combined
+            mean = values.mean()
+            squares = ((values - mean) ** 2).sum()
+            if previous:
+                squares += (stats['std'] or 0) ** 2 * (previous - 1)
+                squares += (mean - stats['mean']) ** 2 * previous * len(values) / count
+                mean = stats['mean'] + (mean - stats['mean']) * len(values) / count
+            stats['mean'] = _number(mean)
+            stats['std'] = _number(np.sqrt(squares / (count - 1))) if count > 1 else None
+            stats['zeros'] += int((values == 0).sum())
+            stats['non_zero'] += int((values != 0).sum())
+            if 'histogram' in stats:
+                edges = np.array(stats['histogram']['edges'])
+                counts = np.histogram(np.clip(values, edges[0], edges[-1]), edges)[0] + stats['histogram']['counts']
+                stats['histogram'] = {'counts': counts.tolist(), 'edges': stats['histogram']['edges']}
+            else:
+                counts, edges = np.histogram(values, bins=PROFILE_BINS)
+                stats['histogram'] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+        samples[col], _ = update_sample(samples[col], previous, values, rng)
+        quantiles, _, _ = column_quantiles(samples[col][:, None])
+        non_zero_quantiles, _, _ = column_quantiles(np.where(samples[col] == 0, np.nan, samples[col])[:, None])
+        stats['quantiles'] = [_number(q) for q in quantiles[:, 0]]
+        stats['non_zero_quantiles'] = [_number(q) for q in non_zero_quantiles[:, 0]]
+    return merged
+
+
+def missing_counts(profile):
+    # Missing values per column, as df.isnull().sum() gives them
+    return pd.Series({col: stats['nulls'] for col, stats in profile['columns'].items()}, dtype='int64')
+
+
+def save_profile(profile, folder):
+    path = os.path.join(folder, PROFILE_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(profile, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_profile(folder):
+    # The profile saved with the processed dataset in the folder, None if there is none
+    try:
+        with open(os.path.join(folder, PROFILE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -9,6 +9,11 @@ import sys
 import os
 import scipy.stats as stats
 import gc
+from src.data_process.jobs import add_image
+from src.data_process.dates import dates_as_text
+
+# Folder of the trained models the insights are predicted with
+MODEL_PATH = 'models'
 
 def safe_plot_save(fig, filename, output_path):
     # Save the plot to the output directory
@@ -29,14 +34,20 @@ def capture_output(func):
         return new_stdout.getvalue()
     return wrapper
 
-def generate_insights(df, output_file_path):
+def publish_image(job_id, output_file_path, filename):
+    # Report the plot to the job once it has been saved
+    if os.path.exists(os.path.join(output_file_path, filename)):
+        add_image(job_id, filename)
+
+def generate_insights(df, output_file_path, job_id=None):
     # Create output directory if it doesn't exist
     os.makedirs(output_file_path, exist_ok=True)
 
     output = "Starting insight generation...\n"
 
-    # Preprocess data
-    categorical_columns = df.select_dtypes(include=['object']).columns
+    # Preprocess data, the models were trained on dates label encoded from their text
+    df = dates_as_text(df)
+    categorical_columns = df.select_dtypes(include=['object', 'category']).columns
     label_encoders = {}
     
     for col in categorical_columns:
@@ -44,26 +55,30 @@ def generate_insights(df, output_file_path):
         df[col] = le.fit_transform(df[col].astype(str))
         label_encoders[col] = le
 
-    model_path = 'models'
+    model_path = MODEL_PATH
 
     # Regional distribution insight (doesn't use any model)
     output += regional_distribution_insight(df, label_encoders, output_file_path)
+    publish_image(job_id, output_file_path, 'regional_distribution.png')
 
     # Loan status insight
     loan_status_model = load(os.path.join(model_path, 'loan_status_rf_model.joblib'), mmap_mode='r')
     output += loan_status_insight(df, loan_status_model, label_encoders, output_file_path)
+    publish_image(job_id, output_file_path, 'loan_status_distribution.png')
     del loan_status_model
     gc.collect()
 
     # Interest rate insight
     interest_rate_model = load(os.path.join(model_path, 'interest_rate_rf_model.joblib'), mmap_mode='r')
     output += interest_rate_insight(df, interest_rate_model, output_file_path)
+    publish_image(job_id, output_file_path, 'interest_rate_analysis.png')
     del interest_rate_model
     gc.collect()
 
     # Disbursed amount insight
     disbursed_amount_model = load(os.path.join(model_path, 'disbursed_amount_rf_model.joblib'), mmap_mode='r')
     output += disbursed_amount_insight(df, disbursed_amount_model, output_file_path)
+    publish_image(job_id, output_file_path, 'disbursed_vs_principal.png')
     del disbursed_amount_model
     gc.collect()
 
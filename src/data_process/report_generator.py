@@ -58,3 +58,6 @@ def generate_financial_analysis(raw_report, output_file_path):
         print(f"Response saved to {output_file_path}")
     except IOError:
         print(f"Error: Unable to write to output file '{output_file_path}'.")
+        return
+
+    return response.text
@@ -0,0 +1,339 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import time
+import uuid
+from src.data_process.jobs import get_job, set_stage, set_result, add_image
+from src.data_process.workspaces import folder_size
+
+# Pipeline outputs are kept here under the SHA-256 of the uploaded file, one folder per pipeline kind
+RESULT_CACHE_ROOT = os.getenv('RESULT_CACHE_ROOT', os.path.join(os.getcwd(), 'src', 'result_cache'))
+# Disk space the cached outputs may use before the least recently used ones are removed
+RESULT_CACHE_BYTES = int(os.getenv('RESULT_CACHE_BYTES', 5 * 1024 ** 3))
+
+# Size of the blocks uploads are hashed and written in
+HASH_BLOCK_BYTES = 1024 * 1024
+
+RESULTS_FILE = 'results.json'
+# Cached preprocessing stages keep their dataset in this file of the entry, their state in RESULTS_FILE
+STAGE_DATA_FILE = 'data.feather'
+
+_stats = {}
+# cached entry path -> [last used, size in bytes], None until read from disk
+_index = None
+# stage cache entry path -> number of jobs using it, pinned entries are not evicted nor replaced
+_pins = {}
+_cache_lock = threading.Lock()
+
+
+def save_and_hash(stream, path):
+    # Write an uploaded file to path block by block and return the SHA-256 of its content
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while True:
+            block = stream.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    # SHA-256 of the content of a file, read block by block
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_key(digest, settings):
+    # Key of what is derived from an upload: the content hash with the code version and settings the outputs
+    # depend on, so outputs of older code or other settings are not restored
+    return hashlib.sha256(json.dumps([digest, settings]).encode()).hexdigest()
+
+
+def _entry_path(kind, digest):
+    return os.path.join(RESULT_CACHE_ROOT, kind, digest)
+
+
+def _count(kind, outcome):
+    # Record a cache hit or miss for a kind (caller holds the lock)
+    counts = _stats.setdefault(kind, {'hits': 0, 'misses': 0})
+    counts[outcome] += 1
+
+
+def record_hit(kind):
+    with _cache_lock:
+        _count(kind, 'hits')
+
+
+def record_miss(kind):
+    with _cache_lock:
+        _count(kind, 'misses')
+
+
+def lookup(kind, digest):
+    # Check if the outputs of a pipeline kind are cached for the content hash and count the hit or miss
+    with _cache_lock:
+        found = digest is not None and os.path.isfile(os.path.join(_entry_path(kind, digest), RESULTS_FILE))
+        _count(kind, 'hits' if found else 'misses')
+    return found
+
+
+def _relative_files(folder):
+    # Paths of all files below the folder, relative to it
+    files = set()
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            files.add(os.path.relpath(os.path.join(dirpath, filename), folder))
+    return files
+
+
+def _copy_files(source, destination, files):
+    for name in files:
+        target = os.path.join(destination, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # fresh modification times, so the dataset cache never mistakes a restored file for an older one
+        shutil.copyfile(os.path.join(source, name), target)
+
+
+def _scan_entries():
+    # Every cached entry on disk as path -> [last used, size]
+    entries = {}
+    if not os.path.isdir(RESULT_CACHE_ROOT):
+        return entries
+    for kind in os.listdir(RESULT_CACHE_ROOT):
+        kind_root = os.path.join(RESULT_CACHE_ROOT, kind)
+        if not os.path.isdir(kind_root):
+            continue
+        for digest in os.listdir(kind_root):
+            # skip entries that are still being written or removed
+            if digest.endswith('.tmp'):
+                continue
+            entry = os.path.join(kind_root, digest)
+            entries[entry] = [os.path.getmtime(entry), folder_size(entry)]
+    return entries
+
+
+def _entries():
+    # The index of the cached entries, read from disk once, then kept up to date by the functions that add, use
+    # and remove entries, so storing one does not walk the whole cache (caller holds the lock)
+    global _index
+    if _index is None:
+        _index = _scan_entries()
+    return _index
+
+
+def _touch(entry):
+    # Mark an entry as just used (caller holds the lock)
+    now = time.time()
+    os.utime(entry, (now, now))
+    if entry in _entries():
+        _entries()[entry][0] = now
+
+
+def _discard(entry):
+    # Move an entry out of the cache, returns where it went so it can be deleted once the lock is released
+    # (caller holds the lock)
+    _entries().pop(entry, None)
+    if not os.path.isdir(entry):
+        return None
+    trash = f'{entry}.{uuid.uuid4().hex}.tmp'
+    os.replace(entry, trash)
+    return trash
+
+
+def _delete(folders):
+    for folder in folders:
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def _evict_entries(keep=None):
+    # Move the least recently used entries out of the cache until it fits its budget, except the pinned entries
+    # and the entry keep that was just stored. Returns the folders to delete once the lock is released
+    # (caller holds the lock)
+    entries = _entries()
+    total = sum(size for _, size in entries.values())
+    removed = []
+    for entry in sorted(entries, key=lambda entry: entries[entry][0]):
+        if total <= RESULT_CACHE_BYTES:
+            break
+        if entry == keep or entry in _pins:
+            continue
+        total -= entries[entry][1]
+        removed.append(_discard(entry))
+    return removed
+
+
+def _staging(entry):
+    # Folder a new entry is written into before it is moved in place
+    staging = f'{entry}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(staging)
+    return staging
+
+
+def _pin(entry):
+    # Keep an entry in the cache until release_stage (caller holds the lock)
+    _pins[entry] = _pins.get(entry, 0) + 1
+
+
+def release_stage(entry):
+    # Let the stage cache evict an entry stage_entry or store_stage(pin=True) returned, once it is no longer read
+    with _cache_lock:
+        _pins[entry] -= 1
+        if _pins[entry] == 0:
+            del _pins[entry]
+
+
+def _install(entry, staging, pin=False):
+    # Move a fully written staging folder in place of the entry and make room for it. The copying is done
+    # before, so the lock is only held for renames. An entry another job has pinned holds the same output,
+    # it is kept and the staging folder dropped
+    size = folder_size(staging)
+    with _cache_lock:
+        if entry in _pins:
+            removed = [staging]
+        else:
+            removed = [_discard(entry)]
+            os.replace(staging, entry)
+            _entries()[entry] = [time.time(), size]
+        if pin:
+            _pin(entry)
+        removed += _evict_entries(keep=entry)
+    _delete(removed)
+
+
+def store(kind, digest, folder, results):
+    # Copy everything in the folder, together with the job results, into the cache entry of the content hash
+    entry = _entry_path(kind, digest)
+    staging = _staging(entry)
+    try:
+        _copy_files(folder, staging, _relative_files(folder))
+        with open(os.path.join(staging, RESULTS_FILE), 'w') as f:
+            json.dump(results, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _install(entry, staging)
+
+
+def restore(kind, digest, folder, job_id=None):
+    # Copy the cached outputs of the content hash into the folder and report the cached results on the job.
+    # The files are copied aside and moved into the folder, with only the lookup done under the lock
+    set_stage(job_id, 'restore')
+    entry = _entry_path(kind, digest)
+    with _cache_lock:
+        if not os.path.isdir(entry):
+            raise RuntimeError('The cached result was removed, please process the data again')
+        _touch(entry)
+        # a hard link to every file keeps the content even if the entry is evicted while it is copied
+        copy = _staging(entry)
+        for name in _relative_files(entry):
+            os.makedirs(os.path.dirname(os.path.join(copy, name)), exist_ok=True)
+            os.link(os.path.join(entry, name), os.path.join(copy, name))
+    try:
+        with open(os.path.join(copy, RESULTS_FILE)) as f:
+            results = json.load(f)
+        _copy_files(copy, folder, _relative_files(copy) - {RESULTS_FILE})
+    finally:
+        shutil.rmtree(copy, ignore_errors=True)
+    for key, value in results.items():
+        if key == 'images':
+            for filename in value:
+                add_image(job_id, filename)
+        else:
+            set_result(job_id, key, value)
+
+
+def run_and_store(kind, digest, folder, target, *args, job_id=None):
+    # Run a pipeline job and cache what it wrote to the folder and the results it reported
+    target(*args, job_id=job_id)
+    job = get_job(job_id) if job_id is not None else None
+    store(kind, digest, folder, job['results'] if job is not None else {})
+
+
+def stage_entry(key):
+    # Folder of the cached output of a preprocessing stage, None (a miss) if it was not computed before.
+    # The entry is pinned so it is not evicted while it is read, release it with release_stage
+    entry = _entry_path('stages', key)
+    with _cache_lock:
+        found = os.path.isfile(os.path.join(entry, RESULTS_FILE))
+        _count('stages', 'hits' if found else 'misses')
+        if found:
+            _touch(entry)
+            _pin(entry)
+    return entry if found else None
+
+
+def read_stage_state(entry):
+    with open(os.path.join(entry, RESULTS_FILE)) as f:
+        return json.load(f)
+
+
+def store_stage(key, write, pin=False):
+    # Cache the output of a preprocessing stage: write(folder) writes its dataset into the folder and returns
+    # its state, a JSON-serializable dict. Returns the folder of the entry, pinned if pin like stage_entry does
+    entry = _entry_path('stages', key)
+    staging = _staging(entry)
+    try:
+        state = write(staging)
+        with open(os.path.join(staging, RESULTS_FILE), 'w') as f:
+            json.dump(state, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _install(entry, staging, pin)
+    return entry
+
+
+def get_cached_plot(key, image_path):
+    # Copy a cached plot to image_path. Returns False (a miss) if it has not been rendered before
+    entry = _entry_path('plots', key)
+    name = os.path.basename(image_path)
+    with _cache_lock:
+        found = os.path.isfile(os.path.join(entry, name))
+        _count('plots', 'hits' if found else 'misses')
+        if not found:
+            return False
+        _touch(entry)
+        # a hard link keeps the image even if the entry is evicted while it is copied
+        copy = _staging(entry)
+        os.link(os.path.join(entry, name), os.path.join(copy, name))
+    try:
+        _copy_files(copy, os.path.dirname(image_path), [name])
+    finally:
+        shutil.rmtree(copy, ignore_errors=True)
+    return True
+
+
+def store_plot(key, image_path):
+    # Keep a rendered plot under its cache key
+    entry = _entry_path('plots', key)
+    staging = _staging(entry)
+    _copy_files(os.path.dirname(image_path), staging, [os.path.basename(image_path)])
+    _install(entry, staging)
+
+
+def cache_stats():
+    # Hit rates per pipeline kind and the disk space used by the cached outputs
+    with _cache_lock:
+        entries = [tuple(value) for value in _entries().values()]
+        kinds = {kind: dict(counts) for kind, counts in _stats.items()}
+    for counts in kinds.values():
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_rate'] = round(counts['hits'] / lookups, 3) if lookups else None
+    return {
+        'kinds': kinds,
+        'entries': len(entries),
+        'bytes': sum(size for _, size in entries),
+        'limit_bytes': RESULT_CACHE_BYTES,
+        'oldest_entry_age': round(time.time() - min(used for used, _ in entries), 3) if entries else None,
+    }
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import threading
+
+# Column layouts of earlier uploads are registered here, one JSON file per fingerprint of the column names and dtypes
+SCHEMA_REGISTRY_ROOT = os.getenv('SCHEMA_REGISTRY_ROOT', os.path.join(os.getcwd(), 'src', 'schema_registry'))
+
+_registry_lock = threading.Lock()
+
+
+def schema_fingerprint(dtypes):
+    # SHA-256 of the column names and dtypes, in order
+    layout = [[str(column), str(dtype)] for column, dtype in dtypes.items()]
+    return hashlib.sha256(json.dumps(layout).encode()).hexdigest()
+
+
+def _schema_path(fingerprint):
+    return os.path.join(SCHEMA_REGISTRY_ROOT, f'{fingerprint}.json')
+
+
+def _read_schema(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_schema(fingerprint, dtypes):
+    # The schema registered for the fingerprint. For a layout never seen, the registered schema sharing the most
+    # columns with it (same name and dtype), so only the new or changed columns are inferred. None if there is none
+    schema = _read_schema(_schema_path(fingerprint))
+    if schema is not None or not os.path.isdir(SCHEMA_REGISTRY_ROOT):
+        return schema
+    layout = {str(column): str(dtype) for column, dtype in dtypes.items()}
+    best_shared = 0
+    for name in os.listdir(SCHEMA_REGISTRY_ROOT):
+        if not name.endswith('.json'):
+            continue
+        candidate = _read_schema(os.path.join(SCHEMA_REGISTRY_ROOT, name))
+        if candidate is None:
+            continue
+        shared = sum(layout.get(column) == dtype for column, dtype in candidate['columns'])
+        if shared > best_shared:
+            schema, best_shared = candidate, shared
+    return schema
+
+
+def known_columns(schema, stage, dtypes):
+    # Category and date format of the columns classified at this stage before, with the same name and dtype
+    if schema is None:
+        return {}
+    entries = schema.get(stage, {})
+    known = {}
+    for column, dtype in dtypes.items():
+        entry = entries.get(str(column))
+        if entry is not None and entry['dtype'] == str(dtype):
+            known[column] = (entry['category'], entry['date_format'])
+    return known
+
+
+def registered_drops(schema, fingerprint):
+    # Columns dropped for missing values from uploads of exactly this layout, None if it was never processed
+    if schema is None or schema['fingerprint'] != fingerprint:
+        return None
+    return schema.get('dropped_columns')
+
+
+def column_entries(column_types, dtypes):
+    # The classification of every column as it is registered
+    entries = {}
+    for key, category in [('datetime_columns', 'datetime'), ('numeric_columns', 'numeric'),
+                          ('categorical_columns', 'categorical'), ('id_columns', 'id')]:
+        for column in column_types[key]:
+            entries[str(column)] = {'dtype': str(dtypes[column]), 'category': category,
+                                    'date_format': column_types['date_formats'].get(column)}
+    return entries
+
+
+def save_schema(fingerprint, dtypes, **fields):
+    # Register what was inferred for the layout, merged into what is already registered for it
+    path = _schema_path(fingerprint)
+    with _registry_lock:
+        schema = _read_schema(path) or {
+            'fingerprint': fingerprint,
+            'columns': [[str(column), str(dtype)] for column, dtype in dtypes.items()]
+        }
+        schema.update(fields)
+        os.makedirs(SCHEMA_REGISTRY_ROOT, exist_ok=True)
+        staging = f'{path}.{threading.get_ident()}.tmp'
+        with open(staging, 'w') as f:
+            json.dump(schema, f)
+        os.replace(staging, path)
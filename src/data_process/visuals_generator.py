@@ -4,19 +4,37 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import io
 import base64
+import json
+import hashlib
 import numpy as np
 # for using Agg backend
 import matplotlib
 matplotlib.use('Agg')
+from src.data_process.jobs import set_stage, add_image
+from src.data_process.dataset_cache import get_dataset, get_numeric_columns
+from src.data_process.worker_pool import run_in_pool
+from src.data_process.result_cache import get_cached_plot, store_plot
+from src.data_process.dates import format_dates
+from src.data_process.profiler import read_profile
+
+# Resolution of the high resolution plots (correlation matrix, pie chart, box plot and line plot)
+PLOT_DPI = int(os.getenv('PLOT_DPI', 300))
+# Settings that change how a plot looks, part of the key cached plots are stored under
+PLOT_RENDER_OPTIONS = {'dpi': PLOT_DPI}
 
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-def save_plot(image, plot_type, x_axis=None, y_axis=None):
-    # Get the path to the 'processed' folder
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    processed_dir = os.path.join(current_dir, '..', 'visuals_processed', 'visual_images')
+# file name of a generated plot
+def plot_filename(plot_type, x_axis=None, y_axis=None):
+    if plot_type in ['correlation_matrix', 'pie_chart']:
+        return f"{plot_type}_{x_axis}.png" if x_axis else f"{plot_type}.png"
+    return f"{plot_type}_{x_axis}_{y_axis}.png"
+
+def save_plot(image, output_dir, plot_type, x_axis=None, y_axis=None):
+    # Get the path to the 'visual_images' folder of the processed folder
+    processed_dir = os.path.join(output_dir, 'visual_images')
     
     # Ensure the 'visual_images' directory exists in the 'processed' folder
     ensure_directory_exists(processed_dir)
@@ -25,15 +43,14 @@ def save_plot(image, plot_type, x_axis=None, y_axis=None):
     plot_type_dir = os.path.join(processed_dir, plot_type)
     ensure_directory_exists(plot_type_dir)''' 
     
-    if plot_type in ['correlation_matrix', 'pie_chart']:
-        filename = f"{plot_type}_{x_axis}.png" if x_axis else f"{plot_type}.png"
-    else:
-        filename = f"{plot_type}_{x_axis}_{y_axis}.png"
-        
+    filename = plot_filename(plot_type, x_axis, y_axis)
     filepath = os.path.join(processed_dir, filename)
     
-    with open(filepath, 'wb') as f:
+    # write next to the final file and move it in place so a half written plot is never served
+    temp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
         f.write(base64.b64decode(image.split(',')[1]))
+    os.replace(temp_path, filepath)
     
     print(f"Plot saved: {filepath}")
     
@@ -50,7 +67,7 @@ def generate_correlation_matrix(df):
     heatmap.set_yticklabels(heatmap.get_yticklabels(), fontsize=12)
     plt.title('Correlation Matrix', fontsize=25, pad=20)
     plt.tight_layout()
-    plt.savefig(img, format='png', dpi=300, bbox_inches='tight')
+    plt.savefig(img, format='png', dpi=PLOT_DPI, bbox_inches='tight')
     img.seek(0)
     plot_url = base64.b64encode(img.getvalue()).decode()
     plt.close()
@@ -94,7 +111,7 @@ def generate_pie_chart(df, x_axis):
     if show_numbers:
         plt.legend(value_counts.index, title=x_axis, loc="center", bbox_to_anchor=(1, 0, 0.5, 1))
     plt.title(f'{x_axis.capitalize()} Count Piechart', fontsize=30)
-    plt.savefig(img, format='png', bbox_inches='tight', dpi=300)
+    plt.savefig(img, format='png', bbox_inches='tight', dpi=PLOT_DPI)
     img.seek(0)
     plot_url = base64.b64encode(img.getvalue()).decode()
     plt.close()
@@ -128,7 +145,7 @@ def generate_box_plot(df, x_axis, y_axis):
     plt.title(f'Box Plot of {y_axis} by {x_axis}', fontsize=18, pad=20)
     sns.despine()
     plt.tight_layout()
-    plt.savefig(img, format='png', dpi=300, bbox_inches='tight')
+    plt.savefig(img, format='png', dpi=PLOT_DPI, bbox_inches='tight')
     img.seek(0)
     plot_url = base64.b64encode(img.getvalue()).decode()
     plt.close()
@@ -136,11 +153,14 @@ def generate_box_plot(df, x_axis, y_axis):
 
 # generates line plot
 def generate_line_plot(df, x_axis, y_axis):
-    df = process_x_axis(df, x_axis)
+    is_date_axis = pd.api.types.is_datetime64_any_dtype(df[x_axis])
+    if not is_date_axis:
+        df = process_x_axis(df, x_axis)
     img = io.BytesIO()
     plt.figure(figsize=(14, 7))
     sns.set_style("whitegrid")
-    if df[x_axis].dtype == 'datetime64[ns]':
+    if is_date_axis:
+        # a time axis keeps every date, averaged per date
         df = df.sort_values(x_axis)
     elif df[x_axis].dtype == 'object':
         try:
@@ -148,21 +168,21 @@ def generate_line_plot(df, x_axis, y_axis):
             df = df.sort_values(x_axis)
         except:
             df = df.sort_values(x_axis)
-    sns.lineplot(data=df, x=x_axis, y=y_axis, marker='o')
+    sns.lineplot(data=df, x=x_axis, y=y_axis, marker='o', errorbar=None if is_date_axis else ('ci', 95))
     plt.xticks(rotation=90, ha='right', fontsize=10)
     plt.xlabel(x_axis, fontsize=14, labelpad=10)
     plt.ylabel(y_axis, fontsize=14, labelpad=10)
     plt.title(f'Line Plot of {y_axis} over {x_axis}', fontsize=18, pad=20)
     sns.despine()
     plt.tight_layout()
-    plt.savefig(img, format='png', dpi=300, bbox_inches='tight')
+    plt.savefig(img, format='png', dpi=PLOT_DPI, bbox_inches='tight')
     img.seek(0)
     plot_url = base64.b64encode(img.getvalue()).decode()
     plt.close()
     return 'data:image/png;base64,{}'.format(plot_url)
 
-# generates histogram
-def generate_histogram(df, x_axis, y_axis):
+# generates histogram, the bins of a numeric x axis span the min and max from the dataset profile when given
+def generate_histogram(df, x_axis, y_axis, profile=None):
     df = process_x_axis(df, x_axis)
     img = io.BytesIO()
     plt.figure(figsize=(22, 15))
@@ -172,7 +192,11 @@ def generate_histogram(df, x_axis, y_axis):
         plt.bar(categories, bin_means, color='skyblue', edgecolor='black')
         plt.xticks(rotation=45, fontsize=14)
     else:
-        bins = np.linspace(df[x_axis].min(), df[x_axis].max(), 31)
+        stats = profile['columns'].get(x_axis, {}) if profile is not None else {}
+        if stats.get('min') is not None and stats.get('max') is not None:
+            bins = np.linspace(stats['min'], stats['max'], 31)
+        else:
+            bins = np.linspace(df[x_axis].min(), df[x_axis].max(), 31)
         bin_centers = 0.5 * (bins[:-1] + bins[1:])
         bin_means = np.zeros(len(bin_centers))
         for i in range(len(bins) - 1):
@@ -214,7 +238,10 @@ def generate_scatterplot(df, x_axis, y_axis):
     return 'data:image/png;base64,{}'.format(plot_url)
 
 # generates plot
-def generate_plot(df, plot_type, x_axis=None, y_axis=None):
+def generate_plot(df, output_dir, plot_type, x_axis=None, y_axis=None, profile=None):
+    # dates are categories of these plots, shown as text
+    if plot_type in ['pie_chart', 'box_plot', 'histogram'] and pd.api.types.is_datetime64_any_dtype(df[x_axis]):
+        df[x_axis] = format_dates(df[x_axis])
     if plot_type == 'correlation_matrix':
         image = generate_correlation_matrix(df)
     elif plot_type == 'pie_chart':
@@ -224,10 +251,56 @@ def generate_plot(df, plot_type, x_axis=None, y_axis=None):
     elif plot_type == 'line_plot':
         image = generate_line_plot(df, x_axis, y_axis)
     elif plot_type == 'histogram':
-        image = generate_histogram(df, x_axis, y_axis)
+        image = generate_histogram(df, x_axis, y_axis, profile)
     elif plot_type == 'scatterplot':
         image = generate_scatterplot(df, x_axis, y_axis)
     else:
         raise ValueError(f"Unsupported plot type: {plot_type}")
     
-    save_plot(image, plot_type, x_axis, y_axis)
+    save_plot(image, output_dir, plot_type, x_axis, y_axis)
+
+# columns a plot needs from the dataset at path
+def plot_columns(path, plot_type, x_axis=None, y_axis=None):
+    if plot_type == 'correlation_matrix':
+        return get_numeric_columns(path)
+    if plot_type == 'pie_chart':
+        return [x_axis]
+    return list(dict.fromkeys([x_axis, y_axis]))
+
+# key a plot is cached under: the content hash of the uploaded dataset, the preprocessing code version and settings
+# it was processed with, the plot and the render options
+def plot_cache_key(digest, plot_type, x_axis=None, y_axis=None, settings=None):
+    if digest is None:
+        return None
+    key = json.dumps([digest, settings, plot_type, x_axis, y_axis, PLOT_RENDER_OPTIONS])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+# puts an already rendered plot into the output folder, from the folder itself or from the plot cache.
+# Returns the file name of the plot, or None if it still has to be rendered
+def find_plot(output_dir, plot_type, x_axis=None, y_axis=None, cache_key=None):
+    filename = plot_filename(plot_type, x_axis, y_axis)
+    image_path = os.path.join(output_dir, 'visual_images', filename)
+    if os.path.exists(image_path) or (cache_key is not None and get_cached_plot(cache_key, image_path)):
+        return filename
+    return None
+
+# renders a plot in a worker process, reading only the columns it needs from the memory-mapped dataset.
+# Each worker keeps the columns it read in its own dataset cache for the next charts
+def render_plot_in_worker(output_dir, columns, plot_type, x_axis=None, y_axis=None):
+    df = get_dataset(os.path.join(output_dir, 'output.feather'), columns)
+    generate_plot(df, output_dir, plot_type, x_axis, y_axis, read_profile(output_dir))
+
+# renders a plot of the processed dataset in the output folder as a background job, in the plot process pool
+def render_plot(output_dir, plot_type, x_axis=None, y_axis=None, cache_key=None, job_id=None):
+    set_stage(job_id, 'render')
+    filename = plot_filename(plot_type, x_axis, y_axis)
+    image_path = os.path.join(output_dir, 'visual_images', filename)
+    # the plot cache was checked when the job was started, only look for a render that finished since
+    if not os.path.exists(image_path):
+        path = os.path.join(output_dir, 'output.feather')
+        # the same chart requested again while it renders waits for that render
+        run_in_pool('plots', image_path, render_plot_in_worker,
+                    output_dir, plot_columns(path, plot_type, x_axis, y_axis), plot_type, x_axis, y_axis)
+        if cache_key is not None:
+            store_plot(cache_key, image_path)
+    add_image(job_id, filename)
@@ -0,0 +1,150 @@
+import os
+import sys
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.data_process.jobs import raise_if_cancelled
+
+
+
+def available_cpus():
+    # CPUs this process may use: the affinity mask, limited by a cgroup CPU quota (containers)
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.floor(quota)))
+    return cpus
+
+
+# Number of worker processes shared by every job that runs work in parallel
+PROCESS_POOL_WORKERS = int(os.getenv('PROCESS_POOL_WORKERS', available_cpus()))
+# Inputs with fewer rows than this are processed in the calling thread, process round trips would dominate
+IN_PROCESS_MAX_ROWS = int(os.getenv('IN_PROCESS_MAX_ROWS', 250_000))
+# The same for the rows of the transform stage, without a limit by default: writing the date columns for the workers
+# takes longer than parsing them in place, whatever the number of rows (scripts/benchmark_chunk_processing.py)
+TRANSFORM_IN_PROCESS_MAX_ROWS = int(os.getenv('TRANSFORM_IN_PROCESS_MAX_ROWS', sys.maxsize))
+# Data handed to a worker in one piece. Every chunk parses the dates repeated in the others again, so few large
+# chunks are faster than more small ones
+CHUNK_TARGET_BYTES = int(os.getenv('CHUNK_TARGET_BYTES', 256 * 1024 ** 2))
+# Worker processes that render plots, kept apart so chart requests never wait behind preprocessing chunks
+PLOT_POOL_WORKERS = int(os.getenv('PLOT_POOL_WORKERS', 2))
+
+POOL_SIZES = {'default': PROCESS_POOL_WORKERS, 'plots': PLOT_POOL_WORKERS}
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+# Work submitted through run_in_pool that has not finished yet, as (pool name, key) -> Future
+_running = {}
+_running_lock = threading.Lock()
+
+
+def get_process_pool(name='default'):
+    # Return the long-lived process pool, creating it on first use
+    with _pool_lock:
+        if name not in _pools:
+            _pools[name] = ProcessPoolExecutor(max_workers=POOL_SIZES[name])
+        return _pools[name]
+
+
+def shutdown_process_pool(name='default'):
+    # Stop the worker processes so the next job starts a fresh pool
+    with _pool_lock:
+        pool = _pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def map_in_pool(func, items, *args, job_id=None):
+    # Run func(item, *args) for every item in the shared pool and return the results in order.
+    # Pending work is cancelled if one item fails or the job is cancelled
+    futures = [get_process_pool().submit(func, item, *args) for item in items]
+    try:
+        results = []
+        for future in futures:
+            results.append(future.result())
+            raise_if_cancelled(job_id)
+        return results
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory), later jobs get a new pool
+        shutdown_process_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def estimate_row_bytes(df, sample_rows=1000):
+    # Average in-memory size of a row, measured on the first rows so long text columns are counted
+    sample = df.head(sample_rows)
+    if len(sample) == 0:
+        return 0
+    return int(sample.memory_usage(deep=True, index=False).sum() / len(sample))
+
+
+def plan_chunks(n_rows, row_bytes, in_process_max_rows=None):
+    # Decide how to split work over n_rows rows: in the calling thread for inputs with fewer rows than
+    # in_process_max_rows (IN_PROCESS_MAX_ROWS by default) or a single CPU, otherwise chunks of about
+    # CHUNK_TARGET_BYTES, at least one per worker so every worker is busy
+    if in_process_max_rows is None:
+        in_process_max_rows = IN_PROCESS_MAX_ROWS
+    plan = {'rows': n_rows, 'row_bytes': row_bytes, 'cpus': available_cpus(), 'pool_workers': PROCESS_POOL_WORKERS}
+    if PROCESS_POOL_WORKERS < 2 or n_rows < in_process_max_rows:
+        plan.update(mode='in_process', workers=1, chunks=1, chunk_rows=n_rows)
+        return plan
+    chunks = max(PROCESS_POOL_WORKERS, math.ceil(n_rows * row_bytes / CHUNK_TARGET_BYTES))
+    plan.update(mode='pool', workers=min(PROCESS_POOL_WORKERS, chunks), chunks=chunks,
+                chunk_rows=math.ceil(n_rows / chunks))
+    return plan
+
+
+def map_rows_in_pool(func, path, n_rows, chunk_rows, *args, job_id=None):
+    # Split the rows of the Arrow file at path into ranges of chunk_rows and run func((start, stop), path, *args)
+    # for each in the shared pool. Workers memory-map the file, so the rows are never pickled
+    ranges = [(start, min(start + chunk_rows, n_rows)) for start in range(0, n_rows, chunk_rows)]
+    return map_in_pool(func, ranges, path, *args, job_id=job_id)
+
+
+def run_in_pool(name, key, func, *args):
+    # Run func(*args) in the named pool and wait for its result.
+    # Calls with the same key while the first one is still running wait for that one instead of repeating it
+    with _running_lock:
+        future = _running.get((name, key))
+        submitted = future is None
+        if submitted:
+            future = get_process_pool(name).submit(func, *args)
+            _running[(name, key)] = future
+    if submitted:
+        future.add_done_callback(lambda done: _forget(name, key, done))
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        shutdown_process_pool(name)
+        raise
+
+
+def _forget(name, key, future):
+    with _running_lock:
+        if _running.get((name, key)) is future:
+            del _running[(name, key)]
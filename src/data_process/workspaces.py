@@ -0,0 +1,90 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from src.data_process.dataset_cache import evict_folder
+
+# Folders created inside every workspace
+WORKSPACE_FOLDERS = ['visuals_upload', 'visuals_processed', 'insights_upload', 'insights_processed']
+
+
+def new_workspace_id():
+    return uuid.uuid4().hex
+
+
+def get_workspace(root, workspace_id):
+    # Create the workspace folders if needed, mark the workspace as used and return its paths
+    workspace_root = os.path.join(root, workspace_id)
+    workspace = {'id': workspace_id, 'root': workspace_root}
+    for folder in WORKSPACE_FOLDERS:
+        workspace[folder] = os.path.join(workspace_root, folder)
+        os.makedirs(workspace[folder], exist_ok=True)
+    os.utime(workspace_root)
+    return workspace
+
+
+def delete_files_in_folder(folder):
+    # Delete everything inside the folder but keep the folder itself
+    for filename in os.listdir(folder):
+        file_path = os.path.join(folder, filename)
+        try:
+            if os.path.isfile(file_path) or os.path.islink(file_path):
+                os.unlink(file_path)
+            elif os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+        except Exception as e:
+            print(f'Failed to delete {file_path}. Reason: {e}')
+
+
+def folder_size(folder):
+    # Total size in bytes of all files below the folder
+    total = 0
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def within_quota(workspace, incoming_bytes, quota_bytes, replaced_folders=()):
+    # Check if the workspace can take the incoming bytes once the replaced folders are cleared
+    used = folder_size(workspace['root']) - sum(folder_size(workspace[folder]) for folder in replaced_folders)
+    return used + (incoming_bytes or 0) <= quota_bytes
+
+
+def collect_stale_workspaces(root, max_age_seconds, active_workspaces=()):
+    # Remove workspaces that have not been used for max_age_seconds and have no running job
+    if not os.path.isdir(root):
+        return []
+    removed = []
+    now = time.time()
+    for workspace_id in os.listdir(root):
+        workspace_root = os.path.join(root, workspace_id)
+        if workspace_id in active_workspaces or not os.path.isdir(workspace_root):
+            continue
+        try:
+            if now - os.path.getmtime(workspace_root) > max_age_seconds:
+                shutil.rmtree(workspace_root)
+                removed.append(workspace_id)
+        except OSError as e:
+            print(f'Failed to remove workspace {workspace_id}. Reason: {e}')
+    return removed
+
+
+def start_workspace_gc(root, max_age_seconds, interval_seconds, active_workspaces):
+    # Periodically remove stale workspaces in a daemon thread
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            removed = collect_stale_workspaces(root, max_age_seconds, active_workspaces())
+            for workspace_id in removed:
+                evict_folder(os.path.join(root, workspace_id))
+            if removed:
+                print(f'Removed {len(removed)} stale workspaces')
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
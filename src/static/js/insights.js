@@ -45,8 +45,7 @@ function fetchProcessedData() {
     .then(data => {
         if (data.success) {
             hideMessages();
-            showBeforeReport(data.before_report);
-            pollForCompletion();
+            listenForCompletion(data.job_id);
         } else {
             showErrorMessage(data.error);
         }
@@ -56,42 +55,47 @@ function fetchProcessedData() {
     });
 }
 
-function pollForCompletion() {
+function listenForCompletion(jobId) {
     showSuccessMessage('Processing data... This may take a few minutes.');
-    const pollInterval = setInterval(() => {
-        fetch('/api/check_processing_insight')
-        .then(response => response.json())
-        .then(data => {
-            if (data.success && data.completed) {
-                clearInterval(pollInterval);
-                hideMessages();
-                showAfterReport(data.after_report);
-                checkReportGeneration();
-            }
-        })
-        .catch(error => {
-            clearInterval(pollInterval);
+    const events = new EventSource(`/api/jobs/${jobId}/events`);
+    events.addEventListener('queued', e => {
+        const data = JSON.parse(e.data);
+        showSuccessMessage(`Waiting for a free worker (position ${data.queue_position} in the queue)...`);
+    });
+    events.addEventListener('stage', e => {
+        const data = JSON.parse(e.data);
+        showSuccessMessage(`Processing data (${data.stage})... This may take a few minutes.`);
+    });
+    events.addEventListener('result', e => {
+        const data = JSON.parse(e.data);
+        if (data.key === 'before_report') {
+            showBeforeReport(data.value);
+        } else if (data.key === 'after_report') {
+            showAfterReport(data.value);
+        }
+    });
+    events.addEventListener('completed', () => {
+        events.close();
+        hideMessages();
+        showGenerateReportButton();
+        showChatbox();
+    });
+    events.addEventListener('failed', e => {
+        events.close();
+        document.getElementById('loader').style.display = 'none';
+        showErrorMessage(JSON.parse(e.data).error);
+    });
+    events.addEventListener('cancelled', () => {
+        events.close();
+        document.getElementById('loader').style.display = 'none';
+        showErrorMessage('Processing was cancelled.');
+    });
+    events.onerror = () => {
+        // the browser reconnects on its own unless the stream could not be opened at all
+        if (events.readyState === EventSource.CLOSED) {
             showErrorMessage('An error occurred while checking processing status.');
-        });
-    }, 2000);  // Check every 2 seconds
-}
-
-function checkReportGeneration() {
-    const checkInterval = setInterval(() => {
-        fetch('/api/check_report_insight')
-        .then(response => response.json())
-        .then(data => {
-            if (data.success && data.completed) {
-                clearInterval(checkInterval);
-                showGenerateReportButton();
-                showChatbox();
-            }
-        })
-        .catch(error => {
-            clearInterval(checkInterval);
-            showErrorMessage('An error occurred while checking report generation status.');
-        });
-    }, 2000);  // Check every 2 seconds
+        }
+    };
 }
 
 function showBeforeReport(reportData) {
@@ -45,8 +45,7 @@ function fetchProcessedData() {
         .then(data => {
             if (data.success) {
                 hideMessages();
-                showBeforeReport(data.before_report);
-                pollForCompletion();
+                listenForCompletion(data.job_id);
             } else {
                 showErrorMessage(data.error);
             }
@@ -56,24 +55,45 @@ function fetchProcessedData() {
         });
 }
 
-function pollForCompletion() {
+function listenForCompletion(jobId) {
     showSuccessMessage('Processing data... This may take a few minutes.');
-    const pollInterval = setInterval(() => {
-        fetch('/api/check_processing')
-            .then(response => response.json())
-            .then(data => {
-                if (data.success && data.completed) {
-                    clearInterval(pollInterval);
-                    hideMessages();
-                    showAfterReport(data.after_report, data.before_report );
-                    showVisualizationOptions();
-                }
-            })
-            .catch(error => {
-                clearInterval(pollInterval);
-                showErrorMessage('An error occurred while checking processing status.');
-            });
-    }, 2000);  // Check every 2 seconds
+    const events = new EventSource(`/api/jobs/${jobId}/events`);
+    events.addEventListener('queued', e => {
+        const data = JSON.parse(e.data);
+        showSuccessMessage(`Waiting for a free worker (position ${data.queue_position} in the queue)...`);
+    });
+    events.addEventListener('stage', e => {
+        const data = JSON.parse(e.data);
+        showSuccessMessage(`Processing data (${data.stage})... This may take a few minutes.`);
+    });
+    events.addEventListener('result', e => {
+        const data = JSON.parse(e.data);
+        if (data.key === 'before_report') {
+            showBeforeReport(data.value);
+        } else if (data.key === 'after_report') {
+            hideMessages();
+            showAfterReport(data.value);
+        }
+    });
+    events.addEventListener('completed', () => {
+        events.close();
+        hideMessages();
+        showVisualizationOptions();
+    });
+    events.addEventListener('failed', e => {
+        events.close();
+        showErrorMessage(JSON.parse(e.data).error);
+    });
+    events.addEventListener('cancelled', () => {
+        events.close();
+        showErrorMessage('Processing was cancelled.');
+    });
+    events.onerror = () => {
+        // the browser reconnects on its own unless the stream could not be opened at all
+        if (events.readyState === EventSource.CLOSED) {
+            showErrorMessage('An error occurred while checking processing status.');
+        }
+    };
 }
 
 function showBeforeReport(reportData) {
@@ -155,9 +175,13 @@ visualizationFormSubmit.addEventListener('submit', function (e) {
             .then(response => response.json())
             .then(data => {
                 console.log('API Response:', data);
-                if (data.success) {
+                if (data.success && data.image_url) {
+                    // rendered before, no job needed
+                    hideMessages();
+                    displayVisualization(data.image_url);
+                } else if (data.success) {
                     showSuccessMessage('Generating visualization...');
-                    checkVisualization(formData.get('plot-type'), formData.get('x-axis'), formData.get('y-axis'));
+                    waitForVisualization(data.job_id);
                 } else {
                     showErrorMessage(data.error);
                 }
@@ -174,24 +198,22 @@ visualizationFormSubmit.addEventListener('submit', function (e) {
 
 });
 
-function checkVisualization(plotType, xAxis, yAxis) {
-    console.log('Checking visualization:', plotType, xAxis, yAxis);
-    const checkInterval = setInterval(() => {
-        fetch(`/api/check_visualization?plot_type=${plotType}&x_axis=${xAxis}&y_axis=${yAxis}`)
-            .then(response => response.json())
-            .then(data => {
-                console.log('Check Response:', data);
-                if (data.success) {
-                    clearInterval(checkInterval);
-                    displayVisualization(data.image_url);
-                }
-            })
-            .catch(error => {
-                console.error('Check Error:', error);
-                clearInterval(checkInterval);
-                showErrorMessage('An error occurred while checking for the visualization.');
-            });
-    }, 2000);  // Check every 2 seconds
+function waitForVisualization(jobId) {
+    const events = new EventSource(`/api/jobs/${jobId}/events`);
+    events.addEventListener('image', e => {
+        hideMessages();
+        displayVisualization(JSON.parse(e.data).url);
+    });
+    events.addEventListener('completed', () => events.close());
+    events.addEventListener('failed', e => {
+        events.close();
+        showErrorMessage(JSON.parse(e.data).error);
+    });
+    events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED) {
+            showErrorMessage('An error occurred while checking for the visualization.');
+        }
+    };
 }
 
 function displayVisualization(imageUrl) {
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+
+# run from the repository root: python -m pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the layouts classified and the stages cached by the tests are not mixed with the ones of the app
+os.environ.setdefault('SCHEMA_REGISTRY_ROOT', tempfile.mkdtemp(prefix='schema_registry_'))
+os.environ.setdefault('RESULT_CACHE_ROOT', tempfile.mkdtemp(prefix='result_cache_'))
+
+# Rows of the generated statement, and the format of its dates
+ROWS = 300
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+
+def statement_frame(rows=ROWS, seed=0):
+    # A small loan statement: numeric columns with missing values and outliers, a sparse column that is dropped,
+    # a row without an agreement signing date and a duplicate row
+    rng = np.random.default_rng(seed)
+    signed = pd.Timestamp('1990-01-01') + pd.to_timedelta(rng.integers(0, 9000, rows), unit='D')
+    df = pd.DataFrame({
+        'End of Period': (signed + pd.to_timedelta(rng.integers(100, 5000, rows), unit='D')).strftime(DATE_FORMAT),
+        'Loan Number': [f'IBRD{i:05d}' for i in range(rows)],
+        'Region': rng.choice(['AFRICA', 'EAST ASIA AND PACIFIC', 'SOUTH ASIA', 'LATIN AMERICA'], rows),
+        'Loan Status': rng.choice(['Repaid', 'Disbursed', 'Cancelled', None], rows),
+        'Interest Rate': np.where(rng.random(rows) < 0.1, np.nan, np.round(rng.gamma(2, 2, rows), 2)),
+        'Currency of Commitment': np.where(rng.random(rows) < 0.8, None, 'USD'),
+        'Original Principal Amount': np.round(rng.lognormal(16, 1.5, rows), 2),
+        'Disbursed Amount': np.where(rng.random(rows) < 0.05, np.nan, np.round(rng.lognormal(15, 2, rows), 2)),
+        'Agreement Signing Date': signed.strftime(DATE_FORMAT),
+    })
+    df.loc[7, 'Agreement Signing Date'] = None
+    df.loc[rows - 1] = df.loc[0]
+    return df
+
+
+def write_statement(path, rows=ROWS, seed=0):
+    # Write a generated statement to a CSV, returns its path
+    statement_frame(rows, seed).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def upload(tmp_path_factory):
+    return write_statement(tmp_path_factory.mktemp('upload') / 'statement.csv')
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # A test client of the app, the workspaces of its sessions are created under tmp_path
+    from app import app
+    monkeypatch.setitem(app.config, 'WORKSPACE_ROOT', str(tmp_path / 'workspaces'))
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    return app.test_client()
@@ -0,0 +1,73 @@
+import shutil
+import threading
+import pandas as pd
+import pytest
+from conftest import ROWS, statement_frame
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process.columnar_store import write_dataset, read_dataset, append_rows
+from src.data_process.incremental import load_append_model
+
+
+def test_append_rows_matches_columns_by_name(tmp_path):
+    path = str(tmp_path / 'output.feather')
+    write_dataset(pd.DataFrame({'a': [1.0, 2.0], 'b': ['x', 'y']}), path)
+    append_rows(path, pd.DataFrame({'b': ['z'], 'a': [3.0]}))
+    df = read_dataset(path)
+    assert list(df.columns) == ['b', 'a']
+    assert df['a'].tolist() == [1.0, 2.0, 3.0] and df['b'].tolist() == ['x', 'y', 'z']
+
+    with pytest.raises(ValueError, match='do not have the columns'):
+        append_rows(path, pd.DataFrame({'a': [4.0], 'c': ['w']}))
+    assert len(read_dataset(path)) == 3
+
+
+@pytest.fixture
+def processed(tmp_path, monkeypatch):
+    # The first 200 rows of a statement processed into tmp_path, and the rest of the statement
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+    statement = statement_frame()
+    upload_path = str(tmp_path / 'statement.csv')
+    statement[:200].to_csv(upload_path, index=False)
+    output_path = str(tmp_path / 'output.feather')
+    preprocessor.process_csv(upload_path, output_path)
+    return statement, upload_path, output_path
+
+
+def append(statement, path, output_path, upload_path):
+    statement.to_csv(path, index=False)
+    preprocessor.append_csv(str(path), output_path, upload_path)
+
+
+def test_rows_appended_before_are_skipped(processed, tmp_path):
+    statement, upload_path, output_path = processed
+    # the whole grown statement, then the same rows again
+    append(statement, tmp_path / 'rows.append', output_path, upload_path)
+    merged = read_dataset(output_path)
+    shutil.copyfile(output_path, tmp_path / 'merged.feather')
+    append(statement[150:], tmp_path / 'rows.append', output_path, upload_path)
+
+    # the row without an agreement signing date and the duplicate of the first row are dropped
+    assert len(merged) == ROWS - 2
+    pd.testing.assert_frame_equal(read_dataset(output_path), merged)
+    # the upload holds every row once
+    assert len(pd.read_csv(upload_path)) == ROWS - 1
+    state, arrays = load_append_model(str(tmp_path))
+    assert state['appends'] == 1
+    assert len(arrays['row_hashes']) == ROWS - 1
+
+
+def test_appends_to_the_same_dataset_run_one_at_a_time(processed, tmp_path):
+    statement, upload_path, output_path = processed
+    appends = [threading.Thread(target=append, args=(statement[start:stop], tmp_path / f'{start}-{stop}.append',
+                                                     output_path, upload_path))
+               for start, stop in [(200, 250), (250, ROWS), (200, ROWS)]]
+    for thread in appends:
+        thread.start()
+    for thread in appends:
+        thread.join()
+
+    df = read_dataset(output_path)
+    assert len(df) == ROWS - 2
+    assert not df.duplicated().any()
+    assert load_append_model(str(tmp_path))[0]['appends'] == 2
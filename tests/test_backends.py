@@ -0,0 +1,55 @@
+import os
+import sys
+import subprocess
+import pandas as pd
+import pytest
+from conftest import ROWS
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process.backends import get_backend, BACKEND_MODULES
+from src.data_process.columnar_store import read_dataset
+from src.data_process.incremental import APPEND_MODEL_FILE
+from src.data_process.profiler import PROFILE_FILE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_get_backend_rejects_unknown_backend():
+    with pytest.raises(ValueError, match='Unknown preprocessing backend'):
+        get_backend('spark')
+
+
+def test_pandas_backend_processes_csv(upload, tmp_path, monkeypatch):
+    backend = get_backend('pandas')
+    assert backend.__name__ == BACKEND_MODULES['pandas']
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+    output_path = tmp_path / 'output.feather'
+    preprocessor.process_csv(upload, str(output_path))
+
+    df = read_dataset(str(output_path))
+    # the row missing its agreement signing date and the duplicate row are dropped, and the sparse column
+    assert len(df) == ROWS - 2
+    assert 'currency of commitment' not in df.columns
+    assert list(df.columns[:3]) == ['loan duration (days)', 'loan duration (months)', 'loan duration (years)']
+    assert pd.api.types.is_datetime64_any_dtype(df['agreement signing date'])
+    assert not df[['interest rate', 'disbursed amount', 'loan status']].isna().any().any()
+    assert isinstance(df['region'].dtype, pd.CategoricalDtype)
+    for name in ['before.txt', 'after.txt', PROFILE_FILE, APPEND_MODEL_FILE]:
+        assert (tmp_path / name).exists(), name
+    assert 'Outlier Capping Information' in (tmp_path / 'after.txt').read_text()
+
+
+def test_pandas_backend_imports_no_other_backend(upload, tmp_path):
+    # Importing the backends and preprocessing an upload with pandas leaves polars and RAPIDS unimported
+    script = (
+        "import sys\n"
+        "import src.data_process.backends\n"
+        "from src.data_process.data_preprocessor_for_visualisation import process_csv\n"
+        "process_csv(sys.argv[1], sys.argv[2])\n"
+        "print(sorted({'polars', 'cudf'} & set(sys.modules)))\n")
+    env = dict(os.environ, PREPROCESS_BACKEND='pandas', SCHEMA_REGISTRY_ROOT=str(tmp_path / 'schemas'),
+               RESULT_CACHE_ROOT=str(tmp_path / 'cache'))
+    result = subprocess.run([sys.executable, '-c', script, upload, str(tmp_path / 'output.feather')], cwd=ROOT,
+                            env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == '[]'
+
@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import pandas as pd
+
+from src.data_process import dataset_cache
+from src.data_process.columnar_store import write_dataset
+from src.data_process.dataset_cache import get_dataset, evict_folder
+
+
+def cached_columns(path):
+    return [column for cached_path, column in dataset_cache._columns if cached_path == path]
+
+
+def test_least_recently_used_columns_are_evicted(tmp_path, monkeypatch):
+    path = str(tmp_path / 'output.feather')
+    write_dataset(pd.DataFrame({name: np.arange(1000, dtype='float64') for name in 'abc'}), path)
+    # room for two of the 8000 byte columns
+    monkeypatch.setattr(dataset_cache, 'DATASET_CACHE_BYTES', 20000)
+
+    get_dataset(path, ['a', 'b'])
+    get_dataset(path, ['a'])
+    df = get_dataset(path, ['c'])
+    assert cached_columns(path) == ['a', 'c']
+    assert dataset_cache._cache_bytes == 16000
+    np.testing.assert_array_equal(df['c'], np.arange(1000))
+
+    evict_folder(str(tmp_path))
+    assert cached_columns(path) == []
+    assert dataset_cache._cache_bytes == 0
+
+
+def test_columns_are_read_again_when_the_dataset_changes(tmp_path):
+    path = str(tmp_path / 'output.feather')
+    write_dataset(pd.DataFrame({'a': [1.0, 2.0]}), path)
+    assert get_dataset(path)['a'].tolist() == [1.0, 2.0]
+    write_dataset(pd.DataFrame({'a': [3.0, 4.0, 5.0]}), path)
+    # a rewrite within the resolution of the file system clock still changes the modification time
+    os.utime(path, (0, 0))
+    assert get_dataset(path)['a'].tolist() == [3.0, 4.0, 5.0]
+    evict_folder(str(tmp_path))
@@ -0,0 +1,125 @@
+import os
+import pandas as pd
+import pytest
+
+from src.data_process import data_preprocessor_for_insights as insights_preprocessor
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process import insight_generator_complete as generator
+from src.data_process import result_cache
+from src.data_process.columnar_store import read_dataset
+from src.data_process.jobs import create_job, get_job, add_image, INSIGHT_STAGES
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # aio_insights on an empty stage cache, with models and a report generator that record their calls and can be
+    # made to fail. Returns a function running a job in a new output folder, and the calls
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_ROOT', str(tmp_path / 'cache'))
+    monkeypatch.setattr(result_cache, '_index', None)
+    calls = {'insights': [], 'report': [], 'fail': None}
+
+    def generate_insights(df, output_path, job_id=None):
+        if calls['fail'] == 'insights':
+            raise RuntimeError('The process died')
+        calls['insights'].append(df.shape)
+        with open(os.path.join(output_path, 'plot.png'), 'wb') as f:
+            f.write(b'png')
+        add_image(job_id, 'plot.png')
+        return f'{df.shape[0]} rows'
+
+    def generate_financial_analysis(raw_report, path):
+        calls['report'].append(raw_report)
+        return None if calls['fail'] == 'report' else f'report of {raw_report}'
+
+    monkeypatch.setattr(generator, 'generate_insights', generate_insights)
+    monkeypatch.setattr(generator, 'generate_financial_analysis', generate_financial_analysis)
+
+    def run(upload, name, resume=True):
+        output = tmp_path / name
+        output.mkdir()
+        job_id = create_job('insights', INSIGHT_STAGES)
+        try:
+            generator.aio_insights(upload, str(output), job_id=job_id, resume=resume)
+        except RuntimeError:
+            pass
+        return get_job(job_id), output
+    return run, calls
+
+
+@pytest.mark.parametrize('one_hot_format', ['uint8', 'sparse'])
+def test_encoded_checkpoint_is_the_encoded_dataset(pipeline, upload, tmp_path, monkeypatch, one_hot_format):
+    monkeypatch.setattr(insights_preprocessor, 'ONE_HOT_FORMAT', one_hot_format)
+    data_path, state, key = preprocessor.cleaned_dataset(upload, str(tmp_path))
+    try:
+        df = read_dataset(data_path)
+    finally:
+        result_cache.release_stage(os.path.dirname(data_path))
+    job_ids = [create_job('insights', INSIGHT_STAGES) for _ in range(2)]
+    encoded = [insights_preprocessor.encoded_dataset(df, state, key, job_id) for job_id in job_ids]
+    assert [get_job(job_id)['metrics']['encode_checkpoint'] for job_id in job_ids] == ['saved', 'resumed']
+    assert encoded[0][1] == encoded[1][1]
+    pd.testing.assert_frame_equal(encoded[1][0], encoded[0][0], check_exact=True)
+    expected = insights_preprocessor.encode_categorical_columns(df, state['column_types']['categorical_columns'])
+    pd.testing.assert_frame_equal(encoded[0][0], expected, check_exact=True)
+
+
+def test_job_resumes_after_the_insights(pipeline, upload):
+    run, calls = pipeline
+    calls['fail'] = 'report'
+    failed, _ = run(upload, 'failed')
+    assert 'insight_report' not in failed['results']
+    assert failed['metrics']['completed_stages'] == []
+
+    calls['fail'] = None
+    resumed, output = run(upload, 'resumed')
+    assert resumed['metrics']['completed_stages'] == ['cleaned', 'encoded', 'insights']
+    assert resumed['metrics']['insights_checkpoint'] == 'resumed'
+    # the dataset was neither cleaned, read nor encoded again, only the report was generated
+    assert 'stage_cache' not in resumed['metrics'] and 'encode_checkpoint' not in resumed['metrics']
+    assert len(calls['insights']) == 1
+    assert resumed['results']['insight_report'] == f'report of {calls["report"][0]}'
+    assert resumed['results']['after_report'] == failed['results']['after_report']
+    assert sorted(os.listdir(output)) == ['after.txt', 'before.txt', 'plot.png']
+    assert result_cache._pins == {}
+
+
+def test_job_resumes_after_the_encoding(pipeline, upload):
+    run, calls = pipeline
+    calls['fail'] = 'insights'
+    run(upload, 'failed')
+
+    calls['fail'] = None
+    resumed, _ = run(upload, 'resumed')
+    assert resumed['metrics']['completed_stages'] == ['cleaned', 'encoded']
+    assert resumed['metrics']['stage_cache'] == {'reused': 'cleaned', 'run': []}
+    assert resumed['metrics']['encode_checkpoint'] == 'resumed'
+    assert resumed['metrics']['insights_checkpoint'] == 'saved'
+    assert resumed['results']['insight_report'] == f'report of {calls["report"][0]}'
+
+
+def test_job_without_resume_runs_every_stage(pipeline, upload):
+    run, calls = pipeline
+    run(upload, 'first')
+    rerun, _ = run(upload, 'rerun', resume=False)
+    assert rerun['metrics']['completed_stages'] == []
+    assert rerun['metrics']['stage_cache'] == {'reused': None, 'run': ['rows', 'cleaned']}
+    assert rerun['metrics']['encode_checkpoint'] == 'saved'
+    assert rerun['metrics']['insights_checkpoint'] == 'saved'
+    assert len(calls['insights']) == 2
+
+
+def test_resume_0_reruns_cached_insights(client, upload, monkeypatch):
+    import app as app_module
+    submitted = []
+    monkeypatch.setattr(app_module, 'submit_job', lambda job_id, target, *args: submitted.append((target, args)) or 0)
+    monkeypatch.setattr(app_module, 'lookup', lambda kind, key: True)
+    with open(upload, 'rb') as f:
+        data = {'file': (f, 'statement.csv')}
+        assert client.post('/api/upload_insight', data=data, content_type='multipart/form-data').get_json()['success']
+
+    assert client.get('/api/process_data_insight').get_json()['cached']
+    assert client.get('/api/process_data_insight?resume=0').get_json()['success']
+    (restored, _), (rerun, args) = submitted
+    assert restored is app_module.restore
+    assert rerun is app_module.run_and_store and args[3].keywords == {'resume': False}
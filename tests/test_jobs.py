@@ -0,0 +1,116 @@
+import threading
+import time
+import pytest
+
+from src.data_process import jobs
+from src.data_process.jobs import create_job, submit_job, cancel_job, get_job, set_stage, add_image, queue_length, \
+    wait_for_events, JobQueueFull, PLOT_STAGES
+
+
+def test_jobs_of_other_sessions_are_not_found(client):
+    with client.session_transaction() as session:
+        session['workspace_id'] = 'mine'
+    own = create_job('plot', PLOT_STAGES, 'mine')
+    other = create_job('plot', PLOT_STAGES, 'theirs')
+
+    assert client.get(f'/api/jobs/{own}').status_code == 200
+    assert client.get(f'/api/jobs/{other}').status_code == 404
+    assert client.get(f'/api/jobs/{other}/events').status_code == 404
+    assert client.post(f'/api/jobs/{other}/cancel').status_code == 404
+    assert get_job(other)['status'] == 'queued'
+    assert client.post(f'/api/jobs/{own}/cancel').status_code == 200
+
+
+def test_event_log_is_capped_and_freed_once_streamed(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_EVENTS', 5)
+    job_id = create_job('plot', PLOT_STAGES, 'mine')
+    with jobs._jobs_lock:
+        for position in [3, 2, 1]:
+            jobs._emit(jobs._jobs[job_id], 'queued', {'queue_position': position})
+    events, _ = wait_for_events(job_id, 0, timeout=0)
+    # the queue positions collapse into the last one
+    assert events == [(2, 'queued', {'queue_position': 1})]
+
+    for number in range(10):
+        add_image(job_id, f'{number}.png')
+    events, finished = wait_for_events(job_id, 3, timeout=0)
+    assert [index for index, _, _ in events] == list(range(8, 13))
+    assert not finished
+
+    jobs._finish_job(job_id, 'completed')
+    events, finished = wait_for_events(job_id, 13, timeout=0)
+    assert [event for _, event, _ in events] == ['completed'] and finished
+    assert len(jobs._jobs[job_id]['_events']) == 1
+    assert len(get_job(job_id)['results']['images']) == 10
+
+
+def wait_until_finished(*job_ids):
+    for job_id in job_ids:
+        while get_job(job_id)['finished_at'] is None:
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def busy_runners(monkeypatch):
+    # Occupy every runner thread with a job that waits for the test, and leave room for one queued job
+    release = threading.Event()
+
+    def wait(job_id=None):
+        release.wait()
+
+    blocking = [create_job('plot', PLOT_STAGES) for _ in range(jobs.JOB_WORKERS)]
+    for job_id in blocking:
+        submit_job(job_id, wait)
+    while any(get_job(job_id)['status'] != 'running' for job_id in blocking):
+        time.sleep(0.01)
+    monkeypatch.setattr(jobs, 'JOB_QUEUE_SIZE', 1)
+    yield release
+    release.set()
+    wait_until_finished(*blocking)
+
+
+def test_full_queue_rejects_jobs(busy_runners, client):
+    queued = create_job('plot', PLOT_STAGES)
+    assert submit_job(queued, lambda job_id=None: None) == 1
+
+    rejected = create_job('plot', PLOT_STAGES)
+    with pytest.raises(JobQueueFull):
+        submit_job(rejected, lambda job_id=None: None)
+    assert get_job(rejected) is None
+
+    response = client.post('/api/visualize', data={'plot-type': 'bar', 'x-axis': 'region', 'y-axis': 'region'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    assert response.get_json()['queue_length'] == 1
+    cancel_job(queued)
+
+
+def test_cancelling_a_queued_job_drops_it(busy_runners):
+    queued = create_job('plot', PLOT_STAGES)
+    submit_job(queued, lambda job_id=None: None)
+    assert cancel_job(queued)
+    assert get_job(queued)['status'] == 'cancelled'
+    assert queue_length() == 0
+    assert not cancel_job(queued)
+
+
+def test_cancelling_a_running_job_stops_it_at_its_next_stage():
+    started, proceed = threading.Event(), threading.Event()
+    rendered = []
+
+    def render(job_id=None):
+        set_stage(job_id, 'render')
+        started.set()
+        proceed.wait()
+        set_stage(job_id, 'save')
+        rendered.append(job_id)
+
+    job_id = create_job('plot', PLOT_STAGES + ['save'])
+    submit_job(job_id, render)
+    started.wait(5)
+    assert cancel_job(job_id)
+    proceed.set()
+    wait_until_finished(job_id)
+    assert get_job(job_id)['status'] == 'cancelled'
+    assert get_job(job_id)['completed_stages'] == ['render']
+    assert rendered == []
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import statement_frame
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+
+pl = pytest.importorskip('polars')
+polars_backend = pytest.importorskip('src.data_process.polars_backend')
+
+
+@pytest.fixture(scope='module')
+def padded_upload(tmp_path_factory):
+    # The statement with an integer column padded with whitespace, which pandas reads as integers
+    df = statement_frame()
+    df['Term'] = [f' {months}' if i % 2 else f'{months} ' for i, months in enumerate(np.arange(len(df)) % 30 + 6)]
+    path = tmp_path_factory.mktemp('padded') / 'statement.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_read_upload_types_columns_as_pandas(tmp_path):
+    path = tmp_path / 'upload.csv'
+    path.write_text('count,rate,flag,padded flag,label,missing\n 5,1.5 ,True, True,x ,\n6 , 2,False,False, y,\n')
+    df, dtypes = polars_backend.read_upload(str(path))
+    expected = pd.read_csv(path)
+    pd.testing.assert_series_equal(dtypes, expected.dtypes)
+    pd.testing.assert_frame_equal(df.to_pandas(), expected)
+
+
+def test_polars_backend_output_is_the_pandas_output(upload, padded_upload, tmp_path, monkeypatch):
+    for path in [upload, padded_upload]:
+        outputs = {}
+        for backend in ['pandas', 'polars']:
+            monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', backend)
+            df, state, model = preprocessor.clean_rows(path, str(tmp_path))
+            outputs[backend] = preprocessor.finish_cleaning(df, state, model, str(tmp_path))
+        (expected, expected_state, (expected_model, expected_arrays)) = outputs['pandas']
+        (df, state, (model, arrays)) = outputs['polars']
+        pd.testing.assert_frame_equal(df, expected, check_exact=True)
+        assert state == expected_state
+        assert model == expected_model
+        for key, values in expected_arrays.items():
+            np.testing.assert_array_equal(arrays[key], values, err_msg=key)
@@ -0,0 +1,81 @@
+import os
+import pytest
+
+from src.data_process import result_cache
+from src.data_process.result_cache import content_key, lookup, store, restore, cache_stats, stage_entry, store_stage, \
+    release_stage
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # An empty result cache under tmp_path
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_ROOT', str(tmp_path / 'cache'))
+    monkeypatch.setattr(result_cache, '_index', None)
+    return tmp_path / 'cache'
+
+
+def outputs(folder, size):
+    os.makedirs(folder / 'visual_images', exist_ok=True)
+    (folder / 'output.feather').write_bytes(b'x' * size)
+    (folder / 'visual_images' / 'plot.png').write_bytes(b'p')
+    return str(folder)
+
+
+def test_key_changes_with_the_settings():
+    settings = ['v1', {'cleaned': {'sparse_threshold': 0.75}}]
+    assert content_key('digest', settings) == content_key('digest', ['v1', {'cleaned': {'sparse_threshold': 0.75}}])
+    assert content_key('digest', settings) != content_key('digest', ['v2', settings[1]])
+    assert content_key('digest', settings) != content_key('digest', ['v1', {'cleaned': {'sparse_threshold': 0.5}}])
+    assert content_key('digest', settings) != content_key('other', settings)
+
+
+def test_stored_outputs_are_restored(cache, tmp_path):
+    store('visualisation', 'key', outputs(tmp_path / 'job', 100), {'before': 'report'})
+    assert lookup('visualisation', 'key')
+    restored = tmp_path / 'restored'
+    restored.mkdir()
+    restore('visualisation', 'key', str(restored))
+    assert (restored / 'output.feather').read_bytes() == b'x' * 100
+    assert (restored / 'visual_images' / 'plot.png').exists()
+    assert not (restored / result_cache.RESULTS_FILE).exists()
+    # the copy made for the restore is gone
+    assert os.listdir(cache / 'visualisation') == ['key']
+
+
+def test_least_recently_used_entries_are_evicted(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_BYTES', 2500)
+    for name in ['first', 'second']:
+        store('visualisation', name, outputs(tmp_path / name, 1000), {})
+    restore('visualisation', 'first', outputs(tmp_path / 'restored', 0))
+    store('visualisation', 'third', outputs(tmp_path / 'third', 1000), {})
+
+    assert sorted(os.listdir(cache / 'visualisation')) == ['first', 'third']
+    stats = cache_stats()
+    assert stats['entries'] == 2
+    # the sizes are tracked, not read from disk again
+    sizes = [result_cache.folder_size(cache / 'visualisation' / name) for name in ['first', 'third']]
+    assert stats['bytes'] == sum(sizes)
+
+
+def stage_writer(size):
+    def write(folder):
+        with open(os.path.join(folder, result_cache.STAGE_DATA_FILE), 'wb') as f:
+            f.write(b'x' * size)
+        return {'size': size}
+    return write
+
+
+def test_pinned_stages_are_not_evicted_nor_replaced(cache, monkeypatch):
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_BYTES', 1500)
+    store_stage('cleaned', stage_writer(1000))
+    entry = stage_entry('cleaned')
+
+    # another job stores the same stage and a newer one while the entry is read, the cache goes over its budget
+    assert store_stage('cleaned', stage_writer(1000)) == entry
+    store_stage('rows', stage_writer(1000))
+    assert sorted(os.listdir(cache / 'stages')) == ['cleaned', 'rows']
+
+    release_stage(entry)
+    store_stage('encoded', stage_writer(1000))
+    assert os.listdir(cache / 'stages') == ['encoded']
+    assert result_cache._pins == {}
@@ -0,0 +1,47 @@
+import pytest
+from conftest import statement_frame
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process import schema_registry
+from src.data_process.jobs import create_job, get_job, VISUALISATION_STAGES
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    # An empty schema registry under tmp_path
+    monkeypatch.setattr(schema_registry, 'SCHEMA_REGISTRY_ROOT', str(tmp_path / 'registry'))
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+
+
+def clean(df, tmp_path, name):
+    path = tmp_path / f'{name}.csv'
+    df.to_csv(path, index=False)
+    job_id = create_job('visualisation', VISUALISATION_STAGES)
+    df, state, _ = preprocessor.clean_rows(str(path), str(tmp_path), job_id)
+    return df, state, get_job(job_id)['metrics']
+
+
+def test_uploads_of_a_registered_layout_reuse_its_classification_and_drops(tmp_path):
+    first, first_state, metrics = clean(statement_frame(), tmp_path, 'first')
+    assert metrics['raw_columns'] == {'reused': 0, 'inferred': 9}
+    assert metrics['dropped']['columns'] == ['currency of commitment']
+
+    # the same layout with another statement, in which the column dropped before is filled
+    statement = statement_frame(seed=1)
+    statement['Currency of Commitment'] = 'USD'
+    second, second_state, metrics = clean(statement, tmp_path, 'second')
+    assert metrics['raw_columns'] == {'reused': 9, 'inferred': 0}
+    assert metrics['clean_columns'] == {'reused': 8, 'inferred': 0}
+    assert metrics['dropped']['columns'] == ['currency of commitment']
+    assert second_state['fingerprint'] == first_state['fingerprint']
+    assert second_state['column_types'] == first_state['column_types']
+    assert list(second.columns) == list(first.columns)
+
+
+def test_new_layouts_reuse_the_columns_they_share(tmp_path):
+    clean(statement_frame(), tmp_path, 'first')
+    statement = statement_frame().rename(columns={'Region': 'Country'})
+    _, _, metrics = clean(statement, tmp_path, 'renamed')
+    assert metrics['raw_columns'] == {'reused': 8, 'inferred': 1}
+    # the columns are dropped by their missing values again
+    assert metrics['dropped']['columns'] == ['currency of commitment']
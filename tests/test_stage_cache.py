@@ -0,0 +1,46 @@
+import pytest
+
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process import result_cache
+from src.data_process.columnar_store import read_dataset
+from src.data_process.data_preprocessor_for_insights import preprocess_insights
+from src.data_process.jobs import create_job, get_job, VISUALISATION_STAGES, INSIGHT_STAGES
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # An empty stage cache under tmp_path
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_ROOT', str(tmp_path / 'cache'))
+    monkeypatch.setattr(result_cache, '_index', None)
+
+
+def test_stage_keys_change_with_the_settings(monkeypatch):
+    rows, cleaned = (preprocessor.stage_key('digest', stage, False) for stage in ['rows', 'cleaned'])
+    assert preprocessor.stage_key('digest', 'cleaned', True) != cleaned
+    assert preprocessor.stage_key('other', 'cleaned', False) != cleaned
+
+    monkeypatch.setattr(preprocessor, 'IMPUTE_SEED', preprocessor.IMPUTE_SEED + 1)
+    # the rows are cleaned the same way, the imputation after them is not
+    assert preprocessor.stage_key('digest', 'rows', False) == rows
+    assert preprocessor.stage_key('digest', 'cleaned', False) != cleaned
+
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'polars')
+    assert preprocessor.stage_key('digest', 'rows', False) != rows
+
+
+def test_pipelines_share_the_cleaned_dataset(cache, upload, tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+    visualisation = create_job('visualisation', VISUALISATION_STAGES)
+    (tmp_path / 'visuals').mkdir()
+    preprocessor.process_csv(upload, str(tmp_path / 'visuals' / 'output.feather'), job_id=visualisation)
+    assert get_job(visualisation)['metrics']['stage_cache'] == {'reused': None, 'run': ['rows', 'cleaned']}
+
+    insights = create_job('insights', INSIGHT_STAGES)
+    (tmp_path / 'insights').mkdir()
+    df, _ = preprocess_insights(upload, str(tmp_path / 'insights'), job_id=insights)
+    assert get_job(insights)['metrics']['stage_cache'] == {'reused': 'cleaned', 'run': []}
+    assert get_job(insights)['results']['after_report'] == get_job(visualisation)['results']['after_report']
+    assert (tmp_path / 'insights' / 'after.txt').exists()
+    assert len(df) == len(read_dataset(str(tmp_path / 'visuals' / 'output.feather')))
+    # every entry is released once the pipelines have read it
+    assert result_cache._pins == {}
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import statement_frame
+
+from src.data_process import chunked_csv, result_cache
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process.columnar_store import read_dataset
+from src.data_process.incremental import load_append_model
+from src.data_process.jobs import create_job, get_job, VISUALISATION_STAGES
+
+
+@pytest.fixture
+def processed(tmp_path, monkeypatch):
+    # A statement processed in memory and streamed, in folders of tmp_path, and the metrics of both jobs
+    monkeypatch.setattr(preprocessor, 'PREPROCESS_BACKEND', 'pandas')
+    monkeypatch.setattr(result_cache, 'RESULT_CACHE_ROOT', str(tmp_path / 'cache'))
+    monkeypatch.setattr(result_cache, '_index', None)
+    # chunks much smaller than the statement, with an integer column that is neither imputed nor capped
+    monkeypatch.setattr(chunked_csv, 'STREAM_CHUNK_ROWS', 70)
+    statement = statement_frame(1000)
+    statement['Term'] = statement.index % 30 + 1
+    upload_path = str(tmp_path / 'statement.csv')
+    statement.to_csv(upload_path, index=False)
+    metrics = {}
+    for folder, process in [('memory', preprocessor.process_csv), ('streamed', preprocessor.process_csv_streaming)]:
+        (tmp_path / folder).mkdir()
+        job_id = create_job('visualisation', VISUALISATION_STAGES)
+        process(upload_path, str(tmp_path / folder / 'output.feather'), job_id=job_id)
+        metrics[folder] = get_job(job_id)['metrics']
+    return tmp_path / 'memory', tmp_path / 'streamed', metrics
+
+
+def test_streamed_output_is_the_in_memory_output(processed):
+    memory, streamed, _ = processed
+    expected = read_dataset(str(memory / 'output.feather'))
+    pd.testing.assert_frame_equal(read_dataset(str(streamed / 'output.feather')), expected, check_exact=True)
+    assert expected['term'].dtype == 'int8'
+    for name in ['before.txt', 'after.txt', 'profile.json']:
+        assert (streamed / name).read_text() == (memory / name).read_text(), name
+    state, arrays = load_append_model(str(streamed))
+    expected_state, expected_arrays = load_append_model(str(memory))
+    assert state == expected_state
+    for key, values in expected_arrays.items():
+        np.testing.assert_array_equal(arrays[key], values, err_msg=key)
+    assert sorted(path.name for path in streamed.iterdir()) == sorted(path.name for path in memory.iterdir())
+
+
+def test_streamed_compaction_reports_the_in_memory_savings(processed):
+    _, _, metrics = processed
+    assert metrics['streamed']['memory'] == metrics['memory']['memory']
+    assert metrics['memory']['memory']['columns']['region']['dtype'] == 'category'
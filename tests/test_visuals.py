@@ -0,0 +1,22 @@
+from src.data_process import data_preprocessor_for_visualisation as preprocessor
+from src.data_process.visuals_generator import plot_cache_key
+
+
+def box_plot_key(y_axis='interest rate'):
+    return plot_cache_key('digest', 'box_plot', 'region', y_axis, preprocessor.preprocessing_settings())
+
+
+def test_plot_key_changes_with_the_preprocessing(monkeypatch):
+    key = box_plot_key()
+    assert key == box_plot_key()
+    assert key != box_plot_key('disbursed amount')
+
+    monkeypatch.setattr(preprocessor, 'IMPUTE_SEED', preprocessor.IMPUTE_SEED + 1)
+    reseeded = box_plot_key()
+    assert reseeded != key
+    monkeypatch.setattr(preprocessor, 'STAGE_CACHE_VERSION', preprocessor.STAGE_CACHE_VERSION + 1)
+    assert box_plot_key() not in (key, reseeded)
+
+
+def test_plots_of_unhashed_uploads_are_not_cached():
+    assert plot_cache_key(None, 'box_plot', 'region') is None
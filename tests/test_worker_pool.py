@@ -0,0 +1,23 @@
+import pandas as pd
+
+from src.data_process import worker_pool
+from src.data_process.pandas_backend import transform_in_pool
+from src.data_process.jobs import create_job, get_job
+
+
+def test_plan_chunks_uses_the_pool_above_the_row_limit(monkeypatch):
+    monkeypatch.setattr(worker_pool, 'PROCESS_POOL_WORKERS', 4)
+    assert worker_pool.plan_chunks(100, 50, in_process_max_rows=1000)['mode'] == 'in_process'
+    plan = worker_pool.plan_chunks(10_000, 50, in_process_max_rows=1000)
+    assert plan['mode'] == 'pool'
+    # one chunk per worker while the rows fit in CHUNK_TARGET_BYTES
+    assert plan['chunks'] == 4 and plan['chunk_rows'] == 2500
+
+
+def test_transform_parses_dates_in_process_by_default(upload, tmp_path, monkeypatch):
+    monkeypatch.setattr(worker_pool, 'PROCESS_POOL_WORKERS', 4)
+    df = pd.read_csv(upload).rename(columns=str.lower)
+    job_id = create_job('visualization', ['transform'])
+    transform_in_pool(df, str(tmp_path), ['end of period', 'agreement signing date'], ['region'], ['loan number'],
+                      job_id=job_id)
+    assert get_job(job_id)['metrics']['transform_schedule']['mode'] == 'in_process'
@@ -0,0 +1,34 @@
+import io
+import os
+import time
+
+from src.data_process.workspaces import get_workspace, within_quota, collect_stale_workspaces
+
+
+def test_quota_counts_the_workspace_but_not_the_replaced_folders(tmp_path):
+    workspace = get_workspace(str(tmp_path), 'mine')
+    (tmp_path / 'mine' / 'visuals_upload' / 'statement.csv').write_bytes(b'x' * 600)
+    (tmp_path / 'mine' / 'insights_upload' / 'statement.csv').write_bytes(b'x' * 300)
+
+    assert within_quota(workspace, 100, 1000)
+    assert not within_quota(workspace, 101, 1000)
+    assert within_quota(workspace, 700, 1000, ['visuals_upload', 'visuals_processed'])
+
+
+def test_upload_over_quota_is_refused(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'WORKSPACE_QUOTA_BYTES', 100)
+    data = {'file': (io.BytesIO(b'a,b\n' + b'1,2\n' * 100), 'statement.csv')}
+    response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Workspace storage quota exceeded'
+
+
+def test_stale_workspaces_are_removed_unless_a_job_uses_them(tmp_path):
+    for workspace_id in ['fresh', 'stale', 'busy']:
+        get_workspace(str(tmp_path), workspace_id)
+    an_hour_ago = time.time() - 60 * 60
+    for workspace_id in ['stale', 'busy']:
+        os.utime(tmp_path / workspace_id, (an_hour_ago, an_hour_ago))
+
+    assert collect_stale_workspaces(str(tmp_path), 30 * 60, {'busy'}) == ['stale']
+    assert sorted(os.listdir(tmp_path)) == ['busy', 'fresh']